@@ -0,0 +1,271 @@
+"""Columnar analytics export for Life Unwritten
+
+Writes the choices of finished sessions as typed columns, one .npy file
+per column, so they can be memory-mapped with NumPy and a query reads
+only the columns it uses. An export is a directory with two tables:
+
+    events/    one row per choice: session, day, npc, option, bond_delta,
+               mood_before, mood_after and the session's ending
+    sessions/  one row per session: session, seed, ending, days, choices
+
+Reflections have npc 0xFFFF (history.REFLECTION), the reflection prompt
+in option and a bond_delta of 0. Endings are indexes into
+engine.ENDINGS, or 255 for a session that was abandoned.
+
+Rows are buffered per column and appended to the files every
+FLUSH_ROWS rows, rewriting the .npy header each time, so memory stays
+bounded and the files are readable while an export is still running.
+Writing needs nothing beyond the standard library; the queries need
+NumPy.
+
+    python analytics.py export out --sessions 100000 --policy random
+    python analytics.py export out --recordings recordings/
+    python analytics.py report out
+"""
+
+import argparse
+import ast
+import glob
+import json
+import os
+import sys
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import engine
+from history import (DAY, NPC, OPTION, MOOD_BEFORE, MOOD_AFTER, BOND_BEFORE, BOND_AFTER, REFLECTION,
+                     RECORD_WIDTH)
+
+FLUSH_ROWS = 1 << 16
+NO_ENDING = 255
+HEADER_SIZE = 128  # fixed so the header can be rewritten in place as rows are added
+MAGIC = b"\x93NUMPY\x01\x00"
+BYTE_ORDER = "<" if sys.byteorder == "little" else ">"
+
+# (name, array typecode, NumPy dtype)
+EVENT_COLUMNS = (("session", "I", "u4"), ("day", "H", "u2"), ("npc", "H", "u2"), ("option", "H", "u2"),
+                 ("bond_delta", "h", "i2"), ("mood_before", "H", "u2"), ("mood_after", "H", "u2"),
+                 ("ending", "B", "u1"))
+SESSION_COLUMNS = (("session", "I", "u4"), ("seed", "Q", "u8"), ("ending", "B", "u1"), ("days", "H", "u2"),
+                   ("choices", "I", "u4"))
+
+
+def npy_header(dtype: str, rows: int) -> bytes:
+    descr = dtype if dtype.endswith("1") else BYTE_ORDER + dtype
+    text = f"{{'descr': '{descr}', 'fortran_order': False, 'shape': ({rows},), }}"
+    text = text.ljust(HEADER_SIZE - len(MAGIC) - 2 - 1) + "\n"
+    return MAGIC + len(text).to_bytes(2, "little") + text.encode("latin1")
+
+
+def npy_rows(path: str) -> int:
+    """Number of rows recorded in the header of a column file"""
+    with open(path, "rb") as f:
+        head = f.read(HEADER_SIZE)
+    if head[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path}: not a column written by analytics.py")
+    length = int.from_bytes(head[len(MAGIC):len(MAGIC) + 2], "little")
+    header = ast.literal_eval(head[len(MAGIC) + 2:len(MAGIC) + 2 + length].decode("latin1"))
+    return header["shape"][0]
+
+
+class Column:
+    """One .npy file that rows are appended to"""
+
+    def __init__(self, path: str, typecode: str, dtype: str, append: bool):
+        self.path = path
+        self.typecode = typecode
+        self.dtype = dtype
+        self.buffer = array(typecode)
+        if append and os.path.exists(path):
+            self.rows = npy_rows(path)
+            self.file = open(path, "r+b")
+            self.file.truncate(HEADER_SIZE + self.rows * self.buffer.itemsize)  # drop rows a crash left unheadered
+        else:
+            self.rows = 0
+            self.file = open(path, "w+b")
+            self.file.write(npy_header(dtype, 0))
+
+    def flush(self):
+        if self.buffer:
+            self.file.seek(0, os.SEEK_END)
+            self.buffer.tofile(self.file)
+            self.rows += len(self.buffer)
+            self.buffer = array(self.typecode)
+        self.file.seek(0)
+        self.file.write(npy_header(self.dtype, self.rows))
+        self.file.flush()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+class Table:
+    def __init__(self, directory: str, columns: Sequence[Tuple[str, str, str]], append: bool):
+        os.makedirs(directory, exist_ok=True)
+        self.columns = {name: Column(os.path.join(directory, f"{name}.npy"), typecode, dtype, append)
+                        for name, typecode, dtype in columns}
+        counts = {column.rows for column in self.columns.values()}
+        if len(counts) != 1:
+            raise ValueError(f"{directory}: columns have different lengths")
+        self.rows = counts.pop()
+        self.buffered = 0
+
+    def extend(self, values: Dict[str, Iterable[int]], count: int):
+        for name, column in self.columns.items():
+            column.buffer.extend(values[name])
+        self.buffered += count
+        if self.buffered >= FLUSH_ROWS:
+            self.flush()
+
+    def flush(self):
+        for column in self.columns.values():
+            column.flush()
+        self.rows += self.buffered
+        self.buffered = 0
+
+    def close(self):
+        self.flush()
+        for column in self.columns.values():
+            column.close()
+
+
+class Exporter:
+    """Appends finished sessions to a columnar export directory"""
+
+    def __init__(self, directory: str, append: bool = True):
+        self.events = Table(os.path.join(directory, "events"), EVENT_COLUMNS, append)
+        self.sessions = Table(os.path.join(directory, "sessions"), SESSION_COLUMNS, append)
+
+    def add(self, state: engine.GameState) -> int:
+        """Write one session's choices; returns its session number"""
+        session = self.sessions.rows + self.sessions.buffered
+        log = state.choices_made
+        count = len(log)
+        ending = NO_ENDING if state.ending is None else engine.ENDINGS.index(state.ending)
+        for data in log.chunks():  # an archived history is read a chunk at a time
+            rows = len(data) // RECORD_WIDTH
+            self.events.extend({
+                "session": [session] * rows,
+                "day": data[DAY::RECORD_WIDTH],
+                "npc": data[NPC::RECORD_WIDTH],
+                "option": data[OPTION::RECORD_WIDTH],
+                "bond_delta": [after - before for before, after in zip(data[BOND_BEFORE::RECORD_WIDTH],
+                                                                       data[BOND_AFTER::RECORD_WIDTH])],
+                "mood_before": data[MOOD_BEFORE::RECORD_WIDTH],
+                "mood_after": data[MOOD_AFTER::RECORD_WIDTH],
+                "ending": bytes([ending]) * rows
+            }, rows)
+        self.sessions.extend({
+            "session": (session,),
+            "seed": (state.seed & 0xFFFFFFFFFFFFFFFF,),
+            "ending": (ending,),
+            "days": (state.day,),
+            "choices": (count,)
+        }, 1)
+        return session
+
+    def flush(self):
+        self.events.flush()
+        self.sessions.flush()
+
+    def close(self):
+        self.events.close()
+        self.sessions.close()
+
+    def __enter__(self) -> "Exporter":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Queries
+
+def load(directory: str, table: str = "events", columns: Optional[Sequence[str]] = None):
+    """Memory-map the named columns of a table (all of them by default) as NumPy arrays"""
+    import numpy as np
+    names = columns or [name for name, _, _ in (EVENT_COLUMNS if table == "events" else SESSION_COLUMNS)]
+    return {name: np.load(os.path.join(directory, table, f"{name}.npy"), mmap_mode="r") for name in names}
+
+
+def option_picks(directory: str) -> List[Tuple[str, str, int]]:
+    """(NPC name, option text, times picked) for every dialogue option, most picked first"""
+    import numpy as np
+    events = load(directory, columns=("npc", "option"))
+    talks = events["npc"] != REFLECTION
+    keys = events["npc"][talks].astype(np.uint32) << 16 | events["option"][talks]
+    values, counts = np.unique(keys, return_counts=True)
+    picks = []
+    for key, count in zip(values.tolist(), counts.tolist()):
+        npc, option = key >> 16, key & 0xFFFF
+        picks.append((engine.npc_name(npc), engine.npc_scenario(npc)["options"][option]["text"], count))
+    picks.sort(key=lambda pick: -pick[2])
+    return picks
+
+
+def mood_by_day(directory: str) -> List[float]:
+    """Mean mood after a choice on each day, index 0 is day 1"""
+    import numpy as np
+    events = load(directory, columns=("day", "mood_after"))
+    days = events["day"].astype(np.intp)
+    totals = np.bincount(days, weights=events["mood_after"])
+    counts = np.maximum(np.bincount(days), 1)
+    return (totals / counts)[1:].tolist()
+
+
+def ending_rates(directory: str) -> Dict[str, float]:
+    import numpy as np
+    endings = load(directory, "sessions", ("ending",))["ending"]
+    counts = np.bincount(endings, minlength=NO_ENDING + 1)
+    total = max(1, len(endings))
+    rates = {f"{name}_ending": counts[code] / total for code, name in enumerate(engine.ENDINGS)}
+    rates["unfinished"] = counts[NO_ENDING] / total
+    return rates
+
+
+def report(directory: str, top: int = 10) -> Dict[str, object]:
+    return {
+        "sessions": len(load(directory, "sessions", ("session",))["session"]),
+        "events": len(load(directory, columns=("session",))["session"]),
+        "ending_rates": ending_rates(directory),
+        "mood_by_day": mood_by_day(directory),
+        "top_options": [{"npc": npc, "option": text, "picks": count}
+                        for npc, text, count in option_picks(directory)[:top]]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export Life Unwritten choices as columns, or summarize an export")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="add sessions to an export directory")
+    export.add_argument("directory")
+    export.add_argument("--recordings", metavar="DIR", help="replay every recording in DIR and export it")
+    export.add_argument("--sessions", type=int, default=10000, help="headless playthroughs to export")
+    export.add_argument("--policy", default="random", help="policy for the playthroughs, see montecarlo.py")
+    export.add_argument("--seed", type=int, default=0, help="seed of the first playthrough")
+    summary = commands.add_parser("report", help="print a JSON summary of an export")
+    summary.add_argument("directory")
+    summary.add_argument("--top", type=int, default=10, help="most picked options to list")
+    args = parser.parse_args()
+
+    if args.command == "report":
+        print(json.dumps(report(args.directory, args.top), indent=2, ensure_ascii=False))
+        return
+
+    with Exporter(args.directory) as exporter:
+        if args.recordings:
+            from recording import Recording
+            from replay import replay
+            for path in sorted(glob.glob(os.path.join(args.recordings, "*.json"))):
+                exporter.add(replay(Recording.load(path)))
+        else:
+            from montecarlo import POLICIES
+            policy = POLICIES[args.policy]
+            for seed in range(args.seed, args.seed + args.sessions):
+                exporter.add(engine.play(policy, seed=seed))
+    print(f"{args.directory}: {exporter.sessions.rows} sessions, {exporter.events.rows} events", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
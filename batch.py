@@ -0,0 +1,395 @@
+"""Vectorized batch simulator for Life Unwritten
+
+Runs many sessions at once with NumPy. Each session is a row in a set of
+arrays (bond per NPC, mood, day, reflections) and every rule from
+engine.py is applied to all rows in one array operation, so ending
+distributions over millions of playthroughs take seconds.
+
+A sweep adds a parameter axis: every row also carries the index of a
+balance configuration (scenario deltas, reflection boost range and
+ending thresholds), so a whole grid of candidate values is played in
+the same pass and reported as ending rates per configuration:
+
+    python batch.py --vary good_bond=70,75,80 --vary reflection_boost=8-15,5-10 \
+        --vary Maya:0:bond_change=5,10,15 --sessions 2000 > sweep.csv
+
+Requires NumPy, which the terminal game itself does not need.
+"""
+
+import argparse
+import csv
+import itertools
+import sys
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import engine
+
+NPC_NAMES = engine.NAMES
+ENDING_CODES = {name: code for code, name in enumerate(engine.ENDINGS)}
+NO_ENDING = -1
+
+
+def build_tables():
+    """Flatten the scenario tables into arrays indexed by action code
+
+    Action codes 0..n-1 are the interaction options of every NPC in
+    order, followed by one code for reflecting and one for ending the day.
+    """
+    npc_index, bond_change, mood_change = [], [], []
+    for npc in range(len(engine.NAMES)):
+        for option in engine.get_interaction_scenarios(engine.Character(npc))['options']:
+            npc_index.append(npc)
+            bond_change.append(option['bond_change'])
+            mood_change.append(option['mood_change'])
+    return (np.array(npc_index, dtype=np.intp),
+            np.array(bond_change, dtype=np.int16),
+            np.array(mood_change, dtype=np.int16))
+
+
+ACTION_NPC, ACTION_BOND_CHANGE, ACTION_MOOD_CHANGE = build_tables()
+N_INTERACTIONS = len(ACTION_NPC)
+REFLECT = N_INTERACTIONS
+END_DAY = N_INTERACTIONS + 1
+FIRST_ACTION = np.searchsorted(ACTION_NPC, np.arange(len(engine.NAMES)))  # NPC -> its first action code
+
+
+@dataclass
+class Params:
+    """Balance values of one or more configurations, one row each"""
+    bond_change: np.ndarray  # (configs, N_INTERACTIONS)
+    mood_change: np.ndarray  # (configs, N_INTERACTIONS)
+    reflection_low: np.ndarray  # (configs,) and so on
+    reflection_high: np.ndarray
+    good_bond: np.ndarray
+    good_mood: np.ndarray
+    bad_bond: np.ndarray
+    bad_mood: np.ndarray
+
+    @classmethod
+    def default(cls, n_configs: int = 1) -> "Params":
+        """n_configs copies of the values in engine.py and the content pack"""
+        def column(value: int) -> np.ndarray:
+            return np.full(n_configs, value, dtype=np.int16)
+        return cls(
+            bond_change=np.tile(ACTION_BOND_CHANGE, (n_configs, 1)),
+            mood_change=np.tile(ACTION_MOOD_CHANGE, (n_configs, 1)),
+            reflection_low=column(engine.REFLECTION_BOOST[0]),
+            reflection_high=column(engine.REFLECTION_BOOST[1]),
+            good_bond=column(engine.GOOD_ENDING_BOND),
+            good_mood=column(engine.GOOD_ENDING_MOOD),
+            bad_bond=column(engine.BAD_ENDING_BOND),
+            bad_mood=column(engine.BAD_ENDING_MOOD)
+        )
+
+    def __len__(self) -> int:
+        return len(self.good_bond)
+
+
+class Batch:
+    """N independent sessions stored column-wise
+
+    With params holding more than one configuration, config gives each
+    row's configuration; otherwise every row plays by params row 0 (the
+    game's own values by default).
+    """
+
+    def __init__(self, n_sessions: int, rng: np.random.Generator, params: Optional[Params] = None,
+                 config: Optional[np.ndarray] = None, trajectories: bool = True):
+        self.rng = rng
+        self.n = n_sessions
+        self.params = params if params is not None else Params.default()
+        self.config = config if len(self.params) > 1 else None
+        self.trajectories = trajectories  # keep the per-day mood and bond snapshots
+        initial_bonds = [profile["bond_level"] for profile in engine.PROFILES]
+        self.bonds = np.tile(np.array(initial_bonds, dtype=np.int16), (n_sessions, 1))
+        self.mood = np.full(n_sessions, engine.STARTING_MOOD, dtype=np.int16)
+        self.day = np.ones(n_sessions, dtype=np.int16)
+        self.reflection_count = np.zeros(n_sessions, dtype=np.int8)
+        self.ending = np.full(n_sessions, NO_ENDING, dtype=np.int8)
+        self.choices = np.zeros(n_sessions, dtype=np.int32)
+        # End-of-day snapshots, NaN for days a session never reached
+        days = engine.FINAL_DAY if trajectories else 0
+        self.mood_by_day = np.full((n_sessions, days), np.nan, dtype=np.float32)
+        self.bond_by_day = np.full((n_sessions, days), np.nan, dtype=np.float32)
+
+    def setting(self, values: np.ndarray, rows: np.ndarray):
+        """One parameter for each of the given rows, or a scalar when there is a single configuration"""
+        return values[0] if self.config is None else values[self.config[rows]]
+
+    def deltas(self, table: np.ndarray, rows: np.ndarray, actions: np.ndarray) -> np.ndarray:
+        return table[0, actions] if self.config is None else table[self.config[rows], actions]
+
+    def active(self) -> np.ndarray:
+        """Row indices of sessions that have not reached an ending"""
+        return np.flatnonzero(self.ending == NO_ENDING)
+
+    def step(self, rows: np.ndarray, actions: np.ndarray):
+        """Apply one action code to each of the given rows"""
+        interacting = actions < N_INTERACTIONS
+        if interacting.any():
+            self.interact(rows[interacting], actions[interacting])
+
+        reflecting = actions == REFLECT
+        if reflecting.any():
+            self.reflect(rows[reflecting])
+
+        ending_day = actions == END_DAY
+        if ending_day.any():
+            self.end_day(rows[ending_day])
+
+    def interact(self, rows: np.ndarray, actions: np.ndarray):
+        npcs = ACTION_NPC[actions]
+        bond_change = self.deltas(self.params.bond_change, rows, actions)
+        mood_change = self.deltas(self.params.mood_change, rows, actions)
+        self.bonds[rows, npcs] = np.clip(self.bonds[rows, npcs] + bond_change, engine.MIN_LEVEL, engine.MAX_LEVEL)
+        self.mood[rows] = np.clip(self.mood[rows] + mood_change, engine.MIN_LEVEL, engine.MAX_LEVEL)
+        self.choices[rows] += 1
+
+    def reflect(self, rows: np.ndarray):
+        low = self.setting(self.params.reflection_low, rows)
+        high = self.setting(self.params.reflection_high, rows)
+        boost = self.rng.integers(low, high + 1, size=len(rows), dtype=np.int16)
+        self.mood[rows] = np.minimum(engine.MAX_LEVEL, self.mood[rows] + boost)
+        self.reflection_count[rows] += 1
+        self.choices[rows] += 1
+
+    def end_day(self, rows: np.ndarray):
+        avg_bond = self.bonds[rows].mean(axis=1)
+        mood = self.mood[rows]
+        day = self.day[rows]
+        if self.trajectories:
+            self.mood_by_day[rows, day - 1] = mood
+            self.bond_by_day[rows, day - 1] = avg_bond
+
+        params = self.params
+        good = (avg_bond >= self.setting(params.good_bond, rows)) & (mood >= self.setting(params.good_mood, rows))
+        bad = ~good & (avg_bond <= self.setting(params.bad_bond, rows)) & (mood <= self.setting(params.bad_mood, rows))
+        neutral = ~good & ~bad & (day >= engine.FINAL_DAY)
+
+        ending = np.full(len(rows), NO_ENDING, dtype=np.int8)
+        ending[good] = ENDING_CODES["good"]
+        ending[bad] = ENDING_CODES["bad"]
+        ending[neutral] = ENDING_CODES["neutral"]
+        self.ending[rows] = ending
+
+        continuing = rows[ending == NO_ENDING]
+        self.day[continuing] += 1
+        self.reflection_count[continuing] = 0
+
+
+BatchPolicy = Callable[[Batch, np.ndarray], np.ndarray]
+
+
+def random_policy(batch: Batch, rows: np.ndarray) -> np.ndarray:
+    """Pick uniformly among the legal actions of each row, like engine.random_policy"""
+    can_reflect = batch.reflection_count[rows] < engine.MAX_REFLECTIONS_PER_DAY
+    n_legal = N_INTERACTIONS + 1 + can_reflect
+    actions = (batch.rng.random(len(rows)) * n_legal).astype(np.intp)
+    # Without a reflection left the last slot is ending the day
+    actions[~can_reflect & (actions == REFLECT)] = END_DAY
+    return actions
+
+
+@dataclass
+class BatchResult:
+    n_sessions: int
+    endings: Dict[str, int]
+    ending_days: np.ndarray  # sessions ending on each day, index 0 is day 1
+    mood_by_day: np.ndarray  # mean end-of-day mood over sessions still playing
+    bond_by_day: np.ndarray  # mean end-of-day average bond, same convention
+    unfinished: int
+
+    def ending_rates(self) -> Dict[str, float]:
+        return {name: count / self.n_sessions for name, count in self.endings.items()}
+
+
+def simulate(n_sessions: int, policy: BatchPolicy = random_policy, seed: Optional[int] = None,
+             max_steps: int = 10000) -> BatchResult:
+    """Play n_sessions full weeks in lockstep and summarize the outcomes"""
+    batch = Batch(n_sessions, np.random.default_rng(seed))
+    run(batch, policy, max_steps)
+    return summarize(batch)
+
+
+def run(batch: Batch, policy: BatchPolicy, max_steps: int):
+    rows = batch.active()
+    for _ in range(max_steps):
+        if not len(rows):
+            break
+        batch.step(rows, policy(batch, rows))
+        rows = rows[batch.ending[rows] == NO_ENDING]
+
+
+def summarize(batch: Batch) -> BatchResult:
+    """Reduce the per-session arrays to histograms and per-day means"""
+    finished = batch.ending != NO_ENDING
+    counts = np.bincount(batch.ending[finished], minlength=len(engine.ENDINGS))
+    ending_days = np.bincount(batch.day[finished] - 1, minlength=engine.FINAL_DAY)
+    reached = ~np.isnan(batch.mood_by_day)
+    days_reached = np.maximum(reached.sum(axis=0), 1)
+    return BatchResult(
+        n_sessions=batch.n,
+        endings={name: int(counts[code]) for name, code in ENDING_CODES.items()},
+        ending_days=ending_days,
+        mood_by_day=np.where(reached, batch.mood_by_day, 0).sum(axis=0) / days_reached,
+        bond_by_day=np.where(reached, batch.bond_by_day, 0).sum(axis=0) / days_reached,
+        unfinished=int((~finished).sum())
+    )
+
+
+# Parameter sweeps
+
+SCALAR_PARAMS = ("good_bond", "good_mood", "bad_bond", "bad_mood")
+SCALE_PARAMS = ("bond_scale", "mood_scale")  # multiply every scenario delta, rounding to whole points
+DELTA_FIELDS = ("bond_change", "mood_change")
+CHUNK_ROWS = 1 << 20  # sessions played in one pass; larger grids are split by configuration
+
+
+def delta_key(name: str) -> Tuple[int, str]:
+    """Action code and field of an "NPC:option:bond_change" or "...:mood_change" parameter"""
+    npc, option, field = name.rsplit(":", 2)
+    if field not in DELTA_FIELDS:
+        raise ValueError(f"{name}: expected bond_change or mood_change")
+    if npc not in engine.NPC_IDS:
+        raise ValueError(f"{name}: unknown NPC {npc!r}")
+    npc_id = engine.NPC_IDS[npc]
+    n_options = int(np.sum(ACTION_NPC == npc_id))
+    if not option.isdigit() or int(option) >= n_options:
+        raise ValueError(f"{name}: {npc} has options 0-{n_options - 1}")
+    return int(FIRST_ACTION[npc_id]) + int(option), field
+
+
+def grid_params(grid: Dict[str, Sequence[Any]]) -> Tuple[Params, List[Dict[str, Any]]]:
+    """Params for every combination of the candidate values, and the combinations themselves
+
+    Keys are good_bond, good_mood, bad_bond, bad_mood, reflection_boost
+    (values are (low, high) pairs), bond_scale and mood_scale, or
+    "NPC:option:bond_change" / "NPC:option:mood_change" for a single delta.
+    Parameters left out keep the game's own values.
+    """
+    for name in grid:
+        if name not in SCALAR_PARAMS + SCALE_PARAMS + ("reflection_boost",):
+            delta_key(name)
+    names = list(grid)
+    configs = [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+    params = Params.default(len(configs))
+    for i, config in enumerate(configs):
+        for name, value in config.items():
+            if name in SCALAR_PARAMS:
+                getattr(params, name)[i] = value
+            elif name == "reflection_boost":
+                params.reflection_low[i], params.reflection_high[i] = value
+            elif name == "bond_scale":
+                params.bond_change[i] = np.round(ACTION_BOND_CHANGE * value)
+            elif name == "mood_scale":
+                params.mood_change[i] = np.round(ACTION_MOOD_CHANGE * value)
+        for name, value in config.items():  # single deltas win over a scale
+            if name not in SCALAR_PARAMS + SCALE_PARAMS + ("reflection_boost",):
+                action, field = delta_key(name)
+                getattr(params, field)[i, action] = value
+    return params, configs
+
+
+def select(params: Params, configs: slice) -> Params:
+    return Params(**{name: getattr(params, name)[configs] for name in Params.__dataclass_fields__})
+
+
+@dataclass
+class SweepResult:
+    sessions_per_config: int
+    configs: List[Dict[str, Any]]
+    endings: np.ndarray  # (configs, len(engine.ENDINGS)) session counts
+    unfinished: np.ndarray  # (configs,)
+    mean_day: np.ndarray  # (configs,) mean day the finished sessions ended on
+
+    def ending_rates(self) -> np.ndarray:
+        return self.endings / self.sessions_per_config
+
+    def table(self) -> List[Dict[str, Any]]:
+        """One row per configuration: its values, ending rates and mean ending day"""
+        rows = []
+        rates = self.ending_rates()
+        for i, config in enumerate(self.configs):
+            row = {name: "-".join(map(str, value)) if isinstance(value, tuple) else value
+                   for name, value in config.items()}
+            row.update({f"{name}_rate": round(float(rates[i, code]), 6) for name, code in ENDING_CODES.items()})
+            row["unfinished"] = int(self.unfinished[i])
+            row["mean_day"] = round(float(self.mean_day[i]), 3)
+            rows.append(row)
+        return rows
+
+
+def sweep(grid: Dict[str, Sequence[Any]], sessions_per_config: int, policy: BatchPolicy = random_policy,
+          seed: Optional[int] = None, max_steps: int = 10000, chunk_rows: int = CHUNK_ROWS) -> SweepResult:
+    """Play sessions_per_config weeks under every combination of the grid's values
+
+    All configurations in a chunk of at most chunk_rows sessions are
+    played in one lockstep pass, each row looking its values up by
+    configuration index.
+    """
+    params, configs = grid_params(grid)
+    n_configs = len(configs)
+    endings = np.zeros((n_configs, len(engine.ENDINGS)), dtype=np.int64)
+    unfinished = np.zeros(n_configs, dtype=np.int64)
+    day_totals = np.zeros(n_configs, dtype=np.int64)
+    per_chunk = max(1, chunk_rows // sessions_per_config)
+    seeds = np.random.SeedSequence(seed).spawn(-(-n_configs // per_chunk))
+    for chunk, start in enumerate(range(0, n_configs, per_chunk)):
+        part = slice(start, min(n_configs, start + per_chunk))
+        count = part.stop - part.start
+        config = np.repeat(np.arange(count), sessions_per_config)
+        batch = Batch(len(config), np.random.default_rng(seeds[chunk]), select(params, part), config,
+                      trajectories=False)
+        run(batch, policy, max_steps)
+        finished = batch.ending != NO_ENDING
+        keys = config[finished] * len(engine.ENDINGS) + batch.ending[finished]
+        endings[part] = np.bincount(keys, minlength=count * len(engine.ENDINGS)).reshape(count, -1)
+        unfinished[part] = np.bincount(config[~finished], minlength=count)
+        day_totals[part] = np.bincount(config[finished], weights=batch.day[finished], minlength=count)
+    finished = np.maximum(endings.sum(axis=1), 1)
+    return SweepResult(sessions_per_config, configs, endings, unfinished, day_totals / finished)
+
+
+def parse_values(name: str, text: str) -> List[Any]:
+    if name == "reflection_boost":
+        pairs = [value.split("-") for value in text.split(",")]
+        if any(len(pair) != 2 for pair in pairs):
+            raise ValueError("reflection_boost values are low-high ranges, such as 8-15,5-10")
+        return [(int(low), int(high)) for low, high in pairs]
+    if name in SCALE_PARAMS:
+        return [float(value) for value in text.split(",")]
+    return [int(value) for value in text.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep Life Unwritten balance values and tabulate ending rates")
+    parser.add_argument("--vary", action="append", default=[], metavar="NAME=V1,V2,...",
+                        help="candidate values of one parameter: good_bond, good_mood, bad_bond, bad_mood, "
+                             "reflection_boost (low-high), bond_scale, mood_scale or NPC:option:bond_change "
+                             "/ NPC:option:mood_change; repeat to sweep the product")
+    parser.add_argument("--sessions", type=int, default=1000, help="sessions per configuration")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    grid = {}
+    for spec in args.vary:
+        name, _, values = spec.partition("=")
+        try:
+            grid[name] = parse_values(name, values)
+        except ValueError as e:
+            parser.error(f"--vary {spec}: {e}")
+    try:
+        result = sweep(grid, args.sessions, seed=args.seed)
+    except ValueError as e:
+        parser.error(str(e))
+    table = result.table()
+    writer = csv.DictWriter(sys.stdout, fieldnames=list(table[0]))
+    writer.writeheader()
+    writer.writerows(table)
+
+
+if __name__ == "__main__":
+    main()
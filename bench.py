@@ -0,0 +1,284 @@
+"""Benchmarks for Life Unwritten
+
+Measures a fixed set of metrics and prints them as one flat JSON object,
+so two runs can be compared metric by metric:
+
+- latency of process_interaction_choice, end_day and review_choices with
+  histories of different lengths, rendering into a null screen
+- playthroughs per second, headless through engine.play and through the
+  full front-end with output discarded
+- cold start time of a fresh interpreter importing life_unwritten
+- memory per LifeUnwritten instance with 1, 1k and 100k live sessions
+- compile time and lookup latency of the dialogue rule index with 10,
+  1k and 100k generated rules
+
+Memory and startup are measured in child processes so they start clean.
+
+    python bench.py --output before.json
+    python bench.py --compare before.json
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Dict, List, Optional
+
+import dialogue
+import engine
+from life_unwritten import LifeUnwritten
+from renderer import Screen
+
+HISTORY_SIZES = (0, 1000, 10000, 100000)
+SESSION_COUNTS = (1, 1000, 100000)
+RULE_COUNTS = (10, 1000, 100000)
+LOOKUPS_PER_SAMPLE = 100
+# Inputs for one full week in the front-end: talk to Maya, end the day, repeat
+PLAYTHROUGH_INPUTS = ["Traveler", ""] + ["1", "1", "1", "", "5", ""] * engine.FINAL_DAY
+
+
+class NullStream:
+    def write(self, text: str):
+        pass
+
+    def flush(self):
+        pass
+
+
+class BenchScreen(Screen):
+    """Screen that renders frames into nothing and answers prompts from a list
+
+    Without a list every prompt is answered with an empty line.
+    """
+
+    def __init__(self, inputs: Optional[List[str]] = None):
+        super().__init__(NullStream(), instant=True)
+        self.lines = None if inputs is None else list(reversed(inputs))
+
+    async def read_line(self) -> str:
+        if self.lines is None:
+            return ""
+        if not self.lines:
+            raise EOFError("out of scripted input")
+        return self.lines.pop()
+
+
+def new_session(history: int = 0) -> LifeUnwritten:
+    """A game in progress on day 1 with a history of the given length"""
+    game = LifeUnwritten(None, BenchScreen(), seed=0)
+    game.state.player_name = "Traveler"
+    log = game.state.choices_made
+    for i in range(history):
+        log.add_interaction(1, i % len(engine.CHARACTERS), 0, 50, 50, 50, 50)
+    return game
+
+
+def summarize(samples: List[float], prefix: str) -> Dict[str, float]:
+    samples.sort()
+    return {
+        f"{prefix}.median_us": statistics.median(samples) * 1e6,
+        f"{prefix}.p95_us": samples[int(len(samples) * 0.95) - 1] * 1e6
+    }
+
+
+async def time_action(game: LifeUnwritten, action: str, repeat: int) -> List[float]:
+    character = next(iter(game.state.characters.values()))
+    samples = []
+    clock = time.perf_counter
+    for _ in range(repeat):
+        if action == "end_day":
+            game.state.day = 1  # stay clear of the final-day ending
+            game.state.game_over = False
+            start = clock()
+            await game.end_day()
+        elif action == "process_interaction_choice":
+            start = clock()
+            await game.process_interaction_choice(character, 1)
+        else:
+            start = clock()
+            await game.review_choices()
+        samples.append(clock() - start)
+    return samples
+
+
+def bench_latency(repeat: int, sizes=HISTORY_SIZES) -> Dict[str, float]:
+    results = {}
+    for action in ("process_interaction_choice", "end_day", "review_choices"):
+        for size in sizes:
+            samples = asyncio.run(time_action(new_session(size), action, repeat))
+            results.update(summarize(samples, f"latency.{action}.history_{size}"))
+    return results
+
+
+async def play_front_end(count: int):
+    for seed in range(count):
+        await LifeUnwritten(None, BenchScreen(PLAYTHROUGH_INPUTS), seed=seed).run()
+
+
+def bench_throughput(seconds: float) -> Dict[str, float]:
+    results = {}
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        engine.play(seed=count)
+        count += 1
+    results["throughput.engine_playthroughs_per_s"] = count / (time.perf_counter() - start)
+
+    batch = 50
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        asyncio.run(play_front_end(batch))
+        count += batch
+    results["throughput.front_end_playthroughs_per_s"] = count / (time.perf_counter() - start)
+    return results
+
+
+def run_python(code: str) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    return time.perf_counter() - start
+
+
+def bench_startup(repeat: int) -> Dict[str, float]:
+    bare = statistics.median(run_python("pass") for _ in range(repeat))
+    game = statistics.median(run_python("import life_unwritten") for _ in range(repeat))
+    return {
+        "startup.interpreter_ms": bare * 1e3,
+        "startup.import_life_unwritten_ms": game * 1e3,
+        "startup.import_overhead_ms": (game - bare) * 1e3
+    }
+
+
+def generated_rules(count: int, rng: random.Random) -> List[Dict[str, object]]:
+    """Dialogue rules with a spread of conditions over the pack's cast, like a large pack might have"""
+    moods = sorted({profile["current_mood"] for profile in engine.PROFILES})
+    rules = []
+    for i in range(count):
+        rule: Dict[str, object] = {"response": f"rule {i}"}
+        if rng.random() < 0.8:
+            rule["npc"] = rng.choice(engine.NAMES)
+        if rng.random() < 0.3:
+            rule["npc_mood"] = rng.choice(moods)
+        if rng.random() < 0.3:
+            rule["last_option"] = rng.choice((None, 0, 1, 2))
+        for field, top in (("bond", 100), ("mood", 100), ("day", engine.FINAL_DAY)):
+            if rng.random() < 0.6:
+                low = rng.randint(1 if field == "day" else 0, top)
+                rule[field] = [low, rng.randint(low, top)]
+        if rng.random() < 0.1:
+            rule["priority"] = rng.randint(1, 3)
+        rules.append(rule)
+    return rules
+
+
+def bench_dialogue(repeat: int, counts=RULE_COUNTS) -> Dict[str, float]:
+    results = {}
+    rng = random.Random(0)
+    moods = [profile["current_mood"] for profile in engine.PROFILES]
+    queries = [(npc_id, moods[npc_id], rng.choice((dialogue.NEVER_TALKED, 0, 1, 2)), rng.randint(0, 100),
+                rng.randint(0, 100), rng.randint(1, engine.FINAL_DAY))
+               for npc_id in (rng.randrange(len(moods)) for _ in range(LOOKUPS_PER_SAMPLE))]
+    for count in counts:
+        rules = generated_rules(count, rng)
+        start = time.perf_counter()
+        index = dialogue.RuleIndex(rules)
+        results[f"dialogue.rules_{count}.compile_ms"] = (time.perf_counter() - start) * 1e3
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for query in queries:
+                index.match(*query)
+            samples.append((time.perf_counter() - start) / LOOKUPS_PER_SAMPLE)
+        results.update(summarize(samples, f"dialogue.rules_{count}.lookup"))
+    return results
+
+
+def rss() -> int:
+    """Resident set size of this process in bytes"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def measure_sessions(count: int) -> Dict[str, float]:
+    """Memory of count live sessions; run in a child process by bench_memory"""
+    new_session()  # load content and warm caches first
+    gc.collect()
+    tracemalloc.start()
+    before = rss()
+    sessions = [new_session() for _ in range(count)]
+    gc.collect()
+    traced = tracemalloc.get_traced_memory()[0]
+    resident = rss() - before
+    tracemalloc.stop()
+    del sessions
+    return {"traced": traced / count, "rss": resident / count}
+
+
+def bench_memory(counts=SESSION_COUNTS) -> Dict[str, float]:
+    results = {}
+    here = os.path.dirname(os.path.abspath(__file__))
+    for count in counts:
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), "--sessions", str(count)],
+                             check=True, capture_output=True, text=True, cwd=here).stdout
+        measured = json.loads(out)
+        results[f"memory.sessions_{count}.traced_bytes_per_session"] = measured["traced"]
+        results[f"memory.sessions_{count}.rss_bytes_per_session"] = measured["rss"]
+    return results
+
+
+def compare(old: Dict[str, float], new: Dict[str, float]):
+    for name, value in new.items():
+        if name in old and isinstance(value, (int, float)) and old[name]:
+            change = (value - old[name]) / old[name] * 100
+            print(f"{name:70} {old[name]:14.2f} {value:14.2f} {change:+8.1f}%", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Life Unwritten and print the results as JSON")
+    parser.add_argument("--quick", action="store_true", help="fewer repetitions and at most 10k sessions")
+    parser.add_argument("--output", metavar="PATH", help="also write the results to PATH")
+    parser.add_argument("--compare", metavar="PATH", help="show the change against an earlier results file")
+    parser.add_argument("--sessions", type=int, help=argparse.SUPPRESS)  # child process for bench_memory
+    args = parser.parse_args()
+
+    if args.sessions:
+        print(json.dumps(measure_sessions(args.sessions)))
+        return
+
+    repeat = 50 if args.quick else 300
+    results = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z")
+    }
+    results.update(bench_latency(repeat))
+    results.update(bench_throughput(1.0 if args.quick else 5.0))
+    results.update(bench_startup(5 if args.quick else 20))
+    results.update(bench_memory((1, 1000, 10000) if args.quick else SESSION_COUNTS))
+    results.update(bench_dialogue(repeat))
+
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
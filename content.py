@@ -0,0 +1,347 @@
+"""Story content for Life Unwritten
+
+Everything the game says lives in a JSON content pack (story.json by
+default, or the file named by the LIFE_UNWRITTEN_CONTENT environment
+variable): the cast, their dialogue scenarios, the dialogue rules that
+vary what they say (see dialogue.py), follow-up lines, reflection
+prompts, the opening story and the ending texts. Sessions refer to
+entries here by index instead of copying the text.
+
+The pack is validated once and compiled to a binary cache next to it,
+which is rebuilt whenever the pack's content hash changes. The cache
+starts with a small index holding each NPC's name and starting state
+plus the shared tables; the rest of an NPC (backstory and dialogue) is
+a separate record that is only decoded the first time that NPC is
+talked to, so a large cast costs little at startup. npc_profile(),
+npc_name(), npc_backstory() and npc_scenario() also answer for ids past
+the pack's cast, the acquaintances procgen.py generates for endless mode.
+"""
+
+import hashlib
+import json
+import marshal
+import mmap
+import os
+import struct
+import sys
+from collections.abc import Sequence
+from typing import Any, Dict, List, Optional, Tuple
+
+PACK_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "story.json")
+CACHE_MAGIC = b"LUPACK2\n"
+HEADER = struct.Struct("<8s32sI")  # magic, content hash, index length
+
+ENDING_NAMES = ("good", "bad", "neutral")
+TEMPLATE_FIELDS = {"player_name": "", "mood": "", "day": 0, "choices": 0}
+PROFILE_FIELDS = ("name", "relationship", "bond_level", "last_interaction", "current_mood")
+# Conditions a dialogue rule may have, see dialogue.py; ranges are (lowest, highest allowed bound)
+RULE_RANGES = {"bond": (0, 100), "mood": (0, 100), "day": (1, None)}
+RULE_FIELDS = {"response", "npc", "npc_mood", "last_option", "priority", *RULE_RANGES}
+
+
+class ContentError(ValueError):
+    """The content pack is malformed"""
+
+
+def cache_path(path: str) -> str:
+    return path + ".cache"
+
+
+# Validation
+
+def expect(value: Any, kind: type, where: str) -> Any:
+    if not isinstance(value, kind) or (kind is int and isinstance(value, bool)):
+        raise ContentError(f"{where}: expected {kind.__name__}, got {type(value).__name__}")
+    return value
+
+
+def expect_text_list(value: Any, where: str) -> List[str]:
+    expect(value, list, where)
+    if not value:
+        raise ContentError(f"{where}: must not be empty")
+    for i, text in enumerate(value):
+        expect(text, str, f"{where}[{i}]")
+    return value
+
+
+def expect_template(value: Any, where: str) -> str:
+    expect(value, str, where)
+    try:
+        value.format(**TEMPLATE_FIELDS)
+    except (KeyError, IndexError, ValueError) as e:
+        raise ContentError(f"{where}: bad template field {e}") from None
+    return value
+
+
+def validate_scenario(scenario: Any, where: str):
+    expect(scenario, dict, where)
+    expect(scenario.get("response"), str, f"{where}.response")
+    options = expect(scenario.get("options"), list, f"{where}.options")
+    if not options:
+        raise ContentError(f"{where}.options: must not be empty")
+    for i, option in enumerate(options):
+        at = f"{where}.options[{i}]"
+        expect(option, dict, at)
+        expect(option.get("text"), str, f"{at}.text")
+        expect(option.get("bond_change"), int, f"{at}.bond_change")
+        expect(option.get("mood_change"), int, f"{at}.mood_change")
+
+
+def validate_rule(rule: Any, where: str, names: set):
+    expect(rule, dict, where)
+    unknown = set(rule) - RULE_FIELDS
+    if unknown:
+        raise ContentError(f"{where}: unknown condition {sorted(unknown)[0]!r}")
+    expect(rule.get("response"), str, f"{where}.response")
+    if "npc" in rule and expect(rule["npc"], str, f"{where}.npc") not in names:
+        raise ContentError(f"{where}.npc: no character named {rule['npc']!r}")
+    if "npc_mood" in rule:
+        expect(rule["npc_mood"], str, f"{where}.npc_mood")
+    if rule.get("last_option") is not None and expect(rule["last_option"], int, f"{where}.last_option") < 0:
+        raise ContentError(f"{where}.last_option: must be an option index or null")
+    if "priority" in rule:
+        expect(rule["priority"], int, f"{where}.priority")
+    for field, (lowest, highest) in RULE_RANGES.items():
+        if field not in rule:
+            continue
+        bounds = expect(rule[field], list, f"{where}.{field}")
+        if len(bounds) != 2:
+            raise ContentError(f"{where}.{field}: expected [low, high]")
+        low = expect(bounds[0], int, f"{where}.{field}[0]")
+        high = bounds[1] if bounds[1] is None else expect(bounds[1], int, f"{where}.{field}[1]")
+        if low < lowest or (high is not None and (high < low or highest is not None and high > highest)):
+            raise ContentError(f"{where}.{field}: {bounds} is not a range inside {lowest}-{highest or 'any'}")
+
+
+def validate(pack: Any):
+    """Check the structure of a decoded content pack, raising ContentError"""
+    expect(pack, dict, "pack")
+    characters = expect(pack.get("characters"), list, "characters")
+    if not characters:
+        raise ContentError("characters: must not be empty")
+    names = set()
+    for i, char in enumerate(characters):
+        where = f"characters[{i}]"
+        expect(char, dict, where)
+        for field in ("name", "relationship", "last_interaction", "backstory", "current_mood"):
+            expect(char.get(field), str, f"{where}.{field}")
+        if char["name"] in names:
+            raise ContentError(f"{where}.name: duplicate name {char['name']!r}")
+        names.add(char["name"])
+        if not 0 <= expect(char.get("bond_level"), int, f"{where}.bond_level") <= 100:
+            raise ContentError(f"{where}.bond_level: must be between 0 and 100")
+        if "scenario" in char:
+            validate_scenario(char["scenario"], f"{where}.scenario")
+    validate_scenario(pack.get("default_scenario"), "default_scenario")
+    for i, rule in enumerate(expect(pack.get("dialogue_rules", []), list, "dialogue_rules")):
+        validate_rule(rule, f"dialogue_rules[{i}]", names)
+
+    follow_ups = expect(pack.get("follow_ups"), list, "follow_ups")
+    for i, tier in enumerate(follow_ups):
+        expect(tier, dict, f"follow_ups[{i}]")
+        expect(tier.get("min_bond_change"), int, f"follow_ups[{i}].min_bond_change")
+        expect_text_list(tier.get("responses"), f"follow_ups[{i}].responses")
+    expect_text_list(pack.get("negative_follow_ups"), "negative_follow_ups")
+
+    reflections = expect(pack.get("reflections"), list, "reflections")
+    if not reflections:
+        raise ContentError("reflections: must not be empty")
+    for i, reflection in enumerate(reflections):
+        expect(reflection, dict, f"reflections[{i}]")
+        expect(reflection.get("prompt"), str, f"reflections[{i}].prompt")
+        expect_text_list(reflection.get("responses"), f"reflections[{i}].responses")
+
+    expect_template(pack.get("opening"), "opening")
+    endings = expect(pack.get("endings"), dict, "endings")
+    for name in ENDING_NAMES:
+        ending = expect(endings.get(name), dict, f"endings.{name}")
+        expect_template(ending.get("intro"), f"endings.{name}.intro")
+        expect_template(ending.get("outro"), f"endings.{name}.outro")
+
+
+# Compiled cache
+
+def compile_pack(pack: Dict[str, Any], digest: bytes) -> bytes:
+    """Build the binary cache for a validated pack"""
+    records = []
+    offsets = []
+    position = 0
+    for char in pack["characters"]:
+        scenario = char.get("scenario")
+        if scenario is not None:
+            scenario = (scenario["response"],
+                        tuple((o["text"], o["bond_change"], o["mood_change"]) for o in scenario["options"]))
+        record = marshal.dumps((char["backstory"], scenario))
+        records.append(record)
+        offsets.append((position, len(record)))
+        position += len(record)
+
+    index = marshal.dumps({
+        "profiles": [tuple(char[field] for field in PROFILE_FIELDS) for char in pack["characters"]],
+        "offsets": offsets,
+        "default_scenario": pack["default_scenario"],
+        "dialogue_rules": pack.get("dialogue_rules", []),
+        "follow_ups": [(tier["min_bond_change"], tier["responses"]) for tier in pack["follow_ups"]],
+        "negative_follow_ups": pack["negative_follow_ups"],
+        "reflections": pack["reflections"],
+        "opening": pack["opening"],
+        "endings": pack["endings"]
+    })
+    return HEADER.pack(CACHE_MAGIC, digest, len(index)) + index + b"".join(records)
+
+
+def content_hash(raw: bytes) -> bytes:
+    # marshal's format belongs to the interpreter, so the version is part of the key
+    return hashlib.sha256(raw + marshal.version.to_bytes(4, "little")).digest()
+
+
+def open_cache(path: str, digest: bytes) -> Optional[mmap.mmap]:
+    """Map the cache file if it was compiled from content with this hash"""
+    try:
+        with open(path, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (FileNotFoundError, ValueError):
+        return None
+    if len(data) < HEADER.size or HEADER.unpack_from(data)[:2] != (CACHE_MAGIC, digest):
+        data.close()
+        return None
+    return data
+
+
+def write_cache(path: str, compiled: bytes):
+    """Replace the cache atomically; an unwritable directory just means no cache"""
+    temp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp, "wb") as f:
+            f.write(compiled)
+        os.replace(temp, path)
+    except OSError:
+        try:
+            os.remove(temp)
+        except OSError:
+            pass
+
+
+class ContentPack:
+    """A compiled pack: the index decoded up front, NPC records on demand"""
+
+    def __init__(self, path: str = PACK_FILE):
+        self.path = path
+        with open(path, "rb") as f:
+            raw = f.read()
+        digest = content_hash(raw)
+        data = open_cache(cache_path(path), digest)
+        if data is None:
+            try:
+                pack = json.loads(raw)
+            except ValueError as e:
+                raise ContentError(f"{path}: {e}") from None
+            validate(pack)
+            data = compile_pack(pack, digest)
+            write_cache(cache_path(path), data)
+        self.data = data
+
+        _, _, index_length = HEADER.unpack_from(data)
+        start = HEADER.size
+        index = marshal.loads(data[start:start + index_length])
+        self.records_start = start + index_length
+        self.offsets: List[Tuple[int, int]] = index["offsets"]
+        self.profiles = [dict(zip(PROFILE_FIELDS, profile)) for profile in index["profiles"]]
+        self.default_scenario = index["default_scenario"]
+        self.dialogue_rules = index["dialogue_rules"]
+        self.follow_ups = index["follow_ups"]
+        self.negative_follow_ups = index["negative_follow_ups"]
+        self.reflections = index["reflections"]
+        self.opening = index["opening"]
+        self.endings = index["endings"]
+        self.details: List[Optional[Tuple[str, Optional[Dict[str, Any]]]]] = [None] * len(self.profiles)
+
+    def npc(self, npc_id: int) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """(backstory, scenario or None) of an NPC, decoded on first use"""
+        details = self.details[npc_id]
+        if details is None:
+            offset, length = self.offsets[npc_id]
+            start = self.records_start + offset
+            backstory, scenario = marshal.loads(self.data[start:start + length])
+            if scenario is not None:
+                response, options = scenario
+                scenario = {
+                    "response": response,
+                    "options": [{"text": text, "bond_change": bond, "mood_change": mood}
+                                for text, bond, mood in options]
+                }
+            details = self.details[npc_id] = (backstory, scenario)
+        return details
+
+
+class CharacterTable(Sequence):
+    """The cast as profile dicts; backstories are filled in as they are needed"""
+
+    def __init__(self, pack: ContentPack):
+        self.pack = pack
+
+    def __len__(self) -> int:
+        return len(self.pack.profiles)
+
+    def __getitem__(self, npc_id):
+        if isinstance(npc_id, slice):
+            return [self[i] for i in range(*npc_id.indices(len(self)))]
+        profile = self.pack.profiles[npc_id]
+        if "backstory" not in profile:
+            profile["backstory"] = self.pack.npc(npc_id % len(self))[0]
+        return profile
+
+
+PACK = ContentPack(os.environ.get("LIFE_UNWRITTEN_CONTENT", PACK_FILE))
+
+PROFILES = PACK.profiles  # starting state of every NPC, without the lazily read backstory
+NAMES = [profile["name"] for profile in PROFILES]
+NPC_IDS = {name: npc_id for npc_id, name in enumerate(NAMES)}
+CHARACTERS = CharacterTable(PACK)
+DEFAULT_SCENARIO = PACK.default_scenario
+DIALOGUE_RULES = PACK.dialogue_rules  # compiled into an index by dialogue.py
+# (minimum bond change, responses) pairs, checked from the top
+FOLLOW_UP_RESPONSES = PACK.follow_ups
+NEGATIVE_FOLLOW_UPS = PACK.negative_follow_ups
+REFLECTIONS = PACK.reflections
+OPENING = PACK.opening
+ENDINGS = PACK.endings
+
+
+def npc_scenario(npc_id: int) -> dict:
+    """Dialogue scenario for an NPC by id"""
+    if npc_id >= len(PROFILES):
+        import procgen  # acquaintances of endless mode are generated, not read from the pack
+        return procgen.scenario(npc_id)
+    scenario = PACK.npc(npc_id)[1]
+    return DEFAULT_SCENARIO if scenario is None else scenario
+
+
+def npc_profile(npc_id: int) -> Dict[str, Any]:
+    """Starting profile of an NPC by id, generated for ids past the pack's cast"""
+    if npc_id < len(PROFILES):
+        return PROFILES[npc_id]
+    import procgen
+    return procgen.profile(npc_id)
+
+
+def npc_name(npc_id: int) -> str:
+    return NAMES[npc_id] if npc_id < len(NAMES) else npc_profile(npc_id)["name"]
+
+
+def npc_backstory(npc_id: int) -> str:
+    return CHARACTERS[npc_id]["backstory"] if npc_id < len(NAMES) else npc_profile(npc_id)["backstory"]
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else PACK_FILE
+    try:
+        pack = ContentPack(path)
+    except ContentError as e:
+        sys.exit(f"Invalid content pack: {e}")
+    print(f"{path}: {len(pack.profiles)} characters, {len(pack.reflections)} reflections, "
+          f"compiled to {cache_path(path)}")
+
+
+if __name__ == "__main__":
+    main()
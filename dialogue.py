@@ -0,0 +1,142 @@
+"""Dialogue rules for Life Unwritten
+
+What an NPC says when the player reaches out can depend on the moment.
+The content pack's dialogue_rules each give a response and any of these
+conditions:
+
+    npc          name of the NPC the rule is for
+    npc_mood     the NPC's current_mood
+    last_option  the option the player picked the last time they talked
+                 to the NPC, or null for an NPC they haven't talked to yet
+    bond, mood, day
+                 inclusive [low, high] ranges of the NPC's bond, the
+                 player's mood and the day; high may be null
+
+and an optional priority (0 by default). Of the rules that match, the
+one with the highest priority wins, then the one earliest in the pack;
+when none match, the NPC's scenario response is used.
+
+The rules are compiled once per process. Rules with the same npc,
+npc_mood and last_option (each possibly left open) share a bucket, so a
+lookup only visits the few buckets its keys can hit. Inside a bucket,
+each of bond, mood and day has a sorted table of the points where a
+range starts or ends, holding a bitmask of the rules that cover the
+values from there to the next point. The highest bit is the bucket's
+first rule in order, so one bisect per table, an AND of three masks and
+the length of the result give the winning rule. A lookup tries at most
+eight buckets, and only the AND grows with the rules in a bucket, at one
+machine word per 30 of them: bench.py measures about the same lookup
+time for 100,000 rules as for 1,000.
+
+    response = dialogue.index().match(npc_id, "distant", NEVER_TALKED, bond=60, mood=50, day=1)
+"""
+
+from bisect import bisect_right
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import content
+
+NEVER_TALKED = -1  # last_option of an NPC the player hasn't talked to yet
+OPEN_RANGE = (0, None)
+
+Key = Tuple[Optional[int], Optional[str], Optional[int]]  # npc_id, npc_mood, last_option; None matches any
+
+
+class Thresholds:
+    """Bitmasks of the rules whose range covers each stretch of values"""
+
+    __slots__ = ('starts', 'masks')
+
+    def __init__(self, ranges: Iterable[Sequence[Optional[int]]]):
+        ranges = list(ranges)
+        edges = {0}
+        for low, high in ranges:
+            edges.add(low)
+            if high is not None:
+                edges.add(high + 1)
+        self.starts = sorted(edges)
+        position = {value: i for i, value in enumerate(self.starts)}
+        opened = [0] * len(self.starts)
+        closed = [0] * len(self.starts)
+        for bit, (low, high) in enumerate(ranges):
+            opened[position[low]] |= 1 << bit
+            if high is not None:
+                closed[position[high + 1]] |= 1 << bit
+        self.masks: List[int] = []
+        mask = 0
+        for add, drop in zip(opened, closed):
+            mask = (mask | add) & ~drop
+            self.masks.append(mask)
+
+    def __getitem__(self, value: int) -> int:
+        return self.masks[bisect_right(self.starts, value) - 1]
+
+
+class Bucket:
+    """Rules sharing their discrete conditions, as threshold tables over the ranges"""
+
+    __slots__ = ('ranks', 'bond', 'mood', 'day')
+
+    def __init__(self, ranks: List[int], rules: List[Dict[str, Any]]):
+        self.ranks = ranks  # bit -> rank of the rule, best (lowest rank) last
+        self.bond = Thresholds(rule.get("bond", OPEN_RANGE) for rule in rules)
+        self.mood = Thresholds(rule.get("mood", OPEN_RANGE) for rule in rules)
+        self.day = Thresholds(rule.get("day", OPEN_RANGE) for rule in rules)
+
+    def best(self, bond: int, mood: int, day: int) -> Optional[int]:
+        """Rank of the first rule that matches, if any"""
+        matches = self.bond[bond] & self.mood[mood] & self.day[day]
+        if not matches:
+            return None
+        return self.ranks[matches.bit_length() - 1]
+
+
+def rule_key(rule: Dict[str, Any]) -> Key:
+    npc = rule.get("npc")
+    last_option = rule.get("last_option")
+    if "last_option" in rule and last_option is None:
+        last_option = NEVER_TALKED
+    return (None if npc is None else content.NPC_IDS[npc], rule.get("npc_mood"), last_option)
+
+
+class RuleIndex:
+    """Compiled dialogue rules"""
+
+    def __init__(self, rules: Sequence[Dict[str, Any]]):
+        # sorting is stable, so rules of equal priority keep their order in the pack
+        order = sorted(range(len(rules)), key=lambda i: -rules[i].get("priority", 0))
+        self.responses = [rules[i]["response"] for i in order]
+        grouped: Dict[Key, List[int]] = {}
+        for rank, i in enumerate(order):
+            grouped.setdefault(rule_key(rules[i]), []).append(rank)
+        self.buckets = {key: Bucket(ranks[::-1], [rules[order[rank]] for rank in reversed(ranks)])
+                        for key, ranks in grouped.items()}
+        # which of the keys each bucket leaves open, so a lookup only tries combinations that exist
+        self.patterns = sorted({tuple(part is None for part in key) for key in self.buckets})
+
+    def __len__(self) -> int:
+        return len(self.responses)
+
+    def match(self, npc_id: int, npc_mood: str, last_option: int, bond: int, mood: int, day: int) -> Optional[str]:
+        """The response of the winning rule, or None when no rule matches"""
+        best = None
+        buckets = self.buckets
+        for any_npc, any_mood, any_option in self.patterns:
+            bucket = buckets.get((None if any_npc else npc_id, None if any_mood else npc_mood,
+                                  None if any_option else last_option))
+            if bucket is not None:
+                rank = bucket.best(bond, mood, day)
+                if rank is not None and (best is None or rank < best):
+                    best = rank
+        return None if best is None else self.responses[best]
+
+
+_index: Optional[RuleIndex] = None
+
+
+def index() -> RuleIndex:
+    """The content pack's rules, compiled on first use"""
+    global _index
+    if _index is None:
+        _index = RuleIndex(content.DIALOGUE_RULES)
+    return _index
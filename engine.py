@@ -0,0 +1,604 @@
+"""Headless rules engine for Life Unwritten
+
+Holds the game state and the rules that move a session forward.
+Nothing in here prints, prompts or sleeps: the terminal front-end in
+life_unwritten.py and any automated driver both go through step(), so a
+full week of play can be simulated in a tight loop.
+"""
+
+import random
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Dict, Iterator, List, Any, Mapping, Optional, Sequence, Tuple, Union
+
+from content import (CHARACTERS, PROFILES, NAMES, NPC_IDS, FOLLOW_UP_RESPONSES,
+                     NEGATIVE_FOLLOW_UPS, REFLECTIONS, npc_scenario, npc_profile, npc_name,
+                     npc_backstory)
+import dialogue
+from history import ChoiceLog, OPTION
+from recording import new_seed
+
+MIN_LEVEL = 0
+MAX_LEVEL = 100
+STARTING_MOOD = 50
+FINAL_DAY = 7
+MAX_REFLECTIONS_PER_DAY = 2
+REFLECTION_BOOST = (8, 15)
+
+# Bounds of the legal action caches: endless games keep meeting new NPCs,
+# so both the NPCs and the cast sizes seen grow without limit
+ACTION_CACHE_SIZE = 4096  # NPCs whose Interact actions are kept
+CAST_CACHE_SIZE = 64  # cast sizes whose full action lists are kept
+
+# Ending thresholds checked at the end of every day
+GOOD_ENDING_BOND = 75
+GOOD_ENDING_MOOD = 70
+BAD_ENDING_BOND = 20
+BAD_ENDING_MOOD = 30
+
+ENDINGS = ("good", "bad", "neutral")
+
+# Lowest bond of each tier, strongest first; the same bands as the
+# bond descriptions on screen
+TIER_FLOORS = (80, 60, 40, 20, 0)
+TIER_NAMES = ("Strong Bond", "Good Connection", "Strained", "Distant", "Broken")
+
+
+class Character:
+    """One NPC in a session
+
+    Only the fields that change during play are stored per instance; the
+    name, relationship and backstory are read from the shared content
+    tables, or the endless mode generator, by npc_id.
+    """
+
+    __slots__ = ('npc_id', 'bond_level', 'last_interaction', 'current_mood')
+
+    def __init__(self, npc_id: int, bond_level: Optional[int] = None,
+                 last_interaction: Optional[str] = None, current_mood: Optional[str] = None):
+        profile = npc_profile(npc_id)
+        self.npc_id = npc_id
+        self.bond_level = profile["bond_level"] if bond_level is None else bond_level  # 0-100
+        self.last_interaction = profile["last_interaction"] if last_interaction is None else last_interaction
+        self.current_mood = profile["current_mood"] if current_mood is None else current_mood
+
+    @property
+    def name(self) -> str:
+        return npc_name(self.npc_id)
+
+    @property
+    def relationship(self) -> str:
+        return npc_profile(self.npc_id)["relationship"]
+
+    @property
+    def backstory(self) -> str:
+        return npc_backstory(self.npc_id)
+
+    def __repr__(self):
+        return f"Character({self.name!r}, bond_level={self.bond_level})"
+
+
+class SharedCharacter(Character):
+    """A Character of the world template, read by every session that hasn't changed it"""
+
+    __slots__ = ()
+
+    def __init__(self, npc_id: int):
+        character = Character(npc_id)
+        for field in Character.__slots__:
+            object.__setattr__(self, field, getattr(character, field))
+
+    def __setattr__(self, field, value):
+        raise AttributeError(f"{self.name} is shared by every session; "
+                             f"change state.characters.own({self.name!r}) instead")
+
+
+def tier(bond_level: int) -> int:
+    """Index into TIER_FLOORS of the tier a bond level falls in"""
+    for i, floor in enumerate(TIER_FLOORS):
+        if bond_level >= floor:
+            return i
+    return len(TIER_FLOORS) - 1
+
+
+class RelationshipStats:
+    """Aggregates over the cast's bond levels, updated in O(1) per bond change"""
+
+    __slots__ = ('count', 'total', 'levels', 'tiers', 'min_bond', 'max_bond', 'good_bonds', 'bad_bonds')
+
+    def __init__(self, bond_levels=()):
+        self.count = 0
+        self.total = 0
+        self.levels = [0] * (MAX_LEVEL + 1)  # NPCs at each bond level
+        self.tiers = [0] * len(TIER_FLOORS)  # NPCs in each bond tier
+        self.min_bond = MAX_LEVEL
+        self.max_bond = MIN_LEVEL
+        self.good_bonds = 0  # NPCs at or above GOOD_ENDING_BOND
+        self.bad_bonds = 0  # NPCs at or below BAD_ENDING_BOND
+        for bond_level in bond_levels:
+            self.add(bond_level)
+
+    def add(self, bond_level: int):
+        self.count += 1
+        self.total += bond_level
+        self.levels[bond_level] += 1
+        self.tiers[tier(bond_level)] += 1
+        self.min_bond = min(self.min_bond, bond_level)
+        self.max_bond = max(self.max_bond, bond_level)
+        self.good_bonds += bond_level >= GOOD_ENDING_BOND
+        self.bad_bonds += bond_level <= BAD_ENDING_BOND
+
+    def copy(self) -> "RelationshipStats":
+        stats = RelationshipStats()
+        for field in self.__slots__:
+            setattr(stats, field, getattr(self, field))
+        stats.levels = self.levels[:]
+        stats.tiers = self.tiers[:]
+        return stats
+
+    def move(self, old_bond: int, new_bond: int):
+        """Account for one NPC's bond changing"""
+        if old_bond == new_bond:
+            return
+        levels = self.levels
+        self.total += new_bond - old_bond
+        levels[old_bond] -= 1
+        levels[new_bond] += 1
+        self.tiers[tier(old_bond)] -= 1
+        self.tiers[tier(new_bond)] += 1
+        self.good_bonds += (new_bond >= GOOD_ENDING_BOND) - (old_bond >= GOOD_ENDING_BOND)
+        self.bad_bonds += (new_bond <= BAD_ENDING_BOND) - (old_bond <= BAD_ENDING_BOND)
+        # The extremes move to the next occupied level, at most 100 steps away
+        if new_bond < self.min_bond:
+            self.min_bond = new_bond
+        elif old_bond == self.min_bond and not levels[old_bond]:
+            while not levels[self.min_bond]:
+                self.min_bond += 1
+        if new_bond > self.max_bond:
+            self.max_bond = new_bond
+        elif old_bond == self.max_bond and not levels[old_bond]:
+            while not levels[self.max_bond]:
+                self.max_bond -= 1
+
+    @property
+    def average(self) -> float:
+        return self.total / self.count
+
+
+class World:
+    """The starting cast, built once per process and shared by every new session"""
+
+    __slots__ = ('characters', 'stats')
+
+    def __init__(self):
+        self.characters = tuple(SharedCharacter(npc_id) for npc_id in range(len(NAMES)))
+        self.stats = RelationshipStats(char.bond_level for char in self.characters)
+
+
+_WORLD: Optional[World] = None
+
+
+def world() -> World:
+    global _WORLD
+    if _WORLD is None:
+        _WORLD = World()
+    return _WORLD
+
+
+class Cast(Mapping[str, Character]):
+    """A session's characters by name, copied from the world template on first write
+
+    Reading gives the shared character until the session calls own(),
+    which makes a private copy that every later read returns.
+    """
+
+    __slots__ = ('world', 'changed')
+
+    def __init__(self, template: World):
+        self.world = template
+        self.changed: Dict[int, Character] = {}  # npc_id -> this session's own copy
+
+    def __getitem__(self, name: str) -> Character:
+        npc_id = NPC_IDS[name]
+        character = self.changed.get(npc_id)
+        return self.world.characters[npc_id] if character is None else character
+
+    def npc_id(self, name: str) -> int:
+        return NPC_IDS[name]
+
+    def shared(self, npc_id: int) -> Character:
+        """The template every session starts from for an NPC"""
+        return self.world.characters[npc_id]
+
+    def __contains__(self, name) -> bool:
+        return name in NPC_IDS
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(NAMES)
+
+    def __len__(self) -> int:
+        return len(self.world.characters)
+
+    def values(self) -> Iterator[Character]:
+        changed = self.changed
+        return (changed.get(npc_id, char) for npc_id, char in enumerate(self.world.characters))
+
+    def own(self, name: str) -> Character:
+        """The session's writable copy of a character, made on first use"""
+        npc_id = self.npc_id(name)
+        character = self.changed.get(npc_id)
+        if character is None:
+            shared = self.shared(npc_id)
+            character = Character(npc_id, shared.bond_level, shared.last_interaction, shared.current_mood)
+            self.changed[npc_id] = character
+        return character
+
+    def put(self, character: Character):
+        """Replace a character with the given one, unless it matches the template"""
+        shared = self.shared(character.npc_id)
+        if (character.bond_level, character.last_interaction, character.current_mood) == \
+                (shared.bond_level, shared.last_interaction, shared.current_mood):
+            self.changed.pop(character.npc_id, None)
+        else:
+            self.changed[character.npc_id] = character
+
+    def changes(self) -> Iterator[Tuple[Character, Character]]:
+        """(template, own copy) for every character the session has taken a copy of"""
+        return ((self.shared(npc_id), char) for npc_id, char in self.changed.items())
+
+    def newcomers(self) -> Iterator[Character]:
+        """Templates of the NPCs that joined the cast after the world was built"""
+        return iter(())
+
+
+class GameState:
+    __slots__ = ('player_name', 'mood', 'day', 'choices_made', 'characters', 'game_over',
+                 'ending', 'reflection_count', 'journal', 'roster', 'stats', 'seed', '_rng', 'recording',
+                 'endless')
+
+    def __init__(self, seed: Optional[int] = None):
+        self.player_name = ""
+        self.mood = STARTING_MOOD  # 0-100, 50 is neutral
+        self.day = 1
+        self.choices_made = ChoiceLog()
+        self.characters = Cast(world())
+        self.game_over = False
+        self.ending = None  # "good", "bad" or "neutral" once the game is over
+        self.reflection_count = 0
+        self.journal = None  # optional journal.Journal that persists every choice
+        self.roster = None  # roster.Roster index, built the first time a menu needs it
+        self.stats = None  # RelationshipStats, built on first use by relationship_stats()
+        self.seed = new_seed() if seed is None else seed
+        self._rng = None
+        self.recording = None  # optional recording.Recording of the session
+        self.endless = False  # no endings; a generated acquaintance joins every day (see procgen.py)
+
+    @property
+    def rng(self) -> random.Random:
+        """This session's own random stream, created on the first draw"""
+        if self._rng is None:
+            self._rng = random.Random(self.seed)
+        return self._rng
+
+    @rng.setter
+    def rng(self, rng: random.Random):
+        self._rng = rng
+
+    def set_bond(self, character: Character, bond_level: int):
+        """Change a bond level, keeping the stats and roster index in step"""
+        old_bond = character.bond_level
+        character.bond_level = bond_level
+        if self.stats is not None:
+            self.stats.move(old_bond, bond_level)
+        if self.roster is not None:
+            self.roster.move(character.npc_id, old_bond, bond_level)
+
+    def add_character(self, character: Character):
+        """Count an NPC that has just joined the cast in the stats and roster index"""
+        if self.stats is not None:
+            self.stats.add(character.bond_level)
+        if self.roster is not None:
+            self.roster.add(character.npc_id, character.bond_level)
+
+    def save_interaction(self, character: Character, option: int, old_bond: int, old_mood: int):
+        record = self.choices_made.add_interaction(self.day, character.npc_id, option, old_mood,
+                                                   self.mood, old_bond, character.bond_level)
+        if self.journal is not None:
+            self.journal.append(record)
+
+    def save_reflection(self, prompt: int, boost: int, old_mood: int):
+        record = self.choices_made.add_reflection(self.day, prompt, boost, old_mood, self.mood)
+        if self.journal is not None:
+            self.journal.append(record)
+
+    def checkpoint(self):
+        """Snapshot the state into the journal, done at the end of every day"""
+        if self.journal is not None:
+            self.journal.snapshot(self)
+
+
+# Actions accepted by step()
+
+@dataclass(frozen=True)
+class Interact:
+    npc: str
+    option: int  # 0-based index into the scenario options
+
+
+@dataclass(frozen=True)
+class Reflect:
+    prompt: Optional[int] = None  # drawn from the rng when not given
+    response: int = 0
+
+
+@dataclass(frozen=True)
+class EndDay:
+    pass
+
+
+REFLECT = Reflect()
+END_DAY = EndDay()
+
+Action = Union[Interact, Reflect, EndDay]
+Event = Dict[str, Any]
+
+
+def clamp(value: int) -> int:
+    """Keep a bond or mood value inside the 0-100 range"""
+    return max(MIN_LEVEL, min(MAX_LEVEL, value))
+
+
+def initialize_characters() -> Cast:
+    """A fresh cast of NPCs keyed by name, sharing the world template until changed"""
+    return Cast(world())
+
+
+def new_game(player_name: str = "", seed: Optional[int] = None) -> GameState:
+    """Create the state for a brand new playthrough"""
+    state = GameState(seed)
+    state.player_name = player_name
+    state.characters = initialize_characters()
+    return state
+
+
+def get_interaction_scenarios(character: Character) -> Dict[str, Any]:
+    """Look up the dialogue scenario for a character"""
+    return npc_scenario(character.npc_id)
+
+
+def dialogue_response(state: GameState, character: Character) -> str:
+    """What an NPC says when the player reaches out, picked by the content pack's dialogue rules"""
+    last = state.choices_made.last_with_npc(character.npc_id)
+    response = dialogue.index().match(character.npc_id, character.current_mood,
+                                      dialogue.NEVER_TALKED if last is None else last[OPTION],
+                                      character.bond_level, state.mood, state.day)
+    return get_interaction_scenarios(character)['response'] if response is None else response
+
+
+def generate_follow_up_response(bond_change: int, rng=random) -> str:
+    """Pick a follow-up line matching how well the interaction went"""
+    for threshold, responses in FOLLOW_UP_RESPONSES:
+        if bond_change >= threshold:
+            return rng.choice(responses)
+    return rng.choice(NEGATIVE_FOLLOW_UPS)
+
+
+def relationship_stats(state: GameState) -> RelationshipStats:
+    """The state's bond aggregates, copied from the world's on first use"""
+    if state.stats is None:
+        state.stats = state.characters.world.stats.copy()
+        for newcomer in state.characters.newcomers():
+            state.stats.add(newcomer.bond_level)
+        for shared, own in state.characters.changes():
+            state.stats.move(shared.bond_level, own.bond_level)
+    return state.stats
+
+
+def average_bond(state: GameState) -> float:
+    """Average bond level across the whole cast"""
+    return relationship_stats(state).average
+
+
+def choices_on_day(state: GameState, day: int) -> int:
+    """Number of choices saved on the given day"""
+    return state.choices_made.count_day(day)
+
+
+def can_reflect(state: GameState) -> bool:
+    """Whether the daily reflection limit still allows a reflection"""
+    return state.reflection_count < MAX_REFLECTIONS_PER_DAY
+
+
+def draw_reflection(rng=random) -> int:
+    """Pick the index of today's reflection prompt"""
+    return rng.randrange(len(REFLECTIONS))
+
+
+def check_ending(avg_bond: float, mood: int, day: int, final_day: int = FINAL_DAY) -> Optional[str]:
+    """Return the ending reached at the end of a day, if any"""
+    if avg_bond >= GOOD_ENDING_BOND and mood >= GOOD_ENDING_MOOD:
+        return "good"
+    elif avg_bond <= BAD_ENDING_BOND and mood <= BAD_ENDING_MOOD:
+        return "bad"
+    elif day >= final_day:
+        return "neutral"
+    return None
+
+
+def interact(state: GameState, npc: str, option: int, rng=None) -> List[Event]:
+    """Apply one dialogue choice with an NPC"""
+    if rng is None:
+        rng = state.rng
+    if npc not in state.characters:
+        raise ValueError(f"unknown character: {npc}")
+    character = state.characters[npc]
+    options = get_interaction_scenarios(character)['options']
+    if not 0 <= option < len(options):
+        raise ValueError(f"invalid option {option} for {npc}")
+    character = state.characters.own(npc)
+    choice = options[option]
+
+    old_bond = character.bond_level
+    old_mood = state.mood
+
+    state.set_bond(character, clamp(old_bond + choice['bond_change']))
+    state.mood = clamp(old_mood + choice['mood_change'])
+    character.last_interaction = choice['text']
+
+    state.save_interaction(character, option, old_bond, old_mood)
+
+    return [{
+        'type': 'interaction',
+        'npc': npc,
+        'option': option,
+        'text': choice['text'],
+        'old_bond': old_bond,
+        'new_bond': character.bond_level,
+        'old_mood': old_mood,
+        'new_mood': state.mood,
+        'follow_up': generate_follow_up_response(choice['bond_change'], rng)
+    }]
+
+
+def reflect(state: GameState, prompt: Optional[int] = None, response: int = 0, rng=None) -> List[Event]:
+    """Spend one of today's reflections to boost mood"""
+    if rng is None:
+        rng = state.rng
+    if not can_reflect(state):
+        raise ValueError("no reflections left today")
+    if prompt is None:
+        prompt = draw_reflection(rng)
+    reflection = REFLECTIONS[prompt]
+    if not 0 <= response < len(reflection['responses']):
+        raise ValueError(f"invalid response {response} for reflection {prompt}")
+
+    mood_boost = rng.randint(*REFLECTION_BOOST)
+    old_mood = state.mood
+    state.mood = min(MAX_LEVEL, state.mood + mood_boost)
+    state.reflection_count += 1
+
+    state.save_reflection(prompt, mood_boost, old_mood)
+
+    return [{
+        'type': 'reflection',
+        'prompt': prompt,
+        'response': response,
+        'boost': mood_boost,
+        'old_mood': old_mood,
+        'new_mood': state.mood
+    }]
+
+
+def end_day(state: GameState) -> List[Event]:
+    """Close the current day and either reach an ending or start the next day"""
+    avg_bond = average_bond(state)
+    events = [{
+        'type': 'day_summary',
+        'day': state.day,
+        'mood': state.mood,
+        'avg_bond': avg_bond,
+        'choices_today': choices_on_day(state, state.day)
+    }]
+
+    ending = None if state.endless else check_ending(avg_bond, state.mood, state.day)
+    if ending:
+        state.ending = ending
+        state.game_over = True
+        events.append({'type': 'ending', 'ending': ending, 'day': state.day})
+    else:
+        state.day += 1
+        state.reflection_count = 0  # Reset daily reflection limit
+        events.append({'type': 'new_day', 'day': state.day})
+        if state.endless:
+            events.extend(meet_acquaintance(state))
+    state.checkpoint()
+    return events
+
+
+def meet_acquaintance(state: GameState) -> List[Event]:
+    """Bring the next generated NPC into an endless game's cast, while any are left"""
+    character = state.characters.meet()
+    if character is None:
+        return []
+    state.add_character(character)
+    return [{'type': 'acquaintance', 'npc': character.name, 'relationship': character.relationship}]
+
+
+def step(state: GameState, action: Action, rng=None) -> Tuple[GameState, List[Event]]:
+    """Advance the game by one action
+
+    The state is updated in place and returned together with the events
+    the action produced. Invalid actions raise ValueError and leave the
+    state untouched. Random draws come from the state's own stream
+    unless another rng is given.
+    """
+    if rng is None:
+        rng = state.rng
+    if state.game_over:
+        raise ValueError("the game is already over")
+    kind = type(action)
+    if kind is Interact:
+        events = interact(state, action.npc, action.option, rng)
+    elif kind is Reflect:
+        events = reflect(state, action.prompt, action.response, rng)
+    elif kind is EndDay:
+        events = end_day(state)
+    else:
+        raise ValueError(f"unknown action: {action!r}")
+    return state, events
+
+
+@lru_cache(maxsize=ACTION_CACHE_SIZE)
+def npc_actions(npc_id: int) -> Tuple[Interact, ...]:
+    """The Interact actions offered for an NPC"""
+    name = npc_name(npc_id)
+    return tuple(Interact(name, option) for option in range(len(npc_scenario(npc_id)['options'])))
+
+
+def interaction_actions(character: Character) -> Tuple[Interact, ...]:
+    """The Interact actions offered for a character"""
+    return npc_actions(character.npc_id)
+
+
+@lru_cache(maxsize=CAST_CACHE_SIZE)
+def cast_actions(size: int) -> Tuple[Tuple[Action, ...], Tuple[Action, ...]]:
+    """(actions with a reflection left, actions without) for a cast of size NPCs
+
+    npc_ids are 0 .. size - 1 in every cast, so the size is all that
+    tells two casts apart.
+    """
+    talks = tuple(action for npc_id in range(size) for action in npc_actions(npc_id))
+    return talks + (REFLECT, END_DAY), talks + (END_DAY,)
+
+
+def legal_actions(state: GameState) -> Sequence[Action]:
+    """List every action that step() accepts in the current state"""
+    if state.game_over:
+        return ()
+    actions = cast_actions(len(state.characters))
+    return actions[0] if can_reflect(state) else actions[1]
+
+
+Policy = Callable[[GameState, Any], Action]
+
+
+def random_policy(state: GameState, rng=random) -> Action:
+    """Pick uniformly among the legal actions"""
+    return rng.choice(legal_actions(state))
+
+
+def play(policy: Policy = random_policy, rng=None, player_name: str = "Traveler",
+         max_steps: int = 10000, seed: Optional[int] = None) -> GameState:
+    """Run a whole playthrough headlessly and return the final state
+
+    Without an rng the policy and the game share the new state's own
+    stream, so a seed reproduces the whole playthrough.
+    """
+    state = new_game(player_name, seed)
+    if rng is None:
+        rng = state.rng
+    for _ in range(max_steps):
+        if state.game_over:
+            break
+        step(state, policy(state, rng), rng)
+    return state
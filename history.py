@@ -0,0 +1,323 @@
+"""Packed choice history for Life Unwritten
+
+Every choice a player makes is stored as one fixed-width record of small
+integers in an array. The text shown on the review screen is rendered
+from the shared content tables only when a record is read back, so a
+long history costs a few bytes per choice instead of a dict of
+formatted strings.
+
+Days only ever move forward, so each day's choices are one contiguous
+run of records. The log keeps the first record of every day and the
+record numbers of each NPC's choices as they are added, so per-day and
+per-NPC queries read just the matching records however long the
+history gets.
+
+For play that never ends, a log can be given a HistoryArchive: then only
+the most recent choices stay in memory and older ones are moved to a
+file, CHUNK_RECORDS at a time, as zlib-compressed chunks. Reads of old
+records and walks over the whole history decompress one chunk at a
+time, so memory stays flat however long the game runs.
+"""
+
+import tempfile
+import zlib
+from array import array
+from bisect import bisect_left
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import content
+
+# Record layout, one unsigned 16-bit field each
+DAY, NPC, OPTION, MOOD_BEFORE, MOOD_AFTER, BOND_BEFORE, BOND_AFTER, BOOST = range(8)
+RECORD_WIDTH = 8
+
+# NPC field value marking a reflection; OPTION then holds the prompt index
+REFLECTION = 0xFFFF
+
+CHUNK_RECORDS = 512  # records per compressed archive chunk
+RING_RECORDS = 256  # records an archived log always keeps in memory
+
+
+def interaction_record(day: int, npc: int, option: int, mood_before: int, mood_after: int,
+                       bond_before: int, bond_after: int) -> Tuple[int, ...]:
+    return (day, npc, option, mood_before, mood_after, bond_before, bond_after, 0)
+
+
+def reflection_record(day: int, prompt: int, boost: int, mood_before: int, mood_after: int) -> Tuple[int, ...]:
+    return (day, REFLECTION, prompt, mood_before, mood_after, 0, 0, boost)
+
+
+class HistoryArchive:
+    """Old choice records, compressed in chunks of CHUNK_RECORDS in a file
+
+    The file is a private scratch file (a temporary one by default) in
+    the machine's byte order; the save journal, not the archive, is what
+    keeps a history across runs.
+    """
+
+    def __init__(self, file: Optional[BinaryIO] = None):
+        self.file = file if file is not None else tempfile.TemporaryFile()
+        self.ends = array('Q')  # file offset just past each chunk
+        self.cached: Tuple[int, Optional[array]] = (-1, None)  # the last chunk read back
+
+    def __len__(self) -> int:
+        """Number of records archived"""
+        return len(self.ends) * CHUNK_RECORDS
+
+    def add(self, records: array):
+        """Append one chunk of exactly CHUNK_RECORDS records"""
+        self.file.seek(0, 2)
+        self.file.write(zlib.compress(records.tobytes()))
+        self.ends.append(self.file.tell())
+
+    def chunk(self, k: int) -> array:
+        """The records of chunk k"""
+        if self.cached[0] != k:
+            start = self.ends[k - 1] if k else 0
+            self.file.seek(start)
+            self.cached = k, array('H', zlib.decompress(self.file.read(self.ends[k] - start)))
+        return self.cached[1]
+
+    def close(self):
+        self.file.close()
+
+
+class ChoiceLog:
+    """Append-only list of choices that reads back as the classic choice dicts
+
+    data holds the packed records from offset on; with an archive the
+    ones before offset are in archive and by_npc only indexes the ones
+    in memory.
+    """
+
+    __slots__ = ('data', 'days', 'day_starts', 'by_npc', 'archive', 'offset', 'archived_npcs', 'ring')
+
+    def __init__(self):
+        self.data = array('H')
+        self.days = array('H')  # every day that has choices, in order
+        self.day_starts = array('L')  # index of the first record of each of those days
+        self.by_npc: Dict[int, array] = {}  # NPC (or REFLECTION) -> indexes of its records
+        self.archive: Optional[HistoryArchive] = None
+        self.offset = 0  # records moved to the archive
+        self.archived_npcs: Dict[int, int] = {}  # NPC -> how many of its records are archived
+        self.ring = RING_RECORDS
+
+    def append(self, record: Sequence[int]):
+        """Add one raw record of RECORD_WIDTH fields"""
+        self.index(len(self), record[DAY], record[NPC])
+        self.data.extend(record)
+        if self.archive is not None and len(self.data) >= (self.ring + CHUNK_RECORDS) * RECORD_WIDTH:
+            self.spill()
+
+    def add_interaction(self, day: int, npc: int, option: int, mood_before: int, mood_after: int,
+                        bond_before: int, bond_after: int) -> Tuple[int, ...]:
+        record = interaction_record(day, npc, option, mood_before, mood_after, bond_before, bond_after)
+        self.append(record)
+        return record
+
+    def add_reflection(self, day: int, prompt: int, boost: int, mood_before: int,
+                       mood_after: int) -> Tuple[int, ...]:
+        record = reflection_record(day, prompt, boost, mood_before, mood_after)
+        self.append(record)
+        return record
+
+    def frombytes(self, raw: bytes, byteswap: bool = False):
+        """Add packed records read back from disk"""
+        start = len(self)
+        records = array('H', raw)
+        if byteswap:
+            records.byteswap()
+        self.data.extend(records)
+        for i in range(start, len(self)):
+            at = (i - self.offset) * RECORD_WIDTH
+            self.index(i, self.data[at + DAY], self.data[at + NPC])
+        while self.archive is not None and len(self.data) >= (self.ring + CHUNK_RECORDS) * RECORD_WIDTH:
+            self.spill()
+
+    def archive_to(self, archive: HistoryArchive, ring: int = RING_RECORDS):
+        """Keep only about the last ring choices in memory from now on, moving older ones to archive"""
+        self.archive = archive
+        self.ring = ring
+        while len(self.data) >= (ring + CHUNK_RECORDS) * RECORD_WIDTH:
+            self.spill()
+
+    def index_state(self) -> Dict[str, Any]:
+        """JSON-ready form of what an archived log keeps besides its records, for reattach()"""
+        return {
+            "offset": self.offset,
+            "ring": self.ring,
+            "days": self.days.tolist(),
+            "day_starts": self.day_starts.tolist(),
+            "archived_npcs": list(self.archived_npcs.items())
+        }
+
+    def reattach(self, archive: HistoryArchive, saved: Dict[str, Any], raw: bytes, byteswap: bool = False):
+        """Turn an empty log back into an archived one from index_state(), its archive and the records in memory"""
+        self.offset = saved["offset"]
+        self.days = array('H', saved["days"])
+        self.day_starts = array('L', saved["day_starts"])
+        self.archived_npcs = dict(saved["archived_npcs"])
+        records = array('H', raw)
+        if byteswap:
+            records.byteswap()
+        self.data = records
+        for i in range(self.offset, len(self)):
+            npc = records[(i - self.offset) * RECORD_WIDTH + NPC]
+            self.by_npc.setdefault(npc, array('L')).append(i)
+        self.archive_to(archive, saved["ring"])
+
+    def spill(self):
+        """Move the oldest CHUNK_RECORDS records in memory to the archive"""
+        size = CHUNK_RECORDS * RECORD_WIDTH
+        self.archive.add(self.data[:size])
+        del self.data[:size]
+        self.offset += CHUNK_RECORDS
+        for npc, records in self.by_npc.items():
+            k = bisect_left(records, self.offset)
+            if k:
+                del records[:k]
+                self.archived_npcs[npc] = self.archived_npcs.get(npc, 0) + k
+
+    def close(self):
+        """Drop the archive, if any"""
+        if self.archive is not None:
+            self.archive.close()
+
+    def index(self, i: int, day: int, npc: int):
+        if not self.days or day != self.days[-1]:
+            self.days.append(day)
+            self.day_starts.append(i)
+        records = self.by_npc.get(npc)
+        if records is None:
+            records = self.by_npc[npc] = array('L')
+        records.append(i)
+
+    def __len__(self) -> int:
+        return self.offset + len(self.data) // RECORD_WIDTH
+
+    def record(self, index: int) -> array:
+        """Raw fields of one choice"""
+        start = (index - self.offset) * RECORD_WIDTH
+        if start < 0:
+            chunk = self.archive.chunk(index // CHUNK_RECORDS)
+            start = index % CHUNK_RECORDS * RECORD_WIDTH
+            return chunk[start:start + RECORD_WIDTH]
+        return self.data[start:start + RECORD_WIDTH]
+
+    def chunks(self) -> Iterator[array]:
+        """The packed records of the whole history in order, a chunk at a time"""
+        if self.archive is not None:
+            for k in range(len(self.archive.ends)):
+                yield self.archive.chunk(k)
+        yield self.data
+
+    def raw(self, start: int = 0, stop: Optional[int] = None) -> array:
+        """Packed records from start up to stop, read back from the archive where needed"""
+        stop = len(self) if stop is None else min(stop, len(self))
+        if start >= self.offset:
+            return self.data[(start - self.offset) * RECORD_WIDTH:(stop - self.offset) * RECORD_WIDTH]
+        records = array('H')
+        first = 0
+        for chunk in self.chunks():
+            count = len(chunk) // RECORD_WIDTH
+            low, high = max(start, first) - first, min(stop, first + count) - first
+            if low < high:
+                records.extend(chunk[low * RECORD_WIDTH:high * RECORD_WIDTH])
+            first += count
+        return records
+
+    def field(self, name: int) -> array:
+        """One field of every record, e.g. field(DAY)"""
+        return self.raw()[name::RECORD_WIDTH]
+
+    def day_range(self, day: int) -> range:
+        """Indexes of the records made on a day"""
+        k = bisect_left(self.days, day)
+        if k == len(self.days) or self.days[k] != day:
+            return range(0)
+        stop = self.day_starts[k + 1] if k + 1 < len(self.days) else len(self)
+        return range(self.day_starts[k], stop)
+
+    def count_day(self, day: int) -> int:
+        """Number of choices made on a day"""
+        return len(self.day_range(day))
+
+    def on_day(self, day: int) -> List[Dict[str, Any]]:
+        """Choices made on a day"""
+        return [self.render(i) for i in self.day_range(day)]
+
+    def last(self, k: int) -> List[Dict[str, Any]]:
+        """The k most recent choices, oldest first"""
+        return self[max(0, len(self) - k):]
+
+    def with_npc(self, npc: int) -> List[Dict[str, Any]]:
+        """Every choice involving an NPC, or every reflection for REFLECTION"""
+        choices = []
+        if self.archived_npcs.get(npc):
+            for k in range(len(self.archive.ends)):
+                chunk = self.archive.chunk(k)
+                choices += [render_record(chunk[at:at + RECORD_WIDTH])
+                            for at in range(0, len(chunk), RECORD_WIDTH) if chunk[at + NPC] == npc]
+        return choices + [self.render(i) for i in self.by_npc.get(npc, ())]
+
+    def last_with_npc(self, npc: int) -> Optional[array]:
+        """Raw fields of the most recent choice involving an NPC, or None"""
+        records = self.by_npc.get(npc)
+        if records:
+            return self.record(records[-1])
+        if self.archived_npcs.get(npc):
+            for k in range(len(self.archive.ends) - 1, -1, -1):
+                chunk = self.archive.chunk(k)
+                for at in range(len(chunk) - RECORD_WIDTH, -1, -RECORD_WIDTH):
+                    if chunk[at + NPC] == npc:
+                        return chunk[at:at + RECORD_WIDTH]
+        return None
+
+    def count_npc(self, npc: int) -> int:
+        return self.archived_npcs.get(npc, 0) + len(self.by_npc.get(npc, ()))
+
+    def moods(self, start: int = 0, stop: Optional[int] = None) -> array:
+        """Mood after each choice from record start up to stop"""
+        return self.raw(start, stop)[MOOD_AFTER::RECORD_WIDTH]
+
+    def daily_moods(self) -> List[Tuple[int, int]]:
+        """(day, mood after that day's last choice) for every day with choices"""
+        ends = list(self.day_starts[1:]) + [len(self)]
+        return [(day, self.record(end - 1)[MOOD_AFTER]) for day, end in zip(self.days, ends)]
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[Dict[str, Any], List[Dict[str, Any]]]:
+        if isinstance(index, slice):
+            return [self.render(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("choice index out of range")
+        return self.render(index)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for chunk in self.chunks():
+            for at in range(0, len(chunk), RECORD_WIDTH):
+                yield render_record(chunk[at:at + RECORD_WIDTH])
+
+    def render(self, index: int) -> Dict[str, Any]:
+        """Format one record the way the review screen shows it"""
+        return render_record(self.record(index))
+
+
+def render_record(record) -> Dict[str, Any]:
+    """Turn packed fields back into a choice dict with description and impact text"""
+    if record[NPC] == REFLECTION:
+        choice = f"Reflected on: {content.REFLECTIONS[record[OPTION]]['prompt']}"
+        impact = f"Mood boost: +{record[BOOST]}"
+    else:
+        name = content.npc_name(record[NPC])
+        text = content.npc_scenario(record[NPC])['options'][record[OPTION]]['text']
+        choice = f"Talked to {name}: {text}"
+        impact = (f"Bond with {name}: {record[BOND_BEFORE]} → {record[BOND_AFTER]}, "
+                  f"Mood: {record[MOOD_BEFORE]} → {record[MOOD_AFTER]}")
+    return {
+        'day': record[DAY],
+        'choice': choice,
+        'impact': impact,
+        'mood_at_time': record[MOOD_AFTER]
+    }
@@ -0,0 +1,221 @@
+"""Save journal for Life Unwritten
+
+A save file is an append-only log of JSON lines. Every choice adds one
+{"choice": [...]} line holding its packed history record, and every end
+of day adds a {"snapshot": {...}} line with the rest of the state.
+At each snapshot the packed records are also appended to a binary
+".choices" file next to the save, and the snapshot only stores how many
+of them belong to it, so snapshots stay small however long the history
+grows. Loading memory-maps the journal, finds the last snapshot and
+replays only the choices written after it.
+
+Every choice is handed to the OS as soon as it is made, and each
+snapshot along with it, so a killed process loses nothing the player has
+seen; only a crash of the machine itself can. Nothing on the turn path
+calls fsync: close() syncs the file. A caller journaling many choices
+at once can batch them with flush_every.
+"""
+
+import json
+import mmap
+import os
+import sys
+from array import array
+from typing import Any, Dict, Optional, Sequence
+
+import content
+import engine
+import procgen
+from history import NPC, OPTION, MOOD_AFTER, BOND_AFTER, REFLECTION, RECORD_WIDTH
+
+SNAPSHOT_PREFIX = b'{"snapshot":'
+RECORD_BYTES = RECORD_WIDTH * array('H').itemsize
+
+
+def history_path(path: str) -> str:
+    return path + ".choices"
+
+
+class Journal:
+    """Buffered writer appending choices and snapshots to a save file"""
+
+    def __init__(self, path: str, saved_choices: int = 0, flush_every: int = 1):
+        self.path = path
+        self.flush_every = flush_every
+        self.pending = []
+        repair_tail(path)
+        self.file = open(path, 'ab')
+        # Records past the last snapshot may be left over from a crash
+        self.history = open(history_path(path), 'ab')
+        self.history.truncate(saved_choices * RECORD_BYTES)
+        self.saved_choices = saved_choices
+
+    def append(self, record: Sequence[int]):
+        """Queue one choice record, handing the batch to the OS once it is full"""
+        self.pending.append(encode_line({"choice": list(record)}))
+        if len(self.pending) >= self.flush_every:
+            self.flush()
+
+    def snapshot(self, state: engine.GameState):
+        """Write a snapshot of the state along with any queued choices"""
+        new_records = state.choices_made.raw(self.saved_choices)
+        if sys.byteorder == 'big':
+            new_records.byteswap()
+        self.history.write(new_records.tobytes())
+        self.history.flush()
+        self.saved_choices = len(state.choices_made)
+
+        self.pending.append(encode_line({"snapshot": dump_state(state)}))
+        self.flush()
+
+    def flush(self):
+        """Hand queued lines to the OS without waiting for the disk"""
+        if self.pending:
+            self.file.write(b''.join(self.pending))
+            self.file.flush()
+            self.pending.clear()
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.flush()
+        for f in (self.history, self.file):
+            os.fsync(f.fileno())
+            f.close()
+
+
+def encode_line(entry: Dict[str, Any]) -> bytes:
+    return json.dumps(entry, separators=(',', ':')).encode() + b'\n'
+
+
+def repair_tail(path: str):
+    """Drop a partly written last line left behind by a crash"""
+    try:
+        with open(path, 'r+b') as f:
+            size = f.seek(0, os.SEEK_END)
+            if size == 0:
+                return
+            f.seek(size - 1)
+            if f.read(1) == b'\n':
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                keep = data.rfind(b'\n') + 1
+            f.truncate(keep)
+    except FileNotFoundError:
+        pass
+
+
+def dump_state(state: engine.GameState) -> Dict[str, Any]:
+    """Compact JSON-ready form of a GameState, minus the choice records"""
+    data = {
+        "player_name": state.player_name,
+        "mood": state.mood,
+        "day": state.day,
+        "reflection_count": state.reflection_count,
+        "game_over": state.game_over,
+        "ending": state.ending,
+        "characters": [[char.npc_id, char.bond_level, char.last_interaction, char.current_mood]
+                       for char in state.characters.values()],
+        "choice_count": len(state.choices_made)
+    }
+    if state.endless:
+        data["met"] = state.characters.met  # acquaintances are regenerated from their ids
+    return data
+
+
+def restore_state(data: Dict[str, Any], history: bytes) -> engine.GameState:
+    """Rebuild a GameState from dump_state() output and the packed choice records"""
+    state = engine.GameState()
+    state.player_name = data["player_name"]
+    state.mood = data["mood"]
+    state.day = data["day"]
+    state.reflection_count = data["reflection_count"]
+    state.game_over = data["game_over"]
+    state.ending = data["ending"]
+    if "met" in data:
+        procgen.start_endless(state, data["met"])
+    for npc_id, bond_level, last_interaction, current_mood in data["characters"]:
+        state.characters.put(engine.Character(npc_id, bond_level, last_interaction, current_mood))
+    state.choices_made.frombytes(history[:data["choice_count"] * RECORD_BYTES], sys.byteorder == 'big')
+    return state
+
+
+def apply_choice(state: engine.GameState, record: Sequence[int]):
+    """Replay one journaled choice on top of a restored state"""
+    state.choices_made.append(record)
+    state.mood = record[MOOD_AFTER]
+    if record[NPC] == REFLECTION:
+        state.reflection_count += 1
+        return
+    char = state.characters.own(content.npc_name(record[NPC]))
+    state.set_bond(char, record[BOND_AFTER])
+    char.last_interaction = content.npc_scenario(record[NPC])['options'][record[OPTION]]['text']
+
+
+def load(path: str) -> Optional[engine.GameState]:
+    """Read the saved state from a journal, or None when there is nothing to resume"""
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return None
+    with f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return replay(data, read_history(path))
+
+
+def read_history(path: str) -> bytes:
+    try:
+        with open(history_path(path), 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return b''
+
+
+def replay(data: mmap.mmap, history: bytes) -> Optional[engine.GameState]:
+    """Restore the last complete snapshot and apply the choices after it"""
+    search_end = len(data)
+    while True:
+        start = data.rfind(b'\n' + SNAPSHOT_PREFIX, 0, search_end) + 1
+        if start == 0 and data[:len(SNAPSHOT_PREFIX)] != SNAPSHOT_PREFIX:
+            return None
+        end = data.find(b'\n', start)
+        if end != -1:
+            try:
+                state = restore_state(json.loads(data[start:end])["snapshot"], history)
+                break
+            except (ValueError, KeyError):
+                pass
+        if start == 0:
+            return None
+        search_end = start
+
+    pos = end + 1
+    while pos < len(data):
+        end = data.find(b'\n', pos)
+        if end == -1:
+            break  # unfinished last line
+        entry = json.loads(data[pos:end])
+        if "choice" in entry:
+            apply_choice(state, entry["choice"])
+        pos = end + 1
+    return state
+
+
+def start(path: str, state: engine.GameState) -> Journal:
+    """Begin a fresh journal for a new game, replacing any previous save"""
+    open(path, 'wb').close()
+    return attach(path, state)
+
+
+def attach(path: str, state: engine.GameState) -> Journal:
+    """Journal further choices of a state loaded from (or just started in) a save file"""
+    try:
+        on_disk = os.path.getsize(history_path(path)) // RECORD_BYTES
+    except FileNotFoundError:
+        on_disk = 0
+    saved = min(len(state.choices_made), on_disk)
+    state.journal = Journal(path, saved)
+    state.checkpoint()
+    return state.journal
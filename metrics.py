@@ -0,0 +1,158 @@
+"""Instrumentation for Life Unwritten
+
+Times the menu handlers, counts game events and keeps latency
+histograms, then exports them in the OpenMetrics text format, either to
+a file or from a small HTTP endpoint for a scraper. Everything is off
+until enable() is called; while off, a timed handler pays one flag check
+and count() returns straight away.
+
+Handler timings leave out the time a screen spends waiting for the
+player or deliberately idle (pauses and typewriter animation), so they
+show how long the game itself took. print_slow is timed including its
+animation.
+
+A session can also be run under cProfile (life_unwritten.py --profile);
+the stats are written when the session ends, for pstats or snakeviz.
+"""
+
+import contextlib
+import cProfile
+import functools
+import os
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+PREFIX = "life_unwritten"
+# Upper bounds of the latency histogram buckets, in seconds
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+
+class Histogram:
+    __slots__ = ('counts', 'total', 'count')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # the last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+
+class Registry:
+    def __init__(self):
+        self.enabled = False
+        self.counters: Dict[str, int] = {}
+        self.histograms: Dict[str, Histogram] = {}
+
+    def count(self, event: str, amount: int = 1):
+        self.counters[event] = self.counters.get(event, 0) + amount
+
+    def observe(self, handler: str, seconds: float):
+        histogram = self.histograms.get(handler)
+        if histogram is None:
+            histogram = self.histograms[handler] = Histogram()
+        histogram.observe(seconds)
+
+    def render(self) -> str:
+        """All metrics in the OpenMetrics text format"""
+        name = f"{PREFIX}_handler_seconds"
+        lines = [f"# TYPE {name} histogram", f"# UNIT {name} seconds",
+                 f"# HELP {name} Time spent in a handler, not counting waits for the player."]
+        for handler, histogram in sorted(self.histograms.items()):
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ("+Inf",), list(histogram.counts)):
+                cumulative += count
+                lines.append(f'{name}_bucket{{handler="{handler}",le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_count{{handler="{handler}"}} {histogram.count}')
+            lines.append(f'{name}_sum{{handler="{handler}"}} {histogram.total:.9f}')
+
+        name = f"{PREFIX}_events"
+        lines += [f"# TYPE {name} counter", f"# HELP {name} Game events by kind."]
+        for event, count in sorted(self.counters.items()):
+            lines.append(f'{name}_total{{event="{event}"}} {count}')
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def enable():
+    REGISTRY.enabled = True
+
+
+def count(event: str, amount: int = 1):
+    """Count a game event such as "choice" or "invalid_input" """
+    if REGISTRY.enabled:
+        REGISTRY.count(event, amount)
+
+
+def timed(handler: str, include_idle: bool = False):
+    """Decorate an async LifeUnwritten method to record its latency"""
+    def decorate(method):
+        @functools.wraps(method)
+        async def wrapper(self, *args, **kwargs):
+            if not REGISTRY.enabled:
+                return await method(self, *args, **kwargs)
+            screen = self.screen
+            idle = screen.idle
+            start = time.perf_counter()
+            try:
+                return await method(self, *args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                if not include_idle:
+                    elapsed -= screen.idle - idle
+                REGISTRY.observe(handler, elapsed)
+        return wrapper
+    return decorate
+
+
+def write(path: str):
+    """Write the current metrics to a file, replacing it atomically"""
+    temp = f"{path}.{os.getpid()}.tmp"
+    with open(temp, "w", encoding="utf-8") as f:
+        f.write(REGISTRY.render())
+    os.replace(temp, path)
+
+
+class ScrapeHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = REGISTRY.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve the metrics over HTTP from a background thread"""
+    server = ThreadingHTTPServer((host, port), ScrapeHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+@contextlib.contextmanager
+def profile(path: Optional[str]):
+    """Run the block under cProfile and dump the stats to path; does nothing without a path"""
+    if not path:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
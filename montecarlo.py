@@ -0,0 +1,260 @@
+"""Monte Carlo runner for Life Unwritten
+
+Plays many whole weeks through engine.step with a choice of player
+policies, spread over a process pool. Playthrough i uses seed
+first_seed + i for both the game and the policy, and the seeds are cut
+into shards, one task per shard, so the totals are the same whatever
+the number of workers. Workers send back a Tally per shard, a handful
+of integer arrays, never a GameState, and the parent adds them up as
+they arrive.
+
+Unlike batch.py this runs the real rules with the real content, so any
+policy written against GameState can be measured:
+
+    python montecarlo.py --policy random --policy apologize --sessions 1000000
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from array import array
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import engine
+from engine import Interact, Reflect, REFLECT, END_DAY
+
+ACTIONS_PER_DAY = 3  # actions the scripted policies take before ending the day
+SHARD_SIZE = 2000
+
+_ACTION_CODES: Optional[Tuple[Dict[str, int], int]] = None
+
+
+def action_codes() -> Tuple[Dict[str, int], int]:
+    """First action code of every NPC's options, and the number of codes
+
+    Codes run over every NPC's interaction options in order, like
+    batch.py, followed by one code for reflecting and one for ending the
+    day.
+    """
+    global _ACTION_CODES
+    if _ACTION_CODES is None:
+        first = {}
+        code = 0
+        for npc_id, name in enumerate(engine.NAMES):
+            first[name] = code
+            code += len(engine.npc_scenario(npc_id)['options'])
+        _ACTION_CODES = first, code + 2
+    return _ACTION_CODES
+
+
+def action_labels() -> List[str]:
+    """A readable name for every action code"""
+    labels = []
+    for npc_id, name in enumerate(engine.NAMES):
+        for option in engine.npc_scenario(npc_id)['options']:
+            labels.append(f"{name}: {option['text']}")
+    return labels + ["reflect", "end day"]
+
+
+# Policies
+
+def best_option(npc_id: int, key: str) -> int:
+    """Index of the NPC's option with the largest bond_change or mood_change"""
+    options = engine.npc_scenario(npc_id)['options']
+    return max(range(len(options)), key=lambda i: options[i][key])
+
+
+def apologize_policy(state: engine.GameState, rng) -> engine.Action:
+    """Make amends with someone at random a few times a day: always the option that mends the bond most"""
+    if engine.choices_on_day(state, state.day) >= ACTIONS_PER_DAY:
+        return END_DAY
+    npc_id = rng.randrange(len(engine.NAMES))
+    character = state.characters[engine.NAMES[npc_id]]
+    return engine.interaction_actions(character)[best_option(npc_id, 'bond_change')]
+
+
+_MOOD_PICK: Optional[Tuple[str, int]] = None
+
+
+def greedy_mood_policy(state: engine.GameState, rng) -> engine.Action:
+    """Take whatever raises mood most right now: reflect while allowed, then the best option for mood"""
+    global _MOOD_PICK
+    if engine.choices_on_day(state, state.day) >= ACTIONS_PER_DAY:
+        return END_DAY
+    if engine.can_reflect(state):
+        return REFLECT
+    if _MOOD_PICK is None:
+        picks = ((npc_id, best_option(npc_id, 'mood_change')) for npc_id in range(len(engine.NAMES)))
+        npc_id, option = max(picks, key=lambda pick: engine.npc_scenario(pick[0])['options'][pick[1]]['mood_change'])
+        _MOOD_PICK = engine.NAMES[npc_id], option
+    name, option = _MOOD_PICK
+    return engine.interaction_actions(state.characters[name])[option]
+
+
+POLICIES: Dict[str, engine.Policy] = {
+    "random": engine.random_policy,
+    "apologize": apologize_policy,
+    "greedy_mood": greedy_mood_policy
+}
+
+
+# Results
+
+@dataclass
+class Tally:
+    """Outcome counts for a number of playthroughs; tallies of disjoint seeds add up"""
+    n_actions: int
+    sessions: int = 0
+    unfinished: int = 0
+    # ending_days[e * FINAL_DAY + d]: sessions with engine.ENDINGS[e] on day d + 1
+    ending_days: array = field(default=None)
+    picks: array = field(default=None)  # times each action code was chosen
+
+    def __post_init__(self):
+        if self.ending_days is None:
+            self.ending_days = array('Q', bytes(8 * len(engine.ENDINGS) * engine.FINAL_DAY))
+        if self.picks is None:
+            self.picks = array('Q', bytes(8 * self.n_actions))
+
+    def merge(self, other: "Tally"):
+        self.sessions += other.sessions
+        self.unfinished += other.unfinished
+        for i, count in enumerate(other.ending_days):
+            self.ending_days[i] += count
+        for i, count in enumerate(other.picks):
+            if count:
+                self.picks[i] += count
+
+    def days(self, ending: str) -> List[int]:
+        """Sessions that reached the ending on each day, index 0 is day 1"""
+        start = engine.ENDINGS.index(ending) * engine.FINAL_DAY
+        return self.ending_days[start:start + engine.FINAL_DAY].tolist()
+
+    def endings(self) -> Dict[str, int]:
+        return {f"{ending}_ending": sum(self.days(ending)) for ending in engine.ENDINGS}
+
+    def ending_rates(self) -> Dict[str, float]:
+        return {name: count / max(1, self.sessions) for name, count in self.endings().items()}
+
+    def pick_rates(self) -> List[float]:
+        """Share of all actions taken that went to each action code"""
+        total = max(1, sum(self.picks))
+        return [count / total for count in self.picks]
+
+
+def play_shard(task: Tuple[str, int, int, int]) -> Tally:
+    """Play count weeks with seeds first_seed.. and tally them; runs in a worker"""
+    policy_name, first_seed, count, max_steps = task
+    policy = POLICIES[policy_name]
+    first_code, n_actions = action_codes()
+    reflect_code, end_day_code = n_actions - 2, n_actions - 1
+    tally = Tally(n_actions, sessions=count)
+    picks = tally.picks
+    step = engine.step
+    for seed in range(first_seed, first_seed + count):
+        state = engine.new_game("Traveler", seed)
+        rng = state.rng
+        for _ in range(max_steps):
+            if state.game_over:
+                break
+            action = policy(state, rng)
+            kind = type(action)
+            if kind is Interact:
+                picks[first_code[action.npc] + action.option] += 1
+            elif kind is Reflect:
+                picks[reflect_code] += 1
+            else:
+                picks[end_day_code] += 1
+            step(state, action, rng)
+        if state.ending is None:
+            tally.unfinished += 1
+        else:
+            tally.ending_days[engine.ENDINGS.index(state.ending) * engine.FINAL_DAY + state.day - 1] += 1
+    return tally
+
+
+def shards(policy: str, sessions: int, first_seed: int, shard_size: int,
+           max_steps: int) -> Iterator[Tuple[str, int, int, int]]:
+    for start in range(0, sessions, shard_size):
+        yield policy, first_seed + start, min(shard_size, sessions - start), max_steps
+
+
+def default_workers() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def simulate(policy: str = "random", sessions: int = 100000, first_seed: int = 0,
+             workers: Optional[int] = None, shard_size: int = SHARD_SIZE, max_steps: int = 10000,
+             progress: Optional[Callable[[Tally], None]] = None) -> Tally:
+    """Play sessions weeks with the named policy over a process pool and add up the tallies
+
+    progress, if given, is called with the running total after each shard.
+    """
+    if policy not in POLICIES:
+        raise ValueError(f"unknown policy: {policy}")
+    workers = workers or default_workers()
+    tasks = shards(policy, sessions, first_seed, shard_size, max_steps)
+    total = Tally(action_codes()[1])
+    if workers == 1:
+        results = map(play_shard, tasks)
+        pool = None
+    else:
+        pool = multiprocessing.Pool(workers)
+        results = pool.imap_unordered(play_shard, tasks)
+    try:
+        for partial in results:
+            total.merge(partial)
+            if progress is not None:
+                progress(total)
+    finally:
+        if pool is not None:
+            pool.terminate()
+    return total
+
+
+def report(policy: str, tally: Tally, seconds: float, top: int) -> Dict[str, object]:
+    labels = action_labels()
+    rates = tally.pick_rates()
+    ranked = sorted(range(len(rates)), key=rates.__getitem__, reverse=True)[:top]
+    return {
+        "policy": policy,
+        "sessions": tally.sessions,
+        "sessions_per_s": tally.sessions / seconds,
+        "endings": tally.endings(),
+        "ending_rates": tally.ending_rates(),
+        "ending_days": {f"{ending}_ending": tally.days(ending) for ending in engine.ENDINGS},
+        "unfinished": tally.unfinished,
+        "top_picks": {labels[code]: rates[code] for code in ranked if rates[code]}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate many weeks of Life Unwritten across all cores")
+    parser.add_argument("--policy", action="append", choices=sorted(POLICIES),
+                        help="player policy to simulate; repeat for several (default: random)")
+    parser.add_argument("--sessions", type=int, default=100000, help="playthroughs per policy")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first playthrough")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per core)")
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE, help="playthroughs per task")
+    parser.add_argument("--top", type=int, default=10, help="most picked actions to list")
+    args = parser.parse_args()
+
+    results = []
+    for policy in args.policy or ["random"]:
+        def progress(total: Tally):
+            print(f"\r{policy}: {total.sessions}/{args.sessions}", end="", file=sys.stderr)
+        start = time.perf_counter()
+        tally = simulate(policy, args.sessions, args.seed, args.workers, args.shard_size, progress=progress)
+        print(file=sys.stderr)
+        results.append(report(policy, tally, time.perf_counter() - start, args.top))
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
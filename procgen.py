@@ -0,0 +1,233 @@
+"""Procedurally generated acquaintances for Life Unwritten's endless mode
+
+In endless mode the week never ends: every new day the player meets one
+more acquaintance, an NPC made up on the spot with a name, relationship,
+starting bond and mood, a backstory and a dialogue scenario. Their
+npc_ids continue where the content pack's cast stops, so the rest of the
+game (history records, the journal, roster pages) treats them like any
+other NPC.
+
+Nothing is generated ahead of time. Everything about acquaintance k is
+drawn from its own random stream, seeded with the world seed and k, so
+it can be thrown away and made again identically at any time: profiles,
+scenarios and shared templates are kept in LRU caches of CACHE_SIZE
+entries, and startup and memory don't depend on how big the world is.
+A session stores only how many acquaintances it has met plus its own
+copies of the ones it has talked to, exactly as for the pack's NPCs.
+
+The world holds WORLD_SIZE (4096) acquaintances, one for every pairing
+of a first name and a surname; after the last of them is met the days
+go on without a newcomer.
+
+Names are unique: acquaintance k gets a first name and surname picked by
+a bijection of k, which acquaintance_id() inverts, so a name typed in a
+search or read from a save finds its NPC without any lookup table. The
+world seed comes from the LIFE_UNWRITTEN_WORLD_SEED environment variable
+and defaults to 0, which keeps saves and recordings portable like the
+content pack itself.
+
+    state = engine.new_game("Ann")
+    procgen.start_endless(state)
+"""
+
+import os
+import random
+from functools import lru_cache
+from typing import Any, Dict, Iterator, Optional
+
+import content
+import engine
+from history import REFLECTION
+
+WORLD_SEED = int(os.environ.get("LIFE_UNWRITTEN_WORLD_SEED", "0"))
+CACHE_SIZE = 1024
+
+FIRST_NAMES = (
+    "Ada", "Bea", "Cal", "Dee", "Eli", "Fay", "Gus", "Hal", "Ivy", "Jo", "Kit", "Lou", "Mae", "Ned", "Ola",
+    "Pia", "Quin", "Rae", "Sol", "Tam", "Uma", "Val", "Wes", "Xan", "Yara", "Zed", "Ari", "Bo", "Cleo",
+    "Dov", "Esme", "Finn", "Gia", "Hugo", "Ines", "Jude", "Kai", "Lena", "Milo", "Nia", "Otis", "Priya",
+    "Rafa", "Sana", "Theo", "Una", "Vik", "Wren", "Yuki", "Zara", "Amos", "Bex", "Cyd", "Dara", "Emil",
+    "Flo", "Gil", "Hana", "Iker", "Jin", "Kora", "Lior", "Mika", "Noor",
+)
+SURNAMES = (
+    "Abbott", "Baker", "Castro", "Dunn", "Ellis", "Ford", "Garcia", "Hale", "Ibarra", "Jensen", "Khan",
+    "Lowe", "Mendes", "Novak", "Okafor", "Park", "Quill", "Reyes", "Sato", "Tran", "Underhill", "Vance",
+    "Webb", "Xu", "Young", "Zamora", "Adler", "Brooks", "Cole", "Diaz", "Eriksen", "Fox", "Grant", "Holt",
+    "Ito", "Joshi", "Kerr", "Lund", "Moss", "Nash", "Ortiz", "Pike", "Rowe", "Shaw", "Tate", "Usman",
+    "Voss", "Wolfe", "Yates", "Zhou", "Amari", "Bell", "Cruz", "Dale", "Evans", "Frost", "Gray", "Hart",
+    "Iyer", "Jones", "Kim", "Lam", "Marsh", "Nolan",
+)
+NAME_COUNT = len(FIRST_NAMES) * len(SURNAMES)
+NAME_STRIDE = 2617  # coprime with NAME_COUNT, so k -> name is a bijection that scatters neighbours
+NAME_SHIFT = WORLD_SEED % NAME_COUNT
+
+FIRST_ID = len(content.NAMES)
+WORLD_SIZE = min(NAME_COUNT, REFLECTION - FIRST_ID)  # 4096; history records keep npc_ids below REFLECTION
+
+RELATIONSHIPS = ("Neighbor", "Coworker", "Classmate", "Cousin", "Old Friend", "Teammate", "Roommate",
+                 "Acquaintance")
+MOODS = ("curious", "guarded", "cheerful", "tired", "hopeful", "restless", "wistful", "friendly")
+PLACES = ("at the corner café", "on the night bus", "in a pottery class", "at the community garden",
+          "in a hospital waiting room", "at a friend's wedding", "on a rainy hiking trail", "at the laundromat")
+DETAILS = ("They are saving up to open a bakery.", "They just moved to town and barely know anyone.",
+           "They are looking after an aging parent.", "They quit a steady job to paint full time.",
+           "They lost touch with their family years ago.", "They are training for their first marathon.",
+           "They always seem to know the best places to eat.", "They are quietly going through a breakup.")
+LAST_INTERACTIONS = ("A quick hello in passing", "Small talk about the weather", "You borrowed a book and never gave it back",
+                     "You shared a table when the café was full", "You haven't spoken yet")
+RESPONSES = ("Oh, hi! I was hoping I'd run into you.", "Hey... it's you. What's up?",
+             "Good to see a familiar face. How's your week going?", "Hi there. Did you need something?",
+             "You again! I was just thinking about that conversation we had.")
+WARM_OPTIONS = ("I'd like to get to know you better.", "How have you really been?",
+                "Let me help with that.", "I've been meaning to invite you over.")
+CASUAL_OPTIONS = ("Just saying hi.", "Seen anything good lately?", "Busy day?", "Nice weather, isn't it?")
+COLD_OPTIONS = ("Sorry, I'm in a rush.", "I don't really have time right now.", "Maybe some other time.",
+                "I think you have me confused with someone else.")
+# (choices, bond_change range, mood_change range) for the options of every scenario, warmest first
+OPTION_TONES = ((WARM_OPTIONS, (6, 15), (2, 5)), (CASUAL_OPTIONS, (2, 7), (1, 3)), (COLD_OPTIONS, (-6, 1), (-3, 1)))
+
+
+def acquaintance_name(npc_id: int) -> str:
+    slot = ((npc_id - FIRST_ID) * NAME_STRIDE + NAME_SHIFT) % NAME_COUNT
+    first, last = divmod(slot, len(SURNAMES))
+    return f"{FIRST_NAMES[first]} {SURNAMES[last]}"
+
+
+def inverse_mod(a: int, m: int) -> int:
+    """x with a * x % m == 1, by the extended Euclidean algorithm (pow(a, -1, m) needs Python 3.8)"""
+    x, last_x, r, last_r = 0, 1, m, a % m
+    while r:
+        q = last_r // r
+        last_r, r = r, last_r - q * r
+        last_x, x = x, last_x - q * x
+    if last_r != 1:
+        raise ValueError(f"{a} has no inverse modulo {m}")
+    return last_x % m
+
+
+_first_index = {name: i for i, name in enumerate(FIRST_NAMES)}
+_last_index = {name: i for i, name in enumerate(SURNAMES)}
+_inverse_stride = inverse_mod(NAME_STRIDE, NAME_COUNT)
+
+
+def acquaintance_id(name: str) -> Optional[int]:
+    """npc_id of the acquaintance with this name, or None if no acquaintance has it"""
+    first, _, last = name.partition(" ") if isinstance(name, str) else ("", "", "")
+    if first not in _first_index or last not in _last_index:
+        return None
+    slot = _first_index[first] * len(SURNAMES) + _last_index[last]
+    k = (slot - NAME_SHIFT) * _inverse_stride % NAME_COUNT
+    return FIRST_ID + k if k < WORLD_SIZE else None
+
+
+def rng_for(npc_id: int) -> random.Random:
+    return random.Random(WORLD_SEED << 32 | npc_id - FIRST_ID)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def generate(npc_id: int):
+    """(profile, scenario) of an acquaintance, drawn from its own seeded stream"""
+    if not FIRST_ID <= npc_id < FIRST_ID + WORLD_SIZE:
+        raise IndexError(f"no acquaintance with npc_id {npc_id}")
+    rng = rng_for(npc_id)
+    profile = {
+        "name": acquaintance_name(npc_id),
+        "relationship": rng.choice(RELATIONSHIPS),
+        "bond_level": rng.randint(25, 55),
+        "last_interaction": rng.choice(LAST_INTERACTIONS),
+        "current_mood": rng.choice(MOODS),
+        "backstory": f"You met {rng.choice(PLACES)}. {rng.choice(DETAILS)}"
+    }
+    scenario = {
+        "response": rng.choice(RESPONSES),
+        "options": [{"text": rng.choice(texts), "bond_change": rng.randint(*bond), "mood_change": rng.randint(*mood)}
+                    for texts, bond, mood in OPTION_TONES]
+    }
+    return profile, scenario
+
+
+def profile(npc_id: int) -> Dict[str, Any]:
+    """Starting profile of an acquaintance, with its backstory"""
+    return generate(npc_id)[0]
+
+
+def scenario(npc_id: int) -> Dict[str, Any]:
+    return generate(npc_id)[1]
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def template(npc_id: int) -> engine.SharedCharacter:
+    """The shared starting state of an acquaintance, made again after it drops out of the cache"""
+    return engine.SharedCharacter(npc_id)
+
+
+class EndlessCast(engine.Cast):
+    """A session's cast: the pack's NPCs followed by the acquaintances met so far
+
+    Only the count of acquaintances met is stored; their templates come
+    from the generator whenever they are read.
+    """
+
+    __slots__ = ('met',)
+
+    def __init__(self, template_world: engine.World, met: int = 0):
+        super().__init__(template_world)
+        self.met = met  # acquaintances FIRST_ID .. FIRST_ID + met - 1 are in the cast
+
+    def npc_id(self, name: str) -> int:
+        npc_id = content.NPC_IDS.get(name)
+        if npc_id is None:
+            npc_id = acquaintance_id(name)
+            if npc_id is None or npc_id >= FIRST_ID + self.met:
+                raise KeyError(name)
+        return npc_id
+
+    def shared(self, npc_id: int) -> engine.Character:
+        return self.world.characters[npc_id] if npc_id < FIRST_ID else template(npc_id)
+
+    def __getitem__(self, name: str) -> engine.Character:
+        npc_id = self.npc_id(name)
+        character = self.changed.get(npc_id)
+        return self.shared(npc_id) if character is None else character
+
+    def __contains__(self, name) -> bool:
+        try:
+            self.npc_id(name)
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self) -> Iterator[str]:
+        yield from content.NAMES
+        for npc_id in range(FIRST_ID, FIRST_ID + self.met):
+            yield acquaintance_name(npc_id)
+
+    def __len__(self) -> int:
+        return len(self.world.characters) + self.met
+
+    def values(self) -> Iterator[engine.Character]:
+        yield from super().values()
+        changed = self.changed
+        for npc_id in range(FIRST_ID, FIRST_ID + self.met):
+            character = changed.get(npc_id)
+            yield template(npc_id) if character is None else character
+
+    def newcomers(self) -> Iterator[engine.Character]:
+        return map(template, range(FIRST_ID, FIRST_ID + self.met))
+
+    def meet(self) -> Optional[engine.Character]:
+        """Add the next acquaintance to the cast and return its template, or None once all are met"""
+        if self.met >= WORLD_SIZE:
+            return None
+        self.met += 1
+        return template(FIRST_ID + self.met - 1)
+
+
+def start_endless(state: engine.GameState, met: int = 0):
+    """Turn a state into an endless game whose cast has met this many acquaintances"""
+    cast = EndlessCast(engine.world(), met)
+    cast.changed = state.characters.changed
+    state.characters = cast
+    state.endless = True
+    state.stats = None
+    state.roster = None
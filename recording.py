@@ -0,0 +1,110 @@
+"""Session recordings for Life Unwritten
+
+Every GameState draws from its own random stream, seeded per session, so
+concurrent sessions never disturb each other. A recording keeps what is
+needed to play a session again exactly: the seed, every line the player
+typed and every value drawn from the stream, plus a fingerprint of the
+final state to check the replay against. Draws are replayed from the
+recording rather than regenerated, so a replay stays exact even if the
+random module's algorithms change. See replay.py for running one.
+"""
+
+import hashlib
+import json
+import os
+import random
+from array import array
+from typing import Any, Dict, List, Optional, Sequence
+
+
+def new_seed() -> int:
+    return int.from_bytes(os.urandom(8), "big")
+
+
+class ReplayError(Exception):
+    """A replay asked for something the recording doesn't hold"""
+
+
+class RecordingRandom(random.Random):
+    """Seeded random stream that notes every value it hands out"""
+
+    def __init__(self, seed: int, draws: array):
+        super().__init__(seed)
+        self.draws = draws
+
+    def randrange(self, start, stop=None, step=1):
+        value = super().randrange(start, stop, step)
+        self.draws.append(value)
+        return value
+
+    def choice(self, seq: Sequence):
+        return seq[self.randrange(len(seq))]
+
+
+class ReplayRandom(random.Random):
+    """Stream that hands back the values of a recording in order"""
+
+    def __init__(self, draws: Sequence[int]):
+        super().__init__(0)
+        self.draws = draws
+        self.position = 0
+
+    def randrange(self, start, stop=None, step=1):
+        if self.position >= len(self.draws):
+            raise ReplayError("the recording has no more random draws")
+        value = self.draws[self.position]
+        if value not in (range(start) if stop is None else range(start, stop, step)):
+            raise ReplayError(f"recorded draw {value} is out of range for randrange({start}, {stop}, {step})")
+        self.position += 1
+        return value
+
+    def choice(self, seq: Sequence):
+        return seq[self.randrange(len(seq))]
+
+
+def fingerprint(state) -> Dict[str, Any]:
+    """Summary of a finished session that a replay must reproduce"""
+    history = hashlib.sha256()
+    for records in state.choices_made.chunks():
+        history.update(records.tobytes())
+    return {
+        "day": state.day,
+        "mood": state.mood,
+        "ending": state.ending,
+        "choices": len(state.choices_made),
+        "history": history.hexdigest()
+    }
+
+
+class Recording:
+    __slots__ = ('seed', 'inputs', 'draws', 'result', 'endless')
+
+    def __init__(self, seed: int, inputs: Optional[List[str]] = None, draws: Sequence[int] = (),
+                 result: Optional[Dict[str, Any]] = None, endless: bool = False):
+        self.seed = seed
+        self.inputs = [] if inputs is None else inputs
+        self.draws = array('q', draws)
+        self.result = result
+        self.endless = endless  # played in endless mode, see procgen.py
+
+    def finish(self, state):
+        self.result = fingerprint(state)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {"seed": self.seed, "inputs": self.inputs, "draws": self.draws.tolist(), "result": self.result}
+        if self.endless:
+            data["endless"] = True
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Recording":
+        return cls(data["seed"], data["inputs"], data["draws"], data.get("result"), data.get("endless", False))
+
+    def save(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, separators=(",", ":"), ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str) -> "Recording":
+        with open(path, encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
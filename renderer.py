@@ -0,0 +1,161 @@
+"""Terminal output for Life Unwritten
+
+A Screen collects everything printed for a frame (the header plus the
+menu body) and sends it to the terminal in a single write just before
+the game waits for input, pauses or animates text. Clearing the screen
+uses an ANSI escape instead of scrolling with blank lines, and the
+typewriter effect writes a chunk of characters per frame rather than
+flushing after every character.
+
+In instant mode nothing is animated and no pauses are made. While text
+is being typed out, pressing Enter shows the rest of it at once.
+
+Waiting for the player is asynchronous (input, pause and typewrite are
+coroutines) so the same game code can drive a local terminal or one of
+many network connections; see server.py. The time spent waiting is
+added up in Screen.idle, which metrics.py subtracts from handler timings.
+
+Text with a few changing values in a lot of fixed text is kept as a
+Template, split into its pieces once so filling it in only joins them.
+"""
+
+import asyncio
+import os
+import string
+import sys
+import time
+from typing import Any, List, Mapping, Optional, TextIO
+
+CLEAR = "\033[2J\033[H"
+FRAME_TIME = 1 / 10  # seconds between typewriter frames
+
+
+class Template:
+    """A str.format template parsed once into static text and slots
+
+    render(values) gives the same result as text.format(**values).
+    """
+
+    __slots__ = ('text', 'parts', 'slots')
+
+    def __init__(self, text: str):
+        self.text = text
+        self.parts: List[str] = []  # static text; parts[i] comes before slots[i]
+        self.slots: Optional[List[tuple]] = []  # (name, conversion, spec); None falls back to str.format
+        literal = ""
+        for text_part, name, spec, conversion in string.Formatter().parse(text):
+            literal += text_part
+            if name is None:
+                continue
+            if not name.isidentifier() or "{" in spec:
+                self.slots = None  # indexing, attributes or nested fields
+                return
+            self.parts.append(literal)
+            self.slots.append((name, conversion, spec))
+            literal = ""
+        self.parts.append(literal)
+
+    def render(self, values: Mapping[str, Any]) -> str:
+        if self.slots is None:
+            return self.text.format(**values)
+        out = [self.parts[0]]
+        for (name, conversion, spec), part in zip(self.slots, self.parts[1:]):
+            value = values[name]
+            if conversion == "r":
+                value = repr(value)
+            elif conversion == "a":
+                value = ascii(value)
+            elif conversion == "s":
+                value = str(value)
+            out.append(format(value, spec))
+            out.append(part)
+        return "".join(out)
+
+
+class Screen:
+    def __init__(self, stream: Optional[TextIO] = None, instant: bool = False, frame_time: float = FRAME_TIME):
+        self.stream = stream if stream is not None else sys.stdout
+        self.instant = instant
+        self.frame_time = frame_time
+        self.buffer: List[str] = []
+        self.inputs: Optional[List[str]] = None  # every line read is appended here when set
+        self.idle = 0.0  # seconds spent waiting for the player, pausing or animating
+
+    def print(self, *values, sep: str = " ", end: str = "\n"):
+        """Queue a line for the current frame, like the print builtin"""
+        self.buffer.append(sep.join(str(value) for value in values) + end)
+
+    def clear(self):
+        """Start a new frame on an empty screen"""
+        self.buffer = [CLEAR]
+
+    def flush(self, extra: str = ""):
+        """Write the queued frame in one call"""
+        if self.buffer or extra:
+            self.buffer.append(extra)
+            self.stream.write("".join(self.buffer))
+            self.buffer = []
+        self.stream.flush()
+
+    async def input(self, prompt: str = "") -> str:
+        """Show the frame and prompt, then wait for a line of input"""
+        self.flush(prompt)
+        start = time.perf_counter()
+        line = await self.read_line()
+        self.idle += time.perf_counter() - start
+        if self.inputs is not None:
+            self.inputs.append(line)
+        return line
+
+    async def pause(self, seconds: float):
+        """Show the frame and hold it for a moment"""
+        self.flush()
+        if not self.instant:
+            start = time.perf_counter()
+            await asyncio.sleep(seconds)
+            self.idle += time.perf_counter() - start
+
+    async def typewrite(self, text: str, delay: float = 0.03):
+        """Type text out at roughly delay seconds per character"""
+        self.flush()
+        if self.instant or delay <= 0:
+            self.flush(text + "\n")
+            return
+
+        began = time.perf_counter()
+        chunk = max(1, round(self.frame_time / delay))
+        for start in range(0, len(text), chunk):
+            self.buffer.append(text[start:start + chunk])
+            self.flush()
+            if await self.wait_for_skip(delay * chunk):
+                self.buffer.append(text[start + chunk:])
+                break
+        self.flush("\n")
+        self.idle += time.perf_counter() - began
+
+    async def read_line(self) -> str:
+        """Wait for the next line typed by the player"""
+        # A terminal hosts a single session, so blocking the loop here is fine
+        return input()
+
+    async def wait_for_skip(self, seconds: float) -> bool:
+        """Sleep for a frame; True if the player asked to skip the animation"""
+        await asyncio.sleep(seconds)
+        return skip_requested()
+
+
+def skip_requested() -> bool:
+    """Whether the player pressed a key to skip an animation"""
+    if not sys.stdin.isatty():
+        return False
+    if os.name == "nt":
+        import msvcrt
+        if msvcrt.kbhit():
+            msvcrt.getwch()
+            return True
+        return False
+    import select
+    if select.select([sys.stdin], [], [], 0)[0]:
+        sys.stdin.readline()  # swallow the Enter so it doesn't answer the next prompt
+        return True
+    return False
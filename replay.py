@@ -0,0 +1,80 @@
+"""Replay a recorded Life Unwritten session
+
+Runs the real game against a recording made with life_unwritten.py
+--record (or server.py --record-dir): the player's lines are fed back
+as input, random draws come from the recording, and nothing is animated
+or paused, so a session plays back at full speed. The final state is
+compared with the fingerprint stored in the recording.
+"""
+
+import argparse
+import asyncio
+import io
+import sys
+from typing import List, Optional, TextIO
+
+import engine
+from life_unwritten import LifeUnwritten
+from recording import Recording, ReplayRandom, fingerprint
+from renderer import Screen
+
+
+class ReplayScreen(Screen):
+    """Screen that answers prompts from a list of recorded lines"""
+
+    def __init__(self, inputs: List[str], stream: Optional[TextIO] = None):
+        super().__init__(io.StringIO() if stream is None else stream, instant=True)
+        self.lines = iter(inputs)
+
+    async def read_line(self) -> str:
+        try:
+            return next(self.lines)
+        except StopIteration:
+            raise EOFError("end of recording") from None
+
+
+class ReplayGame(LifeUnwritten):
+    def __init__(self, recording: Recording, screen: Screen):
+        super().__init__(None, screen, recording.seed, endless=recording.endless)
+        self.recording = recording
+
+    def start_recording(self):
+        self.state.rng = ReplayRandom(self.recording.draws)
+
+
+async def play_back(recording: Recording, stream: Optional[TextIO] = None) -> engine.GameState:
+    """Run a recorded session to its end and return the final state"""
+    game = ReplayGame(recording, ReplayScreen(recording.inputs, stream))
+    try:
+        await game.run()
+    except EOFError:
+        pass  # the player left before the game was over
+    game.screen.flush()
+    return game.state
+
+
+def replay(recording: Recording, stream: Optional[TextIO] = None) -> engine.GameState:
+    return asyncio.run(play_back(recording, stream))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded Life Unwritten session")
+    parser.add_argument("recording", help="recording written by life_unwritten.py --record")
+    parser.add_argument("--show", action="store_true", help="print the screens as they are replayed")
+    args = parser.parse_args()
+
+    recording = Recording.load(args.recording)
+    state = replay(recording, sys.stdout if args.show else None)
+    result = fingerprint(state)
+    print(f"\nDay {result['day']}, mood {result['mood']}, ending {result['ending']}, "
+          f"{result['choices']} choices")
+    if recording.result is None:
+        print("The recording has no final state to compare with.")
+    elif result != recording.result:
+        sys.exit(f"Replay diverged from the recording: expected {recording.result}")
+    else:
+        print("Replay matches the recording.")
+
+
+if __name__ == "__main__":
+    main()
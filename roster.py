@@ -0,0 +1,262 @@
+"""Roster index for Life Unwritten
+
+Lets the menus page through a cast of any size without walking all of
+it. NPCs are identified by their stable npc_id from the content pack.
+Each NPC sits in one of 101 buckets by bond level, both in an index of
+the whole cast and in one per relationship type, and moves between
+buckets in O(1) whenever GameState.set_bond changes a bond. Listing the
+cast strongest bond first, or only one relationship type or bond tier,
+then skips whole buckets and copies out just the page being shown.
+A session's indexes start out sharing every bucket with the world's
+template and copy a bucket only when one of its own NPCs moves in or out.
+Name searches use a sorted name list shared by every session, followed
+by the acquaintances an endless game has met, and keep to the
+relationship and tier filters when they are set.
+"""
+
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import content
+import engine
+
+_name_index: Optional[Tuple[List[str], List[int]]] = None
+
+
+def tier_range(index: int) -> range:
+    """Bond levels covered by a tier, strongest first"""
+    top = engine.MAX_LEVEL if index == 0 else engine.TIER_FLOORS[index - 1] - 1
+    return range(top, engine.TIER_FLOORS[index] - 1, -1)
+
+
+def name_index() -> Tuple[List[str], List[int]]:
+    """Casefolded names in sorted order with their npc_ids, built once per process"""
+    global _name_index
+    if _name_index is None:
+        pairs = sorted((name.casefold(), npc_id) for npc_id, name in enumerate(content.NAMES))
+        _name_index = ([name for name, _ in pairs], [npc_id for _, npc_id in pairs])
+    return _name_index
+
+
+class BondIndex:
+    """NPC ids bucketed by bond level, with O(1) moves
+
+    Every bucket has its own map of where each id sits in it. A copy
+    shares all the buckets with the index it was made from, and either
+    of them copies a bucket the first time it changes it, so a session
+    only pays for the bond levels its own NPCs have moved through.
+    """
+
+    __slots__ = ('buckets', 'positions', 'owned', 'size')
+
+    def __init__(self):
+        levels = engine.MAX_LEVEL + 1
+        self.buckets: List[List[int]] = [[] for _ in range(levels)]
+        self.positions: List[Dict[int, int]] = [{} for _ in range(levels)]  # npc_id -> index inside the bucket
+        self.owned = bytearray(b'\x01') * levels  # buckets no other index shares
+        self.size = 0
+
+    def writable(self, level: int) -> Tuple[List[int], Dict[int, int]]:
+        """A bucket and its positions, copied first if they are shared"""
+        if not self.owned[level]:
+            self.buckets[level] = self.buckets[level].copy()
+            self.positions[level] = self.positions[level].copy()
+            self.owned[level] = 1
+        return self.buckets[level], self.positions[level]
+
+    def add(self, npc_id: int, bond_level: int):
+        bucket, positions = self.writable(bond_level)
+        positions[npc_id] = len(bucket)
+        bucket.append(npc_id)
+        self.size += 1
+
+    def copy(self) -> "BondIndex":
+        index = BondIndex.__new__(BondIndex)
+        index.buckets = self.buckets.copy()
+        index.positions = self.positions.copy()
+        index.owned = bytearray(len(self.buckets))
+        self.owned = bytearray(len(self.buckets))  # every bucket is shared from now on
+        index.size = self.size
+        return index
+
+    def remove(self, npc_id: int, bond_level: int):
+        bucket, positions = self.writable(bond_level)
+        i = positions.pop(npc_id)
+        last = bucket.pop()
+        if last != npc_id:
+            bucket[i] = last
+            positions[last] = i
+        self.size -= 1
+
+    def private(self) -> Tuple[int, int]:
+        """How many buckets this index has its own copies of, and the ids in them"""
+        owned = [bucket for bucket, mine in zip(self.buckets, self.owned) if mine]
+        return len(owned), sum(map(len, owned))
+
+    def contains(self, npc_id: int, levels: Iterable[int]) -> bool:
+        return any(npc_id in self.positions[level] for level in levels)
+
+    def count(self, levels: Iterable[int]) -> int:
+        return sum(len(self.buckets[level]) for level in levels)
+
+    def page(self, levels: Iterable[int], start: int, size: int) -> List[int]:
+        """Ids from start to start + size when read in the order of levels"""
+        ids = []
+        for level in levels:
+            bucket = self.buckets[level]
+            if start >= len(bucket):
+                start -= len(bucket)
+                continue
+            ids.extend(bucket[start:start + size - len(ids)])
+            start = 0
+            if len(ids) == size:
+                break
+        return ids
+
+
+class Roster:
+    """Bond-ordered view of a session's cast"""
+
+    __slots__ = ('everyone', 'by_relationship', 'relationships', 'acquaintances')
+
+    def __init__(self, characters: Iterable[engine.Character] = ()):
+        self.everyone = BondIndex()
+        self.by_relationship: Dict[str, BondIndex] = {}
+        self.relationships: Dict[str, str] = {}  # casefolded -> as written in the content pack
+        self.acquaintances: List[int] = []  # generated NPCs, in the order they were met
+        for char in characters:
+            self.add(char.npc_id, char.bond_level)
+
+    def add(self, npc_id: int, bond_level: int):
+        relationship = content.npc_profile(npc_id)["relationship"]
+        group = self.by_relationship.get(relationship)
+        if group is None:
+            group = self.by_relationship[relationship] = BondIndex()
+            # copies share the mapping, so a new relationship type gets a new one
+            self.relationships = {**self.relationships, relationship.casefold(): relationship}
+        if npc_id >= len(content.NAMES):
+            self.acquaintances.append(npc_id)
+        self.everyone.add(npc_id, bond_level)
+        group.add(npc_id, bond_level)
+
+    def copy(self) -> "Roster":
+        roster = Roster.__new__(Roster)
+        roster.everyone = self.everyone.copy()
+        roster.by_relationship = {relationship: index.copy() for relationship, index in self.by_relationship.items()}
+        roster.relationships = self.relationships  # replaced, never changed, when a relationship type is added
+        roster.acquaintances = self.acquaintances.copy()
+        return roster
+
+    def move(self, npc_id: int, old_bond: int, new_bond: int):
+        """Re-file an NPC after its bond level changed"""
+        if old_bond == new_bond:
+            return
+        for index in (self.everyone, self.by_relationship[content.npc_profile(npc_id)["relationship"]]):
+            index.remove(npc_id, old_bond)
+            index.add(npc_id, new_bond)
+
+    def find_relationship(self, text: str) -> Optional[str]:
+        """The relationship type matching what the player typed, ignoring case"""
+        return self.relationships.get(text.strip().casefold())
+
+    def view(self, relationship: Optional[str] = None, tier_index: Optional[int] = None) -> Tuple[BondIndex, range]:
+        index = self.everyone if relationship is None else self.by_relationship.get(relationship, BondIndex())
+        levels = range(engine.MAX_LEVEL, engine.MIN_LEVEL - 1, -1) if tier_index is None else tier_range(tier_index)
+        return index, levels
+
+    def count(self, relationship: Optional[str] = None, tier_index: Optional[int] = None) -> int:
+        """How many NPCs match the filters"""
+        index, levels = self.view(relationship, tier_index)
+        if relationship is None and tier_index is None:
+            return index.size
+        return index.count(levels)
+
+    def page(self, number: int, size: int, relationship: Optional[str] = None,
+             tier_index: Optional[int] = None) -> List[int]:
+        """npc_ids on a page (0-based) of the matching NPCs, strongest bond first"""
+        index, levels = self.view(relationship, tier_index)
+        return index.page(levels, number * size, size)
+
+    def search(self, prefix: str, number: int, size: int, relationship: Optional[str] = None,
+               tier_index: Optional[int] = None) -> Tuple[List[int], int]:
+        """A page of the NPCs whose name starts with prefix and who match the filters, and how many do"""
+        if relationship is None and tier_index is None:
+            return search(prefix, number, size, self.acquaintances)
+        index, levels = self.view(relationship, tier_index)
+        return search(prefix, number, size, self.acquaintances, lambda npc_id: index.contains(npc_id, levels))
+
+
+def search(prefix: str, number: int, size: int, acquaintances: Sequence[int] = (),
+           keep: Optional[Callable[[int], bool]] = None) -> Tuple[List[int], int]:
+    """npc_ids on a page of the NPCs whose name starts with prefix, and how many match
+
+    Matching acquaintances come after the content pack's NPCs. With a
+    keep test only the NPCs it accepts count, which walks every name
+    with the prefix rather than just the page.
+    """
+    names, ids = name_index()
+    key = prefix.casefold()
+    low = bisect_left(names, key)
+    high = bisect_left(names, key + "\U0010ffff", low)
+    if keep is not None:
+        matches = [npc_id for npc_id in ids[low:high] if keep(npc_id)]
+        matches += [npc_id for npc_id in acquaintances
+                    if content.npc_name(npc_id).casefold().startswith(key) and keep(npc_id)]
+        return matches[number * size:(number + 1) * size], len(matches)
+    start = low + number * size
+    page = ids[start:min(start + size, high)]
+    if not acquaintances:
+        return page, high - low
+    met = [npc_id for npc_id in acquaintances if content.npc_name(npc_id).casefold().startswith(key)]
+    skip = max(0, number * size - (high - low))
+    return page + met[skip:skip + size - len(page)], high - low + len(met)
+
+
+class Query:
+    """What a roster menu is currently showing"""
+
+    __slots__ = ('page', 'by_bond', 'relationship', 'tier', 'prefix')
+
+    def __init__(self):
+        self.page = 0
+        self.by_bond = False
+        self.relationship: Optional[str] = None
+        self.tier: Optional[int] = None
+        self.prefix = ""
+
+    def filtered(self) -> bool:
+        return bool(self.prefix) or self.relationship is not None or self.tier is not None
+
+    def run(self, roster: Roster, size: int) -> Tuple[List[int], int]:
+        """npc_ids on the current page and the number of matching NPCs
+
+        Searches list names alphabetically, within the relationship and
+        tier filters if any; filters and bond sorting otherwise list the
+        strongest bonds first, and without either the cast is in content
+        order.
+        """
+        if self.prefix:
+            return roster.search(self.prefix, self.page, size, self.relationship, self.tier)
+        if self.by_bond or self.relationship is not None or self.tier is not None:
+            return (roster.page(self.page, size, self.relationship, self.tier),
+                    roster.count(self.relationship, self.tier))
+        total = roster.count()
+        start = self.page * size
+        return list(range(start, min(start + size, total))), total
+
+
+_template: Optional[Roster] = None
+
+
+def roster_for(state: engine.GameState) -> Roster:
+    """The state's roster, copied from the world's index on first use"""
+    global _template
+    if state.roster is None:
+        if _template is None:
+            _template = Roster(engine.world().characters)
+        state.roster = _template.copy()
+        for newcomer in state.characters.newcomers():
+            state.roster.add(newcomer.npc_id, newcomer.bond_level)
+        for shared, own in state.characters.changes():
+            state.roster.move(own.npc_id, shared.bond_level, own.bond_level)
+    return state.roster
@@ -0,0 +1,177 @@
+"""Scripted mode for Life Unwritten
+
+Drives the real game loop from newline-delimited JSON on stdin and
+answers with newline-delimited JSON on stdout, for soak tests and
+latency measurements. Nothing is drawn and nothing waits: the screen
+discards all output and every pause and typewriter effect is skipped.
+Many sessions can be interleaved on one stream.
+
+Each input line is an object naming a session and, usually, the line
+the player types at its current prompt:
+
+    {"session": "a", "seed": 7}              start a session (optional)
+    {"session": "a", "input": "Ann"}         answer the current prompt
+    {"session": "a", "quit": true}           leave as if the player hung up
+
+A session starts the first time it is mentioned; "session" defaults to
+0 and "seed" to a random one. Every time a session stops at a prompt a
+line like this is written:
+
+    {"type": "prompt", "session": "a", "prompt": "Choose an option (1-6)",
+     "day": 1, "mood": 58, "choices": 1, "events": [...], "latency_us": 41.2}
+
+where events are the choices recorded since the previous prompt and
+latency_us is the time the game took to reach the prompt. When a game
+is over an "end" line carries the same fingerprint a recording does
+(see recording.py). Malformed lines get an "error" line and are
+otherwise ignored.
+
+    python scripted.py < script.ndjson > results.ndjson
+"""
+
+import asyncio
+import json
+import sys
+import time
+from typing import Any, Dict, Optional, TextIO
+
+from life_unwritten import LifeUnwritten
+from recording import fingerprint, new_seed
+from renderer import Screen
+
+PROMPT_MARK = "💭 "
+
+
+def prompt_text(prompt: str) -> str:
+    """A prompt as reported in events, without the thought-bubble mark and trailing colon"""
+    text = prompt.strip()
+    if text.startswith(PROMPT_MARK):
+        text = text[len(PROMPT_MARK):]
+    if text.endswith(":"):
+        text = text[:-1]
+    return text
+
+
+class PipeScreen(Screen):
+    """Screen that draws nothing and takes its input lines from a queue"""
+
+    def __init__(self):
+        super().__init__(instant=True)
+        self.lines: asyncio.Queue = asyncio.Queue()
+        self.prompts: asyncio.Queue = asyncio.Queue()  # the game is waiting at this prompt
+        self.prompt = ""
+
+    def print(self, *values, sep: str = " ", end: str = "\n"):
+        pass
+
+    def clear(self):
+        pass
+
+    def flush(self, extra: str = ""):
+        pass
+
+    async def input(self, prompt: str = "") -> str:
+        self.prompt = prompt
+        return await super().input(prompt)
+
+    async def read_line(self) -> str:
+        self.prompts.put_nowait(prompt_text(self.prompt))
+        line = await self.lines.get()
+        if line is None:
+            raise EOFError("session quit")
+        return line
+
+
+class Session:
+    def __init__(self, key: Any, seed: Optional[int]):
+        self.key = key
+        self.screen = PipeScreen()
+        self.game = LifeUnwritten(None, self.screen, new_seed() if seed is None else seed)
+        self.reported = 0  # choices already sent as events
+        self.task = asyncio.ensure_future(self.game.run())
+        self.task.add_done_callback(lambda _: self.screen.prompts.put_nowait(None))
+
+    async def answer(self, line: Optional[str]) -> Dict[str, Any]:
+        """Send a line (None to quit) and wait for the next prompt or the end of the game"""
+        start = time.perf_counter()
+        self.screen.lines.put_nowait(line)
+        return self.report(await self.screen.prompts.get(), time.perf_counter() - start)
+
+    async def first_prompt(self) -> Dict[str, Any]:
+        start = time.perf_counter()
+        return self.report(await self.screen.prompts.get(), time.perf_counter() - start)
+
+    def report(self, prompt: Optional[str], seconds: float) -> Dict[str, Any]:
+        state = self.game.state
+        if prompt is None:
+            self.game.close()
+            result = {"type": "end", "session": self.key}
+            result.update(fingerprint(state))
+            error = self.task.exception()
+            if error is not None and not isinstance(error, EOFError):
+                result["error"] = repr(error)
+            return result
+        log = state.choices_made
+        events = log[self.reported:]
+        self.reported = len(log)
+        return {
+            "type": "prompt",
+            "session": self.key,
+            "prompt": prompt,
+            "day": state.day,
+            "mood": state.mood,
+            "choices": len(log),
+            "events": events,
+            "latency_us": round(seconds * 1e6, 1)
+        }
+
+
+async def run(source: TextIO, sink: TextIO):
+    """Play every session named in source, writing one JSON line per prompt to sink"""
+    sessions: Dict[Any, Session] = {}
+
+    def emit(message: Dict[str, Any]):
+        sink.write(json.dumps(message, ensure_ascii=False) + "\n")
+        sink.flush()  # a driver may be waiting for this line before it writes the next
+
+    for number, raw in enumerate(source, 1):
+        if not raw.strip():
+            continue
+        try:
+            command = json.loads(raw)
+            if not isinstance(command, dict):
+                raise ValueError("expected a JSON object")
+            key = command.get("session", 0)
+            seed = command.get("seed")
+            line = command.get("input")
+            if not isinstance(key, (str, int)) or isinstance(key, bool):
+                raise ValueError("session must be a string or a number")
+            if seed is not None and not isinstance(seed, int):
+                raise ValueError("seed must be an integer")
+            if line is not None and not isinstance(line, str):
+                raise ValueError("input must be a string")
+        except ValueError as e:
+            emit({"type": "error", "line": number, "error": str(e)})
+            continue
+
+        session = sessions.get(key)
+        if session is None:
+            session = sessions[key] = Session(key, seed)
+            emit(await session.first_prompt())
+        if command.get("quit"):
+            emit(await session.answer(None))
+        elif line is not None:
+            emit(await session.answer(line))
+        if session.task.done():
+            del sessions[key]
+
+    for session in list(sessions.values()):  # the script ended mid-game
+        emit(await session.answer(None))
+
+
+def main():
+    asyncio.run(run(sys.stdin, sys.stdout))
+
+
+if __name__ == "__main__":
+    main()
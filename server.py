@@ -0,0 +1,306 @@
+"""Network server for Life Unwritten
+
+Hosts many players in one process over plain TCP; connect with telnet or
+nc. Every connection gets its own LifeUnwritten session with a fresh
+GameState, while the dialogue, reflections and ending text stay shared
+in the content module. Sessions are coroutines on a single asyncio
+loop, so an idle player waiting at a prompt costs a suspended task and
+a small read buffer rather than a thread.
+
+Network sessions are not saved; the save journal belongs to the local
+terminal game. With --record-dir every session leaves a recording that
+replay.py can play back. --metrics-port serves handler timings and event
+counts from every session for a scraper; see metrics.py.
+
+--endless sessions move all but their last RING_RECORDS choices to a
+compressed scratch file, as the terminal game does; --history-ring sets
+that number for any session.
+
+With --max-resident or --max-resident-mb the states of sessions that
+wait for their player are kept within a budget: the least recently
+active ones are spilled to disk and read back on their next line (see
+sessions.py).
+
+With --workers the parent loads the content, builds the world template
+and warms the caches, then forks that many worker processes which all
+accept connections on the same listening socket. Each worker starts with
+everything a session needs already in memory.
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+from typing import List, Optional
+
+import content
+import dialogue
+import engine
+import metrics
+import roster
+from analytics import Exporter
+from history import RING_RECORDS
+from life_unwritten import LifeUnwritten
+from renderer import Screen, FRAME_TIME
+from sessions import SessionStore
+
+IAC = 255  # telnet "interpret as command"
+SB, SE = 250, 240  # subnegotiation start and end
+WILL, WONT, DO, DONT = 251, 252, 253, 254
+
+
+def strip_telnet(data: bytes) -> bytes:
+    """Remove telnet negotiation sequences from a line of input"""
+    if IAC not in data:
+        return data
+    out = bytearray()
+    i = 0
+    while i < len(data):
+        byte = data[i]
+        if byte != IAC:
+            out.append(byte)
+            i += 1
+        elif i + 1 < len(data) and data[i + 1] == IAC:
+            out.append(IAC)  # escaped 255
+            i += 2
+        elif i + 1 < len(data) and data[i + 1] == SB:
+            end = data.find(bytes((IAC, SE)), i + 2)
+            i = len(data) if end == -1 else end + 2
+        elif i + 1 < len(data) and data[i + 1] in (WILL, WONT, DO, DONT):
+            i += 3
+        else:
+            i += 2
+    return bytes(out)
+
+
+class RemoteScreen(Screen):
+    """Screen that draws to and reads from one TCP connection"""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                 instant: bool = False, frame_time: float = FRAME_TIME,
+                 store: Optional[SessionStore] = None, key: str = ""):
+        super().__init__(instant=instant, frame_time=frame_time)
+        self.reader = reader
+        self.writer = writer
+        self.pending_line: Optional[asyncio.Future] = None  # read started while typing
+        self.store = store  # told when the session waits for its player, under key
+        self.key = key
+
+    def flush(self, extra: str = ""):
+        """Queue the frame on the socket, with telnet line endings"""
+        if self.buffer or extra:
+            self.buffer.append(extra)
+            text = "".join(self.buffer)
+            self.buffer = []
+            if not self.writer.is_closing():
+                self.writer.write(text.replace("\n", "\r\n").encode())
+
+    async def read_line(self) -> str:
+        await self.writer.drain()
+        if self.store is not None:
+            self.store.sleep(self.key)
+        try:
+            if self.pending_line is not None:
+                line, self.pending_line = await self.pending_line, None
+            else:
+                line = await self.reader.readline()
+        finally:
+            if self.store is not None:
+                self.store.wake(self.key)
+        if not line:
+            raise EOFError("connection closed")
+        return strip_telnet(line).decode(errors="replace").rstrip("\r\n\0")
+
+    async def pause(self, seconds: float):
+        await self.writer.drain()
+        await super().pause(seconds)
+
+    async def wait_for_skip(self, seconds: float) -> bool:
+        await self.writer.drain()
+        if self.pending_line is None:
+            self.pending_line = asyncio.ensure_future(self.reader.readline())
+        done, _ = await asyncio.wait((self.pending_line,), timeout=seconds)
+        if not done:
+            return False
+        line, self.pending_line = self.pending_line.result(), None
+        if not line:
+            raise EOFError("connection closed")
+        return True  # the Enter only skips, it doesn't answer the next prompt
+
+
+class Server:
+    def __init__(self, instant: bool = False, record_dir: Optional[str] = None,
+                 metrics_path: Optional[str] = None, analytics: Optional[Exporter] = None,
+                 store: Optional[SessionStore] = None, endless: bool = False,
+                 history_ring: Optional[int] = None):
+        self.instant = instant
+        self.record_dir = record_dir
+        self.metrics_path = metrics_path
+        self.analytics = analytics  # every finished or abandoned session's choices are added here
+        self.store = store
+        self.endless = endless  # every session plays endless mode
+        if history_ring is None and endless:
+            history_ring = RING_RECORDS  # an endless game's history never stops growing
+        self.history_ring = history_ring  # choices each session keeps in memory
+        self.sessions = 0
+        self.started = 0
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Run one player's game for as long as they stay connected"""
+        self.sessions += 1
+        self.started += 1
+        key = f"{os.getpid()}-{self.started}"
+        game = LifeUnwritten(None, RemoteScreen(reader, writer, self.instant, store=self.store, key=key),
+                             history_ring=self.history_ring, endless=self.endless)
+        if self.record_dir is not None:
+            game.record_path = os.path.join(self.record_dir, f"session-{self.started}-{game.state.seed}.json")
+        if self.store is not None:
+            self.store.add(key, game)
+        try:
+            await game.run()
+            await writer.drain()
+        except (EOFError, ConnectionError):
+            pass
+        finally:
+            game.close()
+            self.sessions -= 1
+            if self.store is not None:
+                self.store.remove(key)
+            if self.analytics is not None:
+                self.analytics.add(game.state)
+            if self.metrics_path:
+                metrics.write(self.metrics_path)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def serve(self, host: str, port: int, sock: Optional[socket.socket] = None):
+        if self.record_dir is not None:
+            os.makedirs(self.record_dir, exist_ok=True)
+        if sock is not None:
+            server = await asyncio.start_server(self.handle, sock=sock)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+        for sock in server.sockets:
+            print(f"Life Unwritten listening on {sock.getsockname()}", file=sys.stderr)
+        async with server:
+            await server.serve_forever()
+
+
+def warm_up():
+    """Load everything a new session reads so forked workers inherit it"""
+    for npc_id in range(len(content.NAMES)):
+        content.npc_scenario(npc_id)
+    roster.roster_for(engine.new_game())
+    dialogue.index()
+    roster.name_index()
+
+
+def listen(host: str, port: int) -> socket.socket:
+    """A bound, listening TCP socket, as socket.create_server (Python 3.8+) would make it"""
+    family, kind, proto, _, address = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM,
+                                                         flags=socket.AI_PASSIVE)[0]
+    sock = socket.socket(family, kind, proto)
+    if os.name == "posix":
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(address)
+    sock.listen()
+    return sock
+
+
+def serve_forked(server: Server, host: str, port: int, workers: int):
+    """Fork workers from this warmed process, all serving one listening socket"""
+    sock = listen(host, port)
+    print(f"Life Unwritten listening on {sock.getsockname()} with {workers} workers", file=sys.stderr)
+    warm_up()
+    children: List[int] = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                asyncio.run(server.serve(host, port, sock))
+            except KeyboardInterrupt:
+                pass
+            except BaseException:
+                code = 1
+            os._exit(code)
+        children.append(pid)
+    sock.close()
+    try:
+        for pid in children:
+            os.waitpid(pid, 0)
+    except KeyboardInterrupt:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Host Life Unwritten for many players over TCP")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=4000)
+    parser.add_argument("--instant", action="store_true",
+                        help="show all text at once, without typewriter effects or pauses")
+    parser.add_argument("--record-dir", metavar="DIR",
+                        help="write a recording of every session to DIR for replay.py")
+    parser.add_argument("--endless", action="store_true",
+                        help="host endless games, with no final day and a generated acquaintance every day")
+    parser.add_argument("--history-ring", type=int, metavar="N",
+                        help=f"keep only about the last N choices of each session in memory "
+                             f"(default for --endless: {RING_RECORDS})")
+    parser.add_argument("--workers", type=int, metavar="N",
+                        help="fork N worker processes from a warmed parent (not on Windows)")
+    parser.add_argument("--max-resident", type=int, metavar="N",
+                        help="keep at most N session states in memory, spilling idle ones to disk")
+    parser.add_argument("--max-resident-mb", type=float, metavar="MB",
+                        help="keep session states within about MB megabytes, spilling idle ones to disk")
+    parser.add_argument("--spill-dir", metavar="DIR",
+                        help="where spilled sessions go (default: a temporary directory)")
+    parser.add_argument("--analytics", metavar="DIR",
+                        help="append every session's choices to a columnar export in DIR (see analytics.py)")
+    parser.add_argument("--metrics", metavar="PATH",
+                        help="rewrite handler timings and event counts to PATH (OpenMetrics text) as sessions end")
+    parser.add_argument("--metrics-port", type=int, metavar="PORT",
+                        help="serve the metrics on http://127.0.0.1:PORT/")
+    args = parser.parse_args()
+    if args.workers and not hasattr(os, "fork"):
+        parser.error("--workers needs os.fork, which this platform doesn't have")
+    if args.workers and (args.metrics or args.metrics_port or args.analytics):
+        parser.error("--metrics, --metrics-port and --analytics only cover a single process; leave out --workers")
+    if args.metrics or args.metrics_port:
+        metrics.enable()
+    if args.metrics_port:
+        metrics.serve(args.metrics_port)
+    analytics = Exporter(args.analytics) if args.analytics else None
+    store = None
+    spill_dir = args.spill_dir
+    if args.max_resident is not None or args.max_resident_mb is not None:
+        max_bytes = None if args.max_resident_mb is None else int(args.max_resident_mb * 1024 * 1024)
+        spill_dir = spill_dir or tempfile.mkdtemp(prefix="life_unwritten_sessions-")
+        store = SessionStore(spill_dir, args.max_resident, max_bytes)
+    server = Server(args.instant, args.record_dir, args.metrics, analytics, store, args.endless, args.history_ring)
+    try:
+        if args.workers:
+            serve_forked(server, args.host, args.port, args.workers)  # workers leave through os._exit
+        else:
+            asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if analytics is not None:
+            analytics.close()
+        if store is not None and not args.spill_dir:
+            shutil.rmtree(spill_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
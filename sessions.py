@@ -0,0 +1,252 @@
+"""Session store for Life Unwritten
+
+Most network players sit at a prompt most of the time, yet a waiting
+session still holds its whole GameState: the random stream, the choice
+log, its recording and, once a menu has shown it, its own roster index.
+SessionStore keeps the states of the most recently active sessions in
+memory, within a budget of sessions and/or estimated bytes, and writes
+the least recently used waiting ones to a directory. A spilled session
+keeps only its coroutine and screen; the state is read back the moment
+its player types the next line.
+
+Only sessions waiting for their player are ever spilled, and a session
+with a save journal never is. A spill file holds the journal's compact
+state (see journal.dump_state), the random stream's internal state, the
+recording and the packed choice records, compressed with zlib. Files
+are in the machine's own byte order and are removed once read back.
+When the history has a HistoryArchive only the records still in memory
+are written; the archive stays open, held by the store, until the
+session is read back and the log is reattached to it.
+"""
+
+import json
+import os
+import random
+import sys
+import time
+import zlib
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import engine
+import journal
+import metrics
+from history import HistoryArchive
+from recording import Recording, RecordingRandom
+
+SPILL_SUFFIX = ".state"
+
+# Rough resident sizes, measured with tracemalloc, used for the byte budget;
+# tests/test_sessions.py checks the estimate against a fresh measurement
+BASE_BYTES = 4700  # LifeUnwritten, GameState, Cast, ChoiceLog and a seeded random stream
+CHARACTER_BYTES = 120  # a character the session has its own copy of
+RECORD_INDEX_BYTES = 8  # per choice, on top of the packed record
+BUCKET_SLOT_BYTES = 20  # per bond level of a roster index, whether the bucket is shared or not
+BUCKET_BYTES = 140  # a bond bucket the session has its own copy of, empty
+ROSTER_NPC_BYTES = 60  # per NPC in such a bucket
+
+
+def resident_bytes(state: engine.GameState) -> int:
+    """Estimated memory held by one session's state"""
+    log = state.choices_made
+    size = BASE_BYTES + len(state.characters.changed) * CHARACTER_BYTES
+    size += len(log.data) * log.data.itemsize + len(log) * RECORD_INDEX_BYTES
+    if state.recording is not None:
+        size += len(state.recording.draws) * state.recording.draws.itemsize
+        size += sum(map(sys.getsizeof, state.recording.inputs))
+    if state.roster is not None:
+        for index in (state.roster.everyone, *state.roster.by_relationship.values()):
+            buckets, ids = index.private()
+            size += (engine.MAX_LEVEL + 1) * BUCKET_SLOT_BYTES + buckets * BUCKET_BYTES + ids * ROSTER_NPC_BYTES
+    return size
+
+
+def dump(state: engine.GameState) -> bytes:
+    """Compact form of a GameState for the spill directory"""
+    rng = state._rng
+    header = journal.dump_state(state)
+    header["characters"] = [[char.npc_id, char.bond_level, char.last_interaction, char.current_mood]
+                            for _, char in state.characters.changes()]  # the rest come from the world
+    header["seed"] = state.seed
+    words = array('I')
+    if rng is not None:
+        version, internal, gauss = rng.getstate()
+        words.extend(internal)
+        header["rng"] = [type(rng) is RecordingRandom, version, gauss]
+    draws = array('q')
+    if state.recording is not None:
+        draws = state.recording.draws
+        header["recording"] = [state.recording.inputs, state.recording.result]
+    header["sizes"] = [len(words), len(draws)]
+    log = state.choices_made
+    if log.archive is not None:
+        header["history"] = log.index_state()  # only the records in memory are written
+    text = json.dumps(header, separators=(',', ':'), ensure_ascii=False).encode()
+    records = log.data
+    if sys.byteorder == 'big':
+        records = array('H', records)
+        records.byteswap()  # journal.restore_state reads little-endian records
+    return zlib.compress(b''.join((len(text).to_bytes(4, 'little'), text, words.tobytes(), draws.tobytes(),
+                                   records.tobytes())), 1)
+
+
+def load(blob: bytes, archive: Optional[HistoryArchive] = None) -> engine.GameState:
+    """Rebuild a GameState from dump() output and, if its history was archived, that archive"""
+    data = zlib.decompress(blob)
+    length = int.from_bytes(data[:4], 'little')
+    header = json.loads(data[4:4 + length])
+    pos = 4 + length
+    n_words, n_draws = header["sizes"]
+    words = array('I', data[pos:pos + n_words * 4])
+    pos += n_words * 4
+    draws = array('q', data[pos:pos + n_draws * 8])
+    pos += n_draws * 8
+
+    if "history" in header:
+        if archive is None:
+            raise ValueError("the spilled history needs its archive")
+        state = journal.restore_state(header, b'')
+        state.choices_made.reattach(archive, header["history"], data[pos:], sys.byteorder == 'big')
+    else:
+        state = journal.restore_state(header, data[pos:])
+    state.seed = header["seed"]
+    if "recording" in header:
+        inputs, result = header["recording"]
+        state.recording = Recording(state.seed, inputs, result=result, endless=state.endless)
+        state.recording.draws = draws
+    if "rng" in header:
+        recorded, version, gauss = header["rng"]
+        state.rng = RecordingRandom(state.seed, state.recording.draws) if recorded else random.Random()
+        state.rng.setstate((version, tuple(words), gauss))
+    return state
+
+
+class Entry:
+    __slots__ = ('game', 'size', 'path', 'archive')
+
+    def __init__(self, game):
+        self.game = game
+        self.size = resident_bytes(game.state)
+        self.path: Optional[str] = None  # spill file while the state is on disk
+        self.archive: Optional[HistoryArchive] = None  # the spilled history's older records
+
+
+class SessionStore:
+    """LRU budget for the GameStates of many LifeUnwritten sessions
+
+    The server calls sleep() when a session starts waiting for its
+    player and wake() as soon as the line arrives; both are cheap when
+    nothing has to move. A budget of None means no limit.
+    """
+
+    def __init__(self, directory: str, max_sessions: Optional[int] = None, max_bytes: Optional[int] = None):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.entries: Dict[Any, Entry] = {}
+        self.idle: "OrderedDict[Any, Entry]" = OrderedDict()  # resident and waiting, least recent first
+        self.resident = 0
+        self.resident_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.spilled_bytes = 0  # written to disk over the store's life
+        self.rehydrate = metrics.Histogram()
+
+    def add(self, key: Any, game):
+        """Register a running session"""
+        entry = self.entries[key] = Entry(game)
+        self.resident += 1
+        self.resident_bytes += entry.size
+
+    def remove(self, key: Any):
+        """Forget a session that has ended, along with any spill file"""
+        entry = self.entries.pop(key)
+        self.idle.pop(key, None)
+        if entry.path is None:
+            self.resident -= 1
+            self.resident_bytes -= entry.size
+        else:
+            os.remove(entry.path)
+            if entry.archive is not None:
+                entry.archive.close()
+
+    def sleep(self, key: Any):
+        """The session is waiting for its player; it may be spilled from now on"""
+        entry = self.entries[key]
+        state = entry.game.state
+        size = resident_bytes(state)
+        self.resident_bytes += size - entry.size
+        entry.size = size
+        if state.journal is None:
+            self.idle[key] = entry
+        self.enforce()
+
+    def wake(self, key: Any):
+        """The session is about to run; read its state back if it was spilled"""
+        entry = self.entries[key]
+        if entry.path is None:
+            self.idle.pop(key, None)
+            self.hits += 1
+            metrics.count("session_store_hit")
+            return
+        start = time.perf_counter()
+        with open(entry.path, 'rb') as f:
+            state = load(f.read(), entry.archive)
+        os.remove(entry.path)
+        entry.path = None
+        entry.archive = None
+        game = entry.game
+        game.state = state
+        if state.recording is not None:
+            game.screen.inputs = state.recording.inputs
+        seconds = time.perf_counter() - start
+        self.rehydrate.observe(seconds)
+        if metrics.REGISTRY.enabled:
+            metrics.REGISTRY.observe("session_rehydrate", seconds)
+        self.misses += 1
+        metrics.count("session_store_miss")
+        self.resident += 1
+        self.resident_bytes += entry.size
+        self.enforce()
+
+    def over_budget(self) -> bool:
+        return ((self.max_sessions is not None and self.resident > self.max_sessions) or
+                (self.max_bytes is not None and self.resident_bytes > self.max_bytes))
+
+    def enforce(self):
+        """Spill the least recently active waiting sessions until the budget holds"""
+        while self.idle and self.over_budget():
+            key, entry = self.idle.popitem(last=False)
+            self.evict(key, entry)
+
+    def evict(self, key: Any, entry: Entry):
+        blob = dump(entry.game.state)
+        entry.archive = entry.game.state.choices_made.archive
+        path = os.path.join(self.directory, f"{key}{SPILL_SUFFIX}")
+        with open(path, 'wb') as f:
+            f.write(blob)
+        entry.path = path
+        entry.game.state = None
+        entry.game.screen.inputs = None
+        self.resident -= 1
+        self.resident_bytes -= entry.size
+        self.evictions += 1
+        self.spilled_bytes += len(blob)
+        metrics.count("session_store_eviction")
+
+    def stats(self) -> Dict[str, Any]:
+        rehydrate = self.rehydrate
+        return {
+            "sessions": len(self.entries),
+            "resident": self.resident,
+            "resident_bytes": self.resident_bytes,
+            "spilled": len(self.entries) - self.resident,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "spilled_bytes": self.spilled_bytes,
+            "rehydrate_mean_us": rehydrate.total / rehydrate.count * 1e6 if rehydrate.count else 0.0
+        }
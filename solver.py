@@ -0,0 +1,445 @@
+"""Approximate ending solver for Life Unwritten
+
+Estimates, for any game state, how likely each ending is, both for a
+player choosing optimally and for one picking uniformly at random among
+the legal actions, under the real rules: the player may talk to people
+as often as they like before ending the day, over the whole week up to
+final_day. Reflection boosts are chance nodes with every value of
+REFLECTION_BOOST equally likely.
+
+Unbounded days make the state graph cyclic and far too large to walk
+one exact state at a time, so the probabilities are not exact: states
+are merged: mood and every bond
+are kept on a grid of `grain` points, clamped to MIN_LEVEL..MAX_LEVEL
+like the game. A change that lands between two grid points is split
+between them in proportion, so every change keeps its expected value,
+and a state is then the day, the reflections used, the mood level and
+one level per NPC. With the default grain of 10 a new game needs about
+130,000 states a day, held in NumPy arrays, and the whole week solves in
+a quarter of a minute:
+
+  - the random policy pushes the probability of every state forward one
+    action at a time until less than `tolerance` is left in the day,
+    then applies the ending check and carries the rest into the next day
+  - the optimal probability of each ending comes from value iteration
+    over the same arrays, one day at a time from the last, repeated
+    within a day until no value moves by more than `tolerance`
+
+Merging moves the probabilities by around one in ten thousand at the
+default grain; tests/test_solver.py checks the random-policy ending
+distribution against engine.play. A finer grain (5, 2 or 1) trades time
+and memory for fidelity.
+
+Plans are found on the real, unmerged states: an A* search over exact
+bonds and mood gives the shortest line of play that can reach each
+reachable ending, following whichever reflection boost suits it.
+
+Requires NumPy, like batch.py.
+"""
+
+import argparse
+import heapq
+import math
+import sys
+from dataclasses import dataclass
+from itertools import product
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+import engine
+
+NPC_NAMES = engine.NAMES
+N_NPCS = len(NPC_NAMES)
+BOOSTS = range(engine.REFLECTION_BOOST[0], engine.REFLECTION_BOOST[1] + 1)
+ENDING_INDEX = {name: i for i, name in enumerate(engine.ENDINGS)}
+N_ENDINGS = len(engine.ENDINGS)
+NO_ENDING = -1
+
+
+def build_actions() -> List[Tuple[int, int, int, int]]:
+    """(npc index, option index, bond change, mood change) for every interaction option"""
+    actions = []
+    for npc in range(len(engine.NAMES)):
+        options = engine.get_interaction_scenarios(engine.Character(npc))['options']
+        for i, option in enumerate(options):
+            actions.append((npc, i, option['bond_change'], option['mood_change']))
+    return actions
+
+
+INTERACTIONS = build_actions()
+REFLECT = len(INTERACTIONS)
+END_DAY = REFLECT + 1
+
+# A state is (day, mood, reflection_count, bond, bond, ...)
+State = Tuple[int, ...]
+# Grid axes count from the end, so arrays may carry leading axes (endings, reflections)
+MOOD_AXIS = -(N_NPCS + 1)
+Split = Tuple[Tuple[int, float], ...]  # (grid steps, share) pairs
+
+
+def split(change: float, grain: int) -> Split:
+    """Grid steps a change moves by, with the share of probability for each"""
+    low = math.floor(change / grain)
+    share = change / grain - low
+    if share == 0:
+        return ((low, 1.0),)
+    return ((low, 1.0 - share), (low + 1, share))
+
+
+def push(a: np.ndarray, axis: int, steps: int) -> np.ndarray:
+    """Move every cell `steps` along an axis; what is pushed past either end piles up on it"""
+    out = np.zeros_like(a)
+    src = np.moveaxis(a, axis, 0)
+    dst = np.moveaxis(out, axis, 0)
+    n = src.shape[0]
+    k = min(abs(steps), n - 1)
+    if steps >= 0:
+        dst[k:] = src[:n - k]
+        dst[n - 1] += src[n - k:].sum(axis=0)
+    else:
+        dst[:n - k] = src[k:]
+        dst[0] += src[:k].sum(axis=0)
+    return out
+
+
+def pull(a: np.ndarray, axis: int, steps: int) -> np.ndarray:
+    """The value `steps` further along an axis for every cell, clamped to the ends"""
+    index = np.clip(np.arange(a.shape[axis]) + steps, 0, a.shape[axis] - 1)
+    return np.take(a, index, axis=axis)
+
+
+class StateSpaceTooLarge(Exception):
+    pass
+
+
+@dataclass
+class Approximation:
+    random_policy: Dict[str, float]  # approximate ending probabilities when picking uniformly
+    optimal: Dict[str, float]  # approximate best achievable probability of each ending
+    plans: Dict[str, List[engine.Action]]  # shortest line of play per reachable ending, exact
+    grain: int  # grid the probabilities were merged onto
+
+
+class ApproximateSolver:
+    def __init__(self, grain: int = 10, final_day: int = engine.FINAL_DAY, tolerance: float = 1e-9,
+                 max_states: Optional[int] = 2_000_000):
+        if grain < 1 or (engine.MAX_LEVEL - engine.MIN_LEVEL) % grain:
+            raise ValueError(f"grain must divide {engine.MAX_LEVEL - engine.MIN_LEVEL}")
+        self.grain = grain
+        self.final_day = final_day
+        self.tolerance = tolerance
+        self.max_states = max_states  # states the plan search may visit
+        self.levels = (engine.MAX_LEVEL - engine.MIN_LEVEL) // grain + 1
+        self.moves = [(npc - N_NPCS, split(bond_change, grain), split(mood_change, grain))
+                      for npc, _, bond_change, mood_change in INTERACTIONS]
+        # the same moves grouped by bond axis and steps, so pushing them all shares the bond shifts
+        grouped: Dict[Tuple[int, int], Dict[int, float]] = {}
+        for axis, bond_split, mood_split in self.moves:
+            for steps, share in bond_split:
+                shares = grouped.setdefault((axis, steps), {})
+                for mood_steps, mood_share in mood_split:
+                    shares[mood_steps] = shares.get(mood_steps, 0.0) + share * mood_share
+        self.bond_moves = [(axis, steps, sorted(shares.items())) for (axis, steps), shares in grouped.items()]
+        boosts: Dict[int, float] = {}
+        for boost in BOOSTS:
+            for steps, share in split(boost, grain):
+                boosts[steps] = boosts.get(steps, 0.0) + share / len(BOOSTS)
+        self.boosts = sorted(boosts.items())
+        self.legal_counts = np.array([len(INTERACTIONS) + (r < engine.MAX_REFLECTIONS_PER_DAY) + 1
+                                      for r in range(engine.MAX_REFLECTIONS_PER_DAY + 1)], dtype=float)
+        self.lowest = (0,) * N_NPCS  # grid level of the first cell along every bond axis
+        self.shape = (self.levels,) * (N_NPCS + 1)  # mood and bond levels of one day's grid
+
+    def initial_state(self, state: Optional[engine.GameState] = None) -> State:
+        """Convert a GameState (a new game by default) into a solver state"""
+        if state is None:
+            state = engine.new_game()
+        if state.endless:
+            raise ValueError("endless games have no endings to solve")
+        bonds = tuple(state.characters[name].bond_level for name in NPC_NAMES)
+        return (state.day, state.mood, state.reflection_count) + bonds
+
+    # The merged grid
+
+    def fit(self, start: State):
+        """Size the grid to the levels reachable from a state
+
+        A bond whose options never lower it starts at the state's level,
+        and one they never raise ends there, which keeps the pack's
+        always-friendly NPCs from paying for levels they can't reach.
+        """
+        grain = self.grain
+        lowest, shape = [], [self.levels]
+        for npc, bond in enumerate(start[3:]):
+            changes = [change for n, _, change, _ in INTERACTIONS if n == npc]
+            low = 0 if min(changes) < 0 else (bond - engine.MIN_LEVEL) // grain
+            high = self.levels - 1 if max(changes) > 0 else -(-(bond - engine.MIN_LEVEL) // grain)
+            lowest.append(low)
+            shape.append(high - low + 1)
+        self.lowest = tuple(lowest)
+        self.shape = tuple(shape)
+
+    @property
+    def states(self) -> int:
+        """Merged states in one day of the grid"""
+        return (engine.MAX_REFLECTIONS_PER_DAY + 1) * int(np.prod(self.shape))
+
+    def spread(self, start: State) -> np.ndarray:
+        """Probability of each (reflections, mood, bonds...) cell for an exact state"""
+        grid = np.zeros((engine.MAX_REFLECTIONS_PER_DAY + 1,) + self.shape)
+        mood, reflections = start[1], start[2]
+        axes = [split(mood - engine.MIN_LEVEL, self.grain)]
+        axes += [split(bond - engine.MIN_LEVEL, self.grain) for bond in start[3:]]
+        for cell in product(*axes):
+            index = (cell[0][0],) + tuple(steps - low for (steps, _), low in zip(cell[1:], self.lowest))
+            grid[(reflections,) + index] += np.prod([share for _, share in cell])
+        return grid
+
+    def endings(self, day: int) -> np.ndarray:
+        """Ending index reached by ending the day in each (mood, bonds) cell, or NO_ENDING"""
+        total = np.zeros(self.shape[1:], dtype=int)
+        for npc, (low, size) in enumerate(zip(self.lowest, self.shape[1:])):
+            levels = (low + np.arange(size)) * self.grain + engine.MIN_LEVEL
+            total = total + levels.reshape([-1 if axis == npc else 1 for axis in range(N_NPCS)])
+        totals, inverse = np.unique(total, return_inverse=True)
+        table = np.array([[ENDING_INDEX.get(engine.check_ending(t / N_NPCS, level * self.grain + engine.MIN_LEVEL,
+                                                                 day, self.final_day), NO_ENDING)
+                           for t in totals] for level in range(self.levels)])
+        return table[:, inverse.reshape(-1)].reshape(self.shape)
+
+    def interact(self, a: np.ndarray) -> np.ndarray:
+        """Where the probability in a grid goes when each interaction gets all of it"""
+        by_mood: Dict[int, np.ndarray] = {}
+        for axis, steps, shares in self.bond_moves:
+            moved = push(a, axis, steps)
+            for mood_steps, share in shares:
+                if mood_steps in by_mood:
+                    by_mood[mood_steps] += share * moved
+                else:
+                    by_mood[mood_steps] = share * moved
+        return sum(push(part, MOOD_AXIS, steps) for steps, part in by_mood.items())
+
+    def reflect(self, a: np.ndarray) -> np.ndarray:
+        return sum(share * push(a, MOOD_AXIS, steps) for steps, share in self.boosts)
+
+    def random_policy(self, start: State) -> np.ndarray:
+        """Probability of each ending when every legal action is equally likely
+
+        Probability never moves to fewer reflections, so each day is
+        played out one reflection count at a time.
+        """
+        result = np.zeros(N_ENDINGS)
+        grid = self.spread(start)
+        for day in range(start[0], self.final_day + 1):
+            ended = np.zeros(self.shape)
+            for reflections, count in enumerate(self.legal_counts):
+                left = grid[reflections]
+                reflecting = np.zeros(self.shape)
+                while left.sum() > self.tolerance:
+                    share = left / count
+                    ended += share
+                    reflecting += share
+                    left = self.interact(share)
+                if reflections < engine.MAX_REFLECTIONS_PER_DAY:
+                    grid[reflections + 1] += self.reflect(reflecting)
+            codes = self.endings(day)
+            for e in range(N_ENDINGS):
+                result[e] += ended[codes == e].sum()
+            grid = np.zeros_like(grid)
+            grid[0] = np.where(codes == NO_ENDING, ended, 0.0)
+        return result
+
+    def optimal(self, start: State) -> np.ndarray:
+        """Best achievable probability of each ending, by value iteration day by day
+
+        Days are solved from the last, and within a day from the most
+        reflections used, so each iteration only covers one slice.
+        """
+        tomorrow = None  # values at the start of the next day, per ending
+        for day in range(self.final_day, start[0] - 1, -1):
+            codes = self.endings(day)
+            # ending the day: 1 for the ending it reaches, 0 for the others, else tomorrow's value
+            end = np.stack([np.where(codes == NO_ENDING, 0.0 if tomorrow is None else tomorrow[e],
+                                     (codes == e).astype(float))
+                            for e in range(N_ENDINGS)])
+            values = np.empty((N_ENDINGS, engine.MAX_REFLECTIONS_PER_DAY + 1) + self.shape)
+            for reflections in range(engine.MAX_REFLECTIONS_PER_DAY, -1, -1):
+                floor = end
+                if reflections < engine.MAX_REFLECTIONS_PER_DAY:
+                    reflected = sum(share * pull(values[:, reflections + 1], MOOD_AXIS, steps)
+                                    for steps, share in self.boosts)
+                    floor = np.maximum(end, reflected)
+                current = floor
+                while True:
+                    best = floor.copy()
+                    pulled = {}
+                    for axis, bond_split, mood_split in self.moves:
+                        moved = 0
+                        for steps, share in bond_split:
+                            if (axis, steps) not in pulled:
+                                pulled[axis, steps] = pull(current, axis, steps)
+                            moved = moved + share * pulled[axis, steps]
+                        np.maximum(best, sum(share * pull(moved, MOOD_AXIS, steps) for steps, share in mood_split),
+                                   out=best)
+                    change = np.abs(best - current).max()
+                    current = best
+                    if change <= self.tolerance:
+                        break
+                values[:, reflections] = current
+            tomorrow = values[:, 0]
+        return (values * self.spread(start)).reshape(N_ENDINGS, -1).sum(axis=1)
+
+    # Plans over the real states
+
+    def outcomes(self, state: State, action: int) -> List[object]:
+        """Next states, or ending indexes, an action can lead to"""
+        day, mood, reflections = state[:3]
+        bonds = state[3:]
+        if action == END_DAY:
+            ending = engine.check_ending(sum(bonds) / N_NPCS, mood, day, self.final_day)
+            if ending:
+                return [ENDING_INDEX[ending]]
+            return [(day + 1, mood, 0) + bonds]
+        if action == REFLECT:
+            return [(day, min(engine.MAX_LEVEL, mood + boost), reflections + 1) + bonds for boost in BOOSTS]
+        npc, _, bond_change, mood_change = INTERACTIONS[action]
+        new_bonds = list(bonds)
+        new_bonds[npc] = engine.clamp(bonds[npc] + bond_change)
+        return [(day, engine.clamp(mood + mood_change), reflections) + tuple(new_bonds)]
+
+    def legal(self, state: State) -> List[int]:
+        """Action codes available in a state, in engine.legal_actions order"""
+        actions = list(range(len(INTERACTIONS)))
+        if state[2] < engine.MAX_REFLECTIONS_PER_DAY:
+            actions.append(REFLECT)
+        actions.append(END_DAY)
+        return actions
+
+    def distance(self, state: State, ending: str) -> Optional[int]:
+        """A lower bound on the actions left before an ending, or None if it can't be reached"""
+        day, mood = state[:2]
+        bonds = state[3:]
+        if ending == "neutral":
+            return self.final_day - day + 1
+        if ending == "good":
+            bond_gap = N_NPCS * engine.GOOD_ENDING_BOND - sum(bonds)
+            mood_gap = engine.GOOD_ENDING_MOOD - mood
+            bond_step = max(change for _, _, change, _ in INTERACTIONS)
+            mood_step = max(max(change for *_, change in INTERACTIONS), BOOSTS[-1])
+            ceiling = sum(engine.MAX_LEVEL if max(c for n, _, c, _ in INTERACTIONS if n == npc) > 0 else bond
+                          for npc, bond in enumerate(bonds))
+            if ceiling < N_NPCS * engine.GOOD_ENDING_BOND:
+                return None
+        else:
+            bond_gap = sum(bonds) - N_NPCS * engine.BAD_ENDING_BOND
+            mood_gap = mood - engine.BAD_ENDING_MOOD
+            bond_step = -min(change for _, _, change, _ in INTERACTIONS)
+            mood_step = -min(change for *_, change in INTERACTIONS)
+            floor = sum(engine.MIN_LEVEL if min(c for n, _, c, _ in INTERACTIONS if n == npc) < 0 else bond
+                        for npc, bond in enumerate(bonds))
+            if floor > N_NPCS * engine.BAD_ENDING_BOND:
+                return None
+        steps = 0
+        for gap, step in ((bond_gap, bond_step), (mood_gap, mood_step)):
+            if gap > 0:
+                if step <= 0:
+                    return None
+                steps = max(steps, -(-gap // step))
+        return steps + 1
+
+    def plan(self, start: State, ending: str) -> List[engine.Action]:
+        """Shortest line of play that can reach an ending, or [] if none can"""
+        target = ENDING_INDEX[ending]
+        estimate = self.distance(start, ending)
+        if estimate is None:
+            return []
+        came_from: Dict[object, Optional[Tuple[object, int]]] = {start: None}
+        steps = {start: 0}
+        frontier = [(estimate, 0, 0, start)]
+        pushed = 1
+        while frontier:
+            _, negative_steps, _, state = heapq.heappop(frontier)
+            if state == target:
+                return self.unwind(came_from, state)
+            if -negative_steps > steps[state]:
+                continue
+            for action in self.legal(state):
+                for outcome in self.outcomes(state, action):
+                    if isinstance(outcome, int):
+                        if outcome != target:
+                            continue
+                        estimate = 0
+                    else:
+                        estimate = self.distance(outcome, ending)
+                        if estimate is None or outcome[0] > self.final_day:
+                            continue
+                    cost = steps[state] + 1
+                    if cost >= steps.get(outcome, cost + 1):
+                        continue
+                    steps[outcome] = cost
+                    came_from[outcome] = (state, action)
+                    if self.max_states is not None and len(steps) > self.max_states:
+                        raise StateSpaceTooLarge(f"more than {self.max_states} states searched for a {ending} plan")
+                    # deeper states first among equal estimates, then first found
+                    heapq.heappush(frontier, (cost + estimate, -cost, pushed, outcome))
+                    pushed += 1
+        return []
+
+    def unwind(self, came_from, outcome) -> List[engine.Action]:
+        actions = []
+        while came_from[outcome] is not None:
+            outcome, action = came_from[outcome]
+            actions.append(self.to_engine_action(action))
+        return actions[::-1]
+
+    def to_engine_action(self, action: int) -> engine.Action:
+        if action == END_DAY:
+            return engine.END_DAY
+        if action == REFLECT:
+            return engine.REFLECT
+        npc, option = INTERACTIONS[action][:2]
+        return engine.Interact(NPC_NAMES[npc], option)
+
+    def solve(self, state: Optional[engine.GameState] = None) -> Approximation:
+        """Approximate ending probabilities and exact plans from a GameState"""
+        start = self.initial_state(state)
+        self.fit(start)
+        random_probs = self.random_policy(start)
+        best = self.optimal(start)
+        return Approximation(
+            random_policy=dict(zip(engine.ENDINGS, random_probs.tolist())),
+            optimal=dict(zip(engine.ENDINGS, best.tolist())),
+            plans={name: self.plan(start, name) for name, i in ENDING_INDEX.items() if best[i] > self.tolerance},
+            grain=self.grain
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estimate Life Unwritten's ending probabilities from a new game")
+    parser.add_argument("--grain", type=int, default=10,
+                        help="points between the mood and bond levels states are merged onto")
+    parser.add_argument("--days", type=int, default=engine.FINAL_DAY,
+                        help="length of the week to solve")
+    parser.add_argument("--tolerance", type=float, default=1e-9,
+                        help="probability left unresolved in a day, and value iteration precision")
+    parser.add_argument("--max-states", type=int, default=2_000_000,
+                        help="give up a plan search once it has visited this many states")
+    args = parser.parse_args()
+
+    solver = ApproximateSolver(args.grain, args.days, args.tolerance, args.max_states)
+    try:
+        solution = solver.solve()
+    except (StateSpaceTooLarge, ValueError) as e:
+        sys.exit(f"Can't solve: {e}")
+    print(f"Approximate probabilities, states merged onto a grid of {solution.grain} points "
+          f"({solver.states} per day)")
+    for ending in engine.ENDINGS:
+        print(f"\n{ending}: optimal ~{solution.optimal[ending]:.4f}, "
+              f"random policy ~{solution.random_policy[ending]:.4f}")
+        for action in solution.plans.get(ending, []):
+            print(f"  {action}")
+
+
+if __name__ == "__main__":
+    main()
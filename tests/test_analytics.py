@@ -0,0 +1,83 @@
+import collections
+import random
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import analytics
+import engine
+from history import NPC, OPTION, RECORD_WIDTH, REFLECTION
+
+
+def states():
+    finished = [engine.play(seed=seed) for seed in range(12)]
+    abandoned = engine.new_game("Ann", seed=99)
+    rng = random.Random(99)
+    for _ in range(5):
+        engine.step(abandoned, engine.random_policy(abandoned, rng), rng)
+    return finished[:7], finished[7:] + [abandoned]
+
+
+def expected_picks(played):
+    picks = collections.Counter()
+    for state in played:
+        records = state.choices_made.raw()
+        for at in range(0, len(records), RECORD_WIDTH):
+            npc = records[at + NPC]
+            if npc != REFLECTION:
+                picks[engine.npc_name(npc), engine.npc_scenario(npc)["options"][records[at + OPTION]]["text"]] += 1
+    return picks
+
+
+def test_export_append_and_read_back(tmp_path, monkeypatch):
+    monkeypatch.setattr(analytics, "FLUSH_ROWS", 50)  # flush inside the export, not only on close
+    first, second = states()
+    directory = str(tmp_path / "export")
+    with analytics.Exporter(directory, append=False) as exporter:
+        assert [exporter.add(state) for state in first] == list(range(len(first)))
+    with open(tmp_path / "export" / "events" / "day.npy", "ab") as f:
+        f.write(b"\x01\x00")  # a row a crash left without a header
+    with analytics.Exporter(directory) as exporter:
+        assert exporter.add(second[0]) == len(first)
+        for state in second[1:]:
+            exporter.add(state)
+
+    played = first + second
+    dtypes = dict((name, dtype) for name, _, dtype in analytics.EVENT_COLUMNS)
+    events = analytics.load(directory)
+    n_events = sum(len(state.choices_made) for state in played)
+    for name, column in events.items():
+        assert column.shape == (n_events,) and column.dtype == np.dtype(dtypes[name]), name
+    sessions = analytics.load(directory, "sessions")
+    for name, _, dtype in analytics.SESSION_COLUMNS:
+        assert sessions[name].shape == (len(played),) and sessions[name].dtype == np.dtype(dtype), name
+
+    records = np.concatenate([np.array(state.choices_made.raw(), dtype=np.uint16) for state in played])
+    assert (events["day"] == records[0::RECORD_WIDTH]).all()
+    assert (events["npc"] == records[NPC::RECORD_WIDTH]).all()
+    assert events["session"].tolist() == [i for i, state in enumerate(played) for _ in range(len(state.choices_made))]
+    assert sessions["seed"].tolist() == [state.seed for state in played]
+    assert sessions["choices"].tolist() == [len(state.choices_made) for state in played]
+
+    endings = collections.Counter(state.ending for state in played)
+    rates = analytics.ending_rates(directory)
+    assert rates["unfinished"] == pytest.approx(1 / len(played))
+    for name in engine.ENDINGS:
+        assert rates[f"{name}_ending"] == pytest.approx(endings[name] / len(played))
+    picks = analytics.option_picks(directory)
+    assert {(npc, text): count for npc, text, count in picks} == expected_picks(played)
+    assert [count for *_, count in picks] == sorted((count for *_, count in picks), reverse=True)
+
+
+def test_header_rows(tmp_path):
+    path = str(tmp_path / "column.npy")
+    column = analytics.Column(path, "h", "i2", append=False)
+    column.buffer.extend([-3, 0, 7])
+    column.flush()
+    assert analytics.npy_rows(path) == 3
+    assert np.load(path).tolist() == [-3, 0, 7]
+    column.buffer.append(9)
+    column.close()
+    assert np.load(path).tolist() == [-3, 0, 7, 9]
+    assert len(analytics.npy_header("u8", 10 ** 12)) == analytics.HEADER_SIZE
@@ -0,0 +1,46 @@
+import math
+import statistics
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import batch
+import engine
+
+
+@pytest.fixture(scope="module")
+def played():
+    return [engine.play(seed=seed) for seed in range(4000)]
+
+
+def close(a, b, sd, n):
+    """Within five standard errors of the smaller sample, n draws with standard deviation sd"""
+    return abs(a - b) <= 5 * sd / math.sqrt(n) + 1e-3
+
+
+def rate_sd(p):
+    return math.sqrt(p * (1 - p))
+
+
+def test_ending_rates_match_engine(played):
+    result = batch.simulate(100000, seed=1)
+    assert result.unfinished == 0
+    for name, rate in result.ending_rates().items():
+        expected = sum(state.ending == name for state in played) / len(played)
+        assert close(rate, expected, rate_sd(expected), len(played)), name
+
+
+def test_ending_days_match_engine(played):
+    result = batch.simulate(100000, seed=2)
+    mean_day = (result.ending_days * np.arange(1, len(result.ending_days) + 1)).sum() / result.ending_days.sum()
+    days = [state.day for state in played]
+    assert close(mean_day, statistics.mean(days), statistics.pstdev(days), len(played))
+
+
+def test_sweep_of_defaults_matches_simulate():
+    result = batch.simulate(50000, seed=3)
+    sweep = batch.sweep({"good_bond": [engine.GOOD_ENDING_BOND], "bad_mood": [engine.BAD_ENDING_MOOD]}, 50000, seed=4)
+    for name, code in batch.ENDING_CODES.items():
+        expected = result.ending_rates()[name]
+        assert close(sweep.ending_rates()[0, code], expected, rate_sd(expected), 50000), name
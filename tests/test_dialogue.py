@@ -0,0 +1,101 @@
+import random
+
+import pytest
+
+import content
+from dialogue import NEVER_TALKED, RuleIndex
+
+MOODS = ("hurt", "conflicted", "distant", "disappointed")
+
+
+def covers(span, value):
+    low, high = span
+    return low <= value and (high is None or value <= high)
+
+
+def reference(rules, npc_id, npc_mood, last_option, bond, mood, day):
+    """The spec in dialogue.py, checked rule by rule"""
+    best = None
+    for i, rule in enumerate(rules):
+        if "npc" in rule and content.NPC_IDS[rule["npc"]] != npc_id:
+            continue
+        if "npc_mood" in rule and rule["npc_mood"] != npc_mood:
+            continue
+        if "last_option" in rule and rule["last_option"] != (None if last_option == NEVER_TALKED else last_option):
+            continue
+        if not all(covers(rule[field], value) for field, value in (("bond", bond), ("mood", mood), ("day", day))
+                   if field in rule):
+            continue
+        key = (-rule.get("priority", 0), i)
+        if best is None or key < best[0]:
+            best = key, rule["response"]
+    return None if best is None else best[1]
+
+
+def span(rng, top):
+    low = rng.randrange(top)
+    return [low, rng.choice([None, rng.randrange(low, top + 1)])]
+
+
+def random_rules(rng, count):
+    rules = []
+    for i in range(count):
+        rule = {"response": f"rule {i}"}
+        if rng.random() < 0.6:
+            rule["npc"] = rng.choice(content.NAMES)
+        if rng.random() < 0.3:
+            rule["npc_mood"] = rng.choice(MOODS)
+        if rng.random() < 0.3:
+            rule["last_option"] = rng.choice([None, 0, 1, 2])
+        for field, top in (("bond", 100), ("mood", 100), ("day", 10)):
+            if rng.random() < 0.5:
+                rule[field] = span(rng, top)
+        if rng.random() < 0.4:
+            rule["priority"] = rng.randrange(-2, 3)
+        rules.append(rule)
+    return rules
+
+
+@pytest.mark.parametrize("seed, count", [(0, 5), (1, 40), (2, 200)])
+def test_matches_rule_by_rule_lookup(seed, count):
+    rng = random.Random(seed)
+    rules = random_rules(rng, count)
+    index = RuleIndex(rules)
+    assert len(index) == count
+    for _ in range(2000):
+        query = (rng.randrange(len(content.NAMES)), rng.choice(MOODS), rng.choice([NEVER_TALKED, 0, 1, 2]),
+                 rng.randrange(101), rng.randrange(101), rng.randrange(1, 12))
+        assert index.match(*query) == reference(rules, *query)
+
+
+def test_priority_then_pack_order():
+    index = RuleIndex([
+        {"response": "any"},
+        {"npc": "Maya", "response": "maya"},
+        {"npc": "Maya", "bond": [50, None], "response": "close", "priority": 1},
+        {"bond": [60, 100], "response": "also close", "priority": 1},
+        {"npc": "Maya", "bond": [0, 10], "response": "low", "priority": -1},
+    ])
+    maya = content.NPC_IDS["Maya"]
+    assert index.match(maya, "hurt", 0, 40, 50, 1) == "any"
+    assert index.match(maya, "hurt", 0, 55, 50, 1) == "close"
+    assert index.match(maya, "hurt", 0, 70, 50, 1) == "close"
+    assert index.match(content.NPC_IDS["David"], "hurt", 0, 70, 50, 1) == "also close"
+    assert index.match(maya, "hurt", 0, 5, 50, 1) == "any"
+
+
+def test_never_talked_and_empty_index():
+    index = RuleIndex([{"last_option": None, "response": "first time"}, {"last_option": 1, "response": "again"}])
+    assert index.match(0, "hurt", NEVER_TALKED, 50, 50, 1) == "first time"
+    assert index.match(0, "hurt", 1, 50, 50, 1) == "again"
+    assert index.match(0, "hurt", 0, 50, 50, 1) is None
+    assert RuleIndex([]).match(0, "hurt", 0, 50, 50, 1) is None
+
+
+def test_content_pack_rules():
+    rules = content.DIALOGUE_RULES
+    index = RuleIndex(rules)
+    for npc_id in range(len(content.NAMES)):
+        for query in [(npc_id, mood, option, bond, 50, day) for mood in MOODS for option in (NEVER_TALKED, 0, 1, 2)
+                      for bond in (0, 30, 70, 90) for day in (1, 7)]:
+            assert index.match(*query) == reference(rules, *query)
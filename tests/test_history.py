@@ -0,0 +1,70 @@
+import json
+import random
+
+import pytest
+
+import content
+from history import CHUNK_RECORDS, ChoiceLog, HistoryArchive, REFLECTION
+
+
+def fill(log, count, seed):
+    rng = random.Random(seed)
+    day = 1
+    for _ in range(count):
+        day += rng.random() < 0.1
+        mood = rng.randrange(101)
+        if rng.random() < 0.2:
+            prompt = rng.randrange(len(content.REFLECTIONS))
+            log.add_reflection(day, prompt, rng.randrange(1, 10), mood, min(100, mood + 5))
+        else:
+            log.add_interaction(day, rng.randrange(len(content.NAMES)), rng.randrange(3), mood, rng.randrange(101),
+                                rng.randrange(101), rng.randrange(101))
+
+
+def views(log):
+    npcs = list(range(len(content.NAMES))) + [REFLECTION]
+    return (len(log), list(log), log.raw().tolist(), log.raw(100, 900).tolist(), log.moods(5, 50).tolist(),
+            log.daily_moods(), [log.on_day(day) for day in range(1, log.days[-1] + 2)],
+            [(log.with_npc(npc), log.count_npc(npc), list(log.last_with_npc(npc) or ())) for npc in npcs],
+            log[-3:], log[7])
+
+
+@pytest.mark.parametrize("ring", [0, 16, 300])
+def test_archived_log_reads_back_like_a_plain_one(ring):
+    plain, archived = ChoiceLog(), ChoiceLog()
+    archived.archive_to(HistoryArchive(), ring)
+    fill(plain, 2000, 1)
+    fill(archived, 2000, 1)
+    assert archived.offset > 0 and len(archived.data) < (ring + CHUNK_RECORDS) * 8
+    assert views(archived) == views(plain)
+    archived.close()
+
+
+def test_archiving_an_existing_log():
+    plain, archived = ChoiceLog(), ChoiceLog()
+    fill(plain, 1500, 2)
+    fill(archived, 1500, 2)
+    archived.archive_to(HistoryArchive(), 32)
+    assert len(archived.archive) == 1024
+    assert views(archived) == views(plain)
+    archived.close()
+
+
+def test_reattach():
+    plain, archived = ChoiceLog(), ChoiceLog()
+    archive = HistoryArchive()
+    archived.archive_to(archive, 64)
+    fill(plain, 1800, 3)
+    fill(archived, 1800, 3)
+
+    saved = json.loads(json.dumps(archived.index_state()))
+    restored = ChoiceLog()
+    restored.reattach(archive, saved, archived.data.tobytes())
+    assert restored.archive is archive and restored.ring == 64
+    assert views(restored) == views(plain)
+
+    fill(plain, 700, 4)
+    fill(restored, 700, 4)
+    assert views(restored) == views(plain)
+    assert max(map(max, restored.by_npc.values())) == len(plain) - 1
+    restored.close()
@@ -0,0 +1,59 @@
+import random
+
+import engine
+import journal
+
+
+def play(state, steps, rng):
+    for _ in range(steps):
+        if state.game_over:
+            break
+        engine.step(state, engine.random_policy(state, rng), rng)
+
+
+def summary(state):
+    return (state.day, state.mood, state.reflection_count, state.game_over, state.ending,
+            [(char.npc_id, char.bond_level, char.last_interaction) for char in state.characters.values()],
+            list(state.choices_made))
+
+
+def test_resume_without_close(tmp_path):
+    # a killed process never reaches close(); every choice must already be on disk
+    path = str(tmp_path / "save.jsonl")
+    state = engine.new_game("Ann", seed=3)
+    journal.start(path, state)
+    play(state, 30, random.Random(3))
+    assert state.day > 1 and not state.game_over
+    for name in engine.NAMES[:2]:
+        engine.step(state, engine.Interact(name, 0))
+    assert summary(journal.load(path)) == summary(state)
+
+
+def test_resume_drops_unfinished_line(tmp_path):
+    path = str(tmp_path / "save.jsonl")
+    state = engine.new_game("Ann", seed=5)
+    journal.start(path, state)
+    play(state, 15, random.Random(5))
+    state.journal.close()
+    with open(path, "ab") as f:
+        f.write(b'{"choice":[1,2')
+    assert summary(journal.load(path)) == summary(state)
+
+
+def test_resume_and_continue(tmp_path):
+    path = str(tmp_path / "save.jsonl")
+    state = engine.new_game("Ann", seed=7)
+    journal.start(path, state)
+    rng = random.Random(7)
+    play(state, 20, rng)
+    state.journal.close()
+
+    resumed = journal.load(path)
+    journal.attach(path, resumed)
+    play(resumed, 20, rng)
+    resumed.journal.close()
+    assert summary(journal.load(path)) == summary(resumed)
+
+
+def test_nothing_to_resume(tmp_path):
+    assert journal.load(str(tmp_path / "missing.jsonl")) is None
@@ -0,0 +1,112 @@
+import asyncio
+import re
+from types import SimpleNamespace
+
+import pytest
+
+import metrics
+
+NAME = "life_unwritten_handler_seconds"
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    registry = metrics.Registry()
+    monkeypatch.setattr(metrics, "REGISTRY", registry)
+    return registry
+
+
+class Game:
+    def __init__(self):
+        self.screen = SimpleNamespace(idle=0.0)
+
+    @metrics.timed("menu")
+    async def menu(self, idle):
+        self.screen.idle += idle
+        return "done"
+
+    @metrics.timed("print_slow", include_idle=True)
+    async def print_slow(self, idle):
+        self.screen.idle += idle
+
+
+def clock(monkeypatch, *times):
+    ticks = iter(times)
+    monkeypatch.setattr(metrics.time, "perf_counter", lambda: next(ticks))
+
+
+def parse(text):
+    """{(metric, labels): value} from OpenMetrics text, and the comment lines"""
+    samples, comments = {}, []
+    for line in text.splitlines():
+        if line.startswith("#"):
+            comments.append(line)
+            continue
+        match = re.fullmatch(r'(\w+)\{(.*)\} (\S+)', line)
+        assert match, line
+        labels = tuple(re.findall(r'(\w+)="([^"]*)"', match.group(2)))
+        samples[match.group(1), labels] = float(match.group(3))
+    return samples, comments
+
+
+def test_histogram_buckets():
+    histogram = metrics.Histogram()
+    for seconds in (0.0, 0.0001, 0.00010001, 0.25, 10.0, 10.5):
+        histogram.observe(seconds)
+    assert histogram.counts[0] == 2  # upper bounds are inclusive
+    assert histogram.counts[1] == 1
+    assert histogram.counts[metrics.BUCKETS.index(0.25)] == 1
+    assert histogram.counts[metrics.BUCKETS.index(10.0)] == 1
+    assert histogram.counts[-1] == 1
+    assert histogram.count == 6 and histogram.total == pytest.approx(20.75020001)
+
+
+def test_timed_leaves_out_idle_time(registry, monkeypatch):
+    game = Game()
+    asyncio.run(game.menu(1.0))  # disabled: no clock reads, nothing observed
+    assert not registry.histograms
+
+    registry.enabled = True
+    clock(monkeypatch, 10.0, 10.5, 20.0, 20.5)
+    assert asyncio.run(game.menu(0.25)) == "done"
+    asyncio.run(game.print_slow(0.25))
+    assert registry.histograms["menu"].total == 0.25
+    assert registry.histograms["menu"].counts[metrics.BUCKETS.index(0.25)] == 1
+    assert registry.histograms["print_slow"].total == 0.5
+
+
+def test_render(registry, monkeypatch):
+    registry.enabled = True
+    clock(monkeypatch, 0.0, 0.003, 1.0, 1.0004, 2.0, 14.0)
+    game = Game()
+    for _ in range(3):
+        asyncio.run(game.menu(0.0))
+    metrics.count("choice")
+    metrics.count("choice", 2)
+    metrics.count("invalid_input")
+
+    text = registry.render()
+    assert text.endswith("# EOF\n")
+    samples, comments = parse(text)
+    assert comments[:3] == [f"# TYPE {NAME} histogram", f"# UNIT {NAME} seconds",
+                            f"# HELP {NAME} Time spent in a handler, not counting waits for the player."]
+    assert "# TYPE life_unwritten_events counter" in comments and comments[-1] == "# EOF"
+
+    buckets = [samples[f"{NAME}_bucket", (("handler", "menu"), ("le", str(bound)))]
+               for bound in metrics.BUCKETS + ("+Inf",)]
+    assert buckets == sorted(buckets)
+    assert samples[f"{NAME}_bucket", (("handler", "menu"), ("le", "0.0005"))] == 1
+    assert samples[f"{NAME}_bucket", (("handler", "menu"), ("le", "0.005"))] == 2
+    assert buckets[-2] == 2 and buckets[-1] == 3
+    assert samples[f"{NAME}_count", (("handler", "menu"),)] == 3
+    assert samples[f"{NAME}_sum", (("handler", "menu"),)] == pytest.approx(12.0034)
+    assert samples["life_unwritten_events_total", (("event", "choice"),)] == 3
+    assert samples["life_unwritten_events_total", (("event", "invalid_input"),)] == 1
+
+
+def test_write(registry, tmp_path):
+    registry.count("session")
+    path = tmp_path / "metrics.txt"
+    metrics.write(str(path))
+    assert path.read_text(encoding="utf-8") == registry.render()
+    assert [p.name for p in tmp_path.iterdir()] == ["metrics.txt"]
@@ -0,0 +1,43 @@
+import pytest
+
+import engine
+import montecarlo
+from history import NPC, OPTION, RECORD_WIDTH, REFLECTION
+
+
+@pytest.mark.parametrize("policy", sorted(montecarlo.POLICIES))
+def test_totals_do_not_depend_on_workers(policy):
+    one = montecarlo.simulate(policy, sessions=450, first_seed=7, workers=1, shard_size=100)
+    three = montecarlo.simulate(policy, sessions=450, first_seed=7, workers=3, shard_size=100)
+    assert one == three
+    assert one.sessions == 450 and sum(one.endings().values()) + one.unfinished == 450
+
+
+def test_merge_of_disjoint_shards():
+    whole = montecarlo.play_shard(("random", 0, 500, 10000))
+    total = montecarlo.Tally(montecarlo.action_codes()[1])
+    for task in montecarlo.shards("random", 500, 0, 120, 10000):
+        total.merge(montecarlo.play_shard(task))
+    assert total == whole
+    assert total.ending_rates() == whole.ending_rates()
+
+
+@pytest.mark.parametrize("policy", sorted(montecarlo.POLICIES))
+def test_shard_matches_engine_play(policy):
+    first_code, n_actions = montecarlo.action_codes()
+    tally = montecarlo.play_shard((policy, 20, 60, 10000))
+    ending_days = [0] * (len(engine.ENDINGS) * engine.FINAL_DAY)
+    picks = [0] * (n_actions - 1)  # every code but ending the day, which leaves no record
+    for seed in range(20, 80):
+        state = engine.play(montecarlo.POLICIES[policy], player_name="Traveler", seed=seed)
+        ending_days[engine.ENDINGS.index(state.ending) * engine.FINAL_DAY + state.day - 1] += 1
+        records = state.choices_made.raw()
+        for at in range(0, len(records), RECORD_WIDTH):
+            npc = records[at + NPC]
+            if npc == REFLECTION:
+                picks[n_actions - 2] += 1
+            else:
+                picks[first_code[engine.NAMES[npc]] + records[at + OPTION]] += 1
+    assert tally.unfinished == 0
+    assert tally.ending_days.tolist() == ending_days
+    assert tally.picks.tolist()[:-1] == picks
@@ -0,0 +1,62 @@
+import math
+import random
+
+import pytest
+
+import content
+import engine
+import procgen
+from procgen import FIRST_ID, WORLD_SIZE
+
+
+def test_names_are_a_bijection():
+    names = [procgen.acquaintance_name(npc_id) for npc_id in range(FIRST_ID, FIRST_ID + WORLD_SIZE)]
+    assert len(set(names)) == WORLD_SIZE == 4096
+    assert all(procgen.acquaintance_id(name) == npc_id for npc_id, name in enumerate(names, FIRST_ID))
+    for name in content.NAMES + ["", "Ada", "Ada Nobody", "Nobody Baker", None]:
+        assert procgen.acquaintance_id(name) is None
+
+
+def test_inverse_mod():
+    rng = random.Random(0)
+    for _ in range(500):
+        m = rng.randrange(2, 10 ** 6)
+        a = rng.randrange(1, m)
+        if math.gcd(a, m) == 1:
+            assert a * procgen.inverse_mod(a, m) % m == 1
+        else:
+            with pytest.raises(ValueError):
+                procgen.inverse_mod(a, m)
+    assert procgen.NAME_STRIDE * procgen.inverse_mod(procgen.NAME_STRIDE, procgen.NAME_COUNT) % procgen.NAME_COUNT == 1
+
+
+def test_generation_is_repeatable():
+    npc_ids = [FIRST_ID, FIRST_ID + 1, FIRST_ID + 777, FIRST_ID + WORLD_SIZE - 1]
+    before = [procgen.generate(npc_id) for npc_id in npc_ids]
+    procgen.generate.cache_clear()
+    after = [procgen.generate(npc_id) for npc_id in npc_ids]
+    assert after == before
+    assert all(a is not b for a, b in zip(after, before))
+    for bad in (FIRST_ID - 1, FIRST_ID + WORLD_SIZE):
+        with pytest.raises(IndexError):
+            procgen.generate(bad)
+
+
+def test_meeting_everyone():
+    cast = procgen.EndlessCast(engine.world())
+    met = [cast.meet() for _ in range(WORLD_SIZE)]
+    assert [char.npc_id for char in met] == list(range(FIRST_ID, FIRST_ID + WORLD_SIZE))
+    assert cast.meet() is None and cast.met == WORLD_SIZE
+    assert len(cast) == FIRST_ID + WORLD_SIZE
+
+
+def test_only_met_acquaintances_are_in_the_cast():
+    state = engine.new_game("Ann", seed=1)
+    procgen.start_endless(state, met=3)
+    names = list(state.characters)
+    assert names[:FIRST_ID] == content.NAMES and len(names) == FIRST_ID + 3
+    assert names[-1] in state.characters
+    assert procgen.acquaintance_name(FIRST_ID + 3) not in state.characters
+    engine.end_day(state)
+    assert len(state.characters) == FIRST_ID + 4
+    assert procgen.acquaintance_name(FIRST_ID + 3) in state.characters
@@ -0,0 +1,66 @@
+import asyncio
+import random
+
+import pytest
+
+import engine
+from life_unwritten import LifeUnwritten
+from recording import Recording, ReplayError, fingerprint
+from replay import ReplayScreen, replay
+
+
+def lines(seed, count=400):
+    rng = random.Random(seed)
+    return ["Ann"] + [rng.choice(["1", "1", "2", "3", "4", "5", "", "x"]) for _ in range(count)]
+
+
+def record(path, seed, inputs, endless=False):
+    game = LifeUnwritten(None, ReplayScreen(inputs), seed, str(path), endless=endless)
+    try:
+        asyncio.run(game.run())
+    except EOFError:
+        pass
+    game.close()
+    return Recording.load(str(path))
+
+
+def test_play_is_reproducible_from_a_seed():
+    runs = [fingerprint(engine.play(seed=seed)) for seed in range(20)]
+    assert runs == [fingerprint(engine.play(seed=seed)) for seed in range(20)]
+    assert len({run["history"] for run in runs}) > 1
+
+
+def test_sessions_do_not_share_a_stream():
+    alone = fingerprint(engine.play(seed=3))
+    first, second = engine.new_game("Ann", seed=3), engine.new_game("Bo", seed=4)
+    while not first.game_over:
+        for state in (first, second):
+            if not state.game_over:
+                engine.step(state, engine.random_policy(state, state.rng))
+    assert fingerprint(first) == alone
+
+
+@pytest.mark.parametrize("seed, endless", [(1, False), (2, False), (3, True)])
+def test_replay_matches_the_recording(tmp_path, seed, endless):
+    recording = record(tmp_path / "session.json", seed, lines(seed), endless)
+    assert recording.result["choices"] > 0 and len(recording.draws) > 0
+    assert fingerprint(replay(recording)) == recording.result
+    again = record(tmp_path / "again.json", seed, lines(seed), endless)
+    assert again.to_dict() == recording.to_dict()
+
+
+def test_replay_without_enough_draws_fails(tmp_path):
+    recording = record(tmp_path / "session.json", 5, lines(5))
+    del recording.draws[len(recording.draws) // 2:]
+    with pytest.raises(ReplayError):
+        replay(recording)
+
+
+def test_follow_up_response_uses_the_session_stream():
+    game = LifeUnwritten(None, ReplayScreen([]), 8)
+    character = game.state.characters["Maya"]
+    random.seed(0)
+    responses = [game.generate_follow_up_response(character, change) for change in (20, 5, -5) * 3]
+    other = LifeUnwritten(None, ReplayScreen([]), 8)
+    random.seed(1)
+    assert [other.generate_follow_up_response(character, change) for change in (20, 5, -5) * 3] == responses
@@ -0,0 +1,87 @@
+import random
+
+import pytest
+
+import content
+import engine
+import procgen
+import roster
+
+PAGE = 7
+
+
+def endless_game(seed, met=150):
+    state = engine.new_game("Ann", seed=seed)
+    procgen.start_endless(state, met)
+    return state
+
+
+def shuffle_bonds(state, rng, moves=300):
+    for _ in range(moves):
+        name = rng.choice(list(state.characters))
+        state.set_bond(state.characters.own(name), rng.randint(engine.MIN_LEVEL, engine.MAX_LEVEL))
+
+
+def expected(state, prefix="", relationship=None, tier=None):
+    """The NPCs a query should list, worked out the slow way"""
+    people = [char for char in state.characters.values()
+              if char.name.casefold().startswith(prefix.casefold())
+              and relationship in (None, char.relationship)
+              and tier in (None, engine.tier(char.bond_level))]
+    pack = sorted((char for char in people if char.npc_id < procgen.FIRST_ID), key=lambda char: char.name.casefold())
+    return [char.npc_id for char in pack] + [char.npc_id for char in people if char.npc_id >= procgen.FIRST_ID]
+
+
+def listing(state, query):
+    ids, total = [], None
+    query.page = 0
+    while True:
+        page, total = query.run(roster.roster_for(state), PAGE)
+        ids += page
+        if (query.page + 1) * PAGE >= total:
+            return ids, total
+        query.page += 1
+
+
+@pytest.mark.parametrize("prefix", ["", "a", "Ma", "zz"])
+@pytest.mark.parametrize("relationship", [None, "Neighbor", "Sister"])
+@pytest.mark.parametrize("tier", [None, 0, 2])
+def test_search_keeps_to_filters(prefix, relationship, tier):
+    state = endless_game(seed=11)
+    roster.roster_for(state)
+    shuffle_bonds(state, random.Random(11))
+    query = roster.Query()
+    query.prefix, query.relationship, query.tier = prefix, relationship, tier
+    ids, total = listing(state, query)
+    want = expected(state, prefix, relationship, tier)
+    if prefix:
+        assert ids == want
+    else:
+        assert sorted(ids) == sorted(want)
+    assert total == len(want)
+
+
+def test_sessions_share_the_template_until_they_change_it():
+    first, second = engine.new_game(seed=1), engine.new_game(seed=2)
+    ours, theirs = roster.roster_for(first), roster.roster_for(second)
+    assert ours.everyone.private() == (0, 0)
+    assert ours.everyone.buckets[60] is theirs.everyone.buckets[60]
+
+    first.set_bond(first.characters.own("Maya"), 95)
+    assert ours.everyone.private() == (2, 1)
+    assert ours.everyone.buckets[95] == [content.NPC_IDS["Maya"]]
+    assert theirs.everyone.buckets[95] == [] and theirs.everyone.buckets[60] == [content.NPC_IDS["Maya"]]
+    assert roster.roster_for(engine.new_game()).page(0, PAGE) == theirs.page(0, PAGE)
+
+
+def test_copied_index_matches_a_fresh_one():
+    state = endless_game(seed=4)
+    cast = roster.roster_for(state)
+    shuffle_bonds(state, random.Random(4))
+    fresh = roster.Roster(state.characters.values())
+    for relationship in (None, *fresh.by_relationship):
+        for tier in (None, *range(len(engine.TIER_FLOORS))):
+            assert cast.count(relationship, tier) == fresh.count(relationship, tier)
+            got = cast.page(0, 10 ** 6, relationship, tier)
+            want = fresh.page(0, 10 ** 6, relationship, tier)
+            assert sorted(got) == sorted(want)
@@ -0,0 +1,12 @@
+import pytest
+
+from scripted import prompt_text
+
+
+@pytest.mark.parametrize("prompt, text", [
+    ("\n💭 Choose an option (1-6): ", "Choose an option (1-6)"),
+    ("\nPress Enter to continue...", "Press Enter to continue..."),
+    ("💭 Time: 10:30:", "Time: 10:30"),
+])
+def test_prompt_text(prompt, text):
+    assert prompt_text(prompt) == text
@@ -0,0 +1,121 @@
+import gc
+import random
+import tracemalloc
+import zlib
+from types import SimpleNamespace
+
+import pytest
+
+import engine
+import procgen
+import roster
+import sessions
+from history import CHUNK_RECORDS, RECORD_WIDTH, HistoryArchive
+from life_unwritten import LifeUnwritten
+from renderer import Screen
+
+
+def play(state, steps, rng):
+    for _ in range(steps):
+        if state.game_over:
+            break
+        engine.step(state, engine.random_policy(state, rng), rng)
+
+
+def summary(state):
+    return (state.player_name, state.day, state.mood, state.reflection_count, state.game_over, state.ending,
+            state.endless, [(char.npc_id, char.bond_level, char.last_interaction, char.current_mood)
+                            for char in state.characters.values()],
+            list(state.choices_made), state.rng.getstate())
+
+
+def endless_game(seed, steps, ring=None):
+    state = engine.new_game("Ann", seed=seed)
+    procgen.start_endless(state)
+    if ring is not None:
+        state.choices_made.archive_to(HistoryArchive(), ring)
+    play(state, steps, state.rng)
+    return state
+
+
+def test_round_trip():
+    state = engine.new_game("Ann", seed=11)
+    play(state, 25, state.rng)
+    loaded = sessions.load(sessions.dump(state))
+    assert summary(loaded) == summary(state)
+    play(state, 40, state.rng)
+    play(loaded, 40, loaded.rng)
+    assert summary(loaded) == summary(state)
+
+
+def test_archived_history_is_not_written():
+    plain = endless_game(12, 3000)
+    state = endless_game(12, 3000, ring=32)
+    log = state.choices_made
+    assert log.offset > 0
+    blob = sessions.dump(state)
+    assert len(zlib.decompress(sessions.dump(plain))) - len(zlib.decompress(blob)) > log.offset * 8
+    with pytest.raises(ValueError):
+        sessions.load(blob)
+
+    loaded = sessions.load(blob, log.archive)
+    del state, log  # the loaded state takes over the archive
+    assert loaded.choices_made.ring == 32
+    assert summary(loaded) == summary(plain)
+    play(plain, 1000, plain.rng)
+    play(loaded, 1000, loaded.rng)
+    assert len(loaded.choices_made.data) < (32 + CHUNK_RECORDS) * RECORD_WIDTH
+    assert summary(loaded) == summary(plain)
+    loaded.choices_made.close()
+
+
+def test_store_keeps_the_archive_of_a_spilled_session(tmp_path):
+    store = sessions.SessionStore(str(tmp_path), max_sessions=0)
+    state = endless_game(13, 2000, ring=32)
+    expected = summary(state)
+    game = SimpleNamespace(state=state, screen=SimpleNamespace(inputs=None))
+    store.add("a", game)
+    store.sleep("a")
+    assert game.state is None and store.entries["a"].archive is state.choices_made.archive
+
+    store.wake("a")
+    assert store.entries["a"].archive is None
+    assert summary(game.state) == expected
+    assert game.state.choices_made.archive is state.choices_made.archive
+    store.remove("a")
+    assert not list(tmp_path.iterdir())
+    game.state.choices_made.close()
+
+
+def session(seed, steps, endless, with_roster):
+    game = LifeUnwritten(None, Screen(instant=True), seed, record_path="unused.json", endless=endless)
+    game.start_recording()  # never closed, so nothing is written
+    play(game.state, steps, game.state.rng)
+    if with_roster:
+        roster.roster_for(game.state)
+    return game
+
+
+@pytest.mark.parametrize("seed, steps, endless, with_roster",
+                         [(1, 0, False, False), (2, 40, False, False), (3, 40, False, True),
+                          (4, 400, True, True), (5, 2000, True, True), (6, 2000, True, False)])
+def test_resident_bytes_matches_tracemalloc(seed, steps, endless, with_roster):
+    session(seed, steps, endless, with_roster)  # fill the caches every session shares
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        game = session(seed, steps, endless, with_roster)
+        gc.collect()
+        measured = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    assert sessions.resident_bytes(game.state) == pytest.approx(measured, rel=0.25)
+
+
+def test_sessions_record_only_with_a_record_path():
+    game = LifeUnwritten(None, Screen(instant=True), 7)
+    game.start_recording()
+    assert game.state.recording is None and game.screen.inputs is None
+    rng, expected = game.state.rng, random.Random(7)
+    assert [rng.randrange(100) for _ in range(5)] == [expected.randrange(100) for _ in range(5)]
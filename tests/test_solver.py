@@ -0,0 +1,42 @@
+import math
+
+import pytest
+
+import engine
+import solver
+
+SAMPLES = 20000
+
+
+@pytest.fixture(scope="module")
+def solution():
+    return solver.ApproximateSolver(tolerance=1e-7).solve()
+
+
+def test_random_policy_matches_engine_play(solution):
+    counts = dict.fromkeys(engine.ENDINGS, 0)
+    for seed in range(SAMPLES):
+        counts[engine.play(seed=seed).ending] += 1
+    for ending, count in counts.items():
+        p = solution.random_policy[ending]
+        # five standard errors of the sample, plus room for merging states onto the grid
+        slack = 5 * math.sqrt(max(p * (1 - p), 1 / SAMPLES) / SAMPLES) + 5e-4
+        assert abs(count / SAMPLES - p) <= slack, ending
+
+
+def test_random_policy_sums_to_one(solution):
+    assert sum(solution.random_policy.values()) == pytest.approx(1.0, abs=1e-5)
+
+
+def test_optimal_play(solution):
+    assert solution.optimal == pytest.approx({"good": 1.0, "bad": 0.0, "neutral": 1.0})
+    assert "bad" not in solution.plans
+
+
+@pytest.mark.parametrize("ending", ["good", "neutral"])
+def test_plans_reach_their_ending(solution, ending):
+    state = engine.new_game(seed=1)
+    for action in solution.plans[ending]:
+        engine.step(state, action)
+    assert state.game_over and state.ending == ending
+
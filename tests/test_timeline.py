@@ -0,0 +1,105 @@
+import random
+
+import pytest
+
+import engine
+from timeline import PVector, Timeline, advance, common_ancestor, compare, freeze, start, thaw
+
+
+def summary(state):
+    return (state.player_name, state.day, state.mood, state.reflection_count, state.game_over, state.ending,
+            [(char.npc_id, char.bond_level, char.last_interaction) for char in state.characters.values()],
+            list(state.choices_made))
+
+
+def played(seed, steps=None):
+    state = engine.new_game("Ann", seed=seed)
+    rng = random.Random(seed)
+    while not state.game_over and (steps is None or steps > 0):
+        engine.step(state, engine.random_policy(state, rng), rng)
+        steps = None if steps is None else steps - 1
+    return state
+
+
+def test_pvector():
+    items = list(range(1000))
+    vector = PVector(items)
+    changed = vector.set(500, -1).set(31, -2)
+    assert list(vector) == items
+    assert [changed[i] for i in (31, 500, 999)] == [-2, -1, 999]
+    assert list(vector.diff(changed)) == [31, 500]
+    with pytest.raises(IndexError):
+        vector[1000]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_freeze_thaw_round_trip(seed):
+    state = played(seed, steps=12)
+    snapshot = freeze(state)
+    assert summary(thaw(snapshot)) == summary(state)
+    assert compare(freeze(thaw(snapshot)), snapshot) == {}
+
+
+def test_compare_equal_histories_built_apart():
+    state = played(1)
+    assert state.game_over
+    assert compare(freeze(state), freeze(state)) == {}
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_timeline_plays_like_the_engine(seed):
+    state = engine.new_game("Ann", seed=seed)
+    timeline = Timeline(start("Ann", seed=seed))
+    policy, engine_rng, timeline_rng = random.Random(seed), random.Random(seed + 1), random.Random(seed + 1)
+    while not state.game_over:
+        action = engine.random_policy(state, policy)
+        engine.step(state, action, engine_rng)
+        timeline.step(action, timeline_rng)
+    assert compare(freeze(state), timeline.current) == {}
+    assert summary(thaw(timeline.current)) == summary(state)
+
+
+def test_compare_reports_choices_since_the_split():
+    timeline = Timeline(start("Ann", seed=3))
+    timeline.step(engine.Interact("Maya", 0))
+    other = timeline.branch()
+    timeline.step(engine.Interact("David", 1))
+    other.step(engine.Interact("Sarah", 2))
+    other.step(engine.END_DAY)
+    changes = compare(timeline.current, other.current)
+    mine, theirs = changes["choices"]
+    assert [choice["choice"].split(":")[0] for choice in mine] == ["Talked to David"]
+    assert [choice["choice"].split(":")[0] for choice in theirs] == ["Talked to Sarah"]
+    assert changes["day"] == (1, 2)
+    assert set(changes["bonds"]) == {"David", "Sarah"}
+    assert common_ancestor(timeline.current, other.current) is other.current.parent.parent
+
+
+def test_undo_redo_branch():
+    timeline = Timeline(start("Ann", seed=4))
+    first = timeline.current
+    timeline.step(engine.Interact("Maya", 0))
+    second = timeline.current
+    timeline.step(engine.Interact("Alex", 1))
+    third = timeline.current
+
+    assert timeline.undo(5)
+    assert timeline.current is first and not timeline.undo()
+    assert timeline.redo() and timeline.current is second
+    branch = timeline.branch()
+    assert timeline.redo() and timeline.current is third and not timeline.redo()
+
+    branch.step(engine.Reflect(0))
+    assert branch.current.parent is second and timeline.current is third
+    assert not branch.redo()
+    timeline.undo()
+    timeline.step(engine.END_DAY)
+    assert not timeline.redo()
+    assert timeline.current.choices == second.choices and timeline.current.day == 2
+
+
+def test_same_action_same_luck():
+    snapshot = start("Ann", seed=6)
+    one, _ = advance(snapshot, engine.Interact("Maya", 0))
+    two, _ = advance(snapshot, engine.Interact("Maya", 0))
+    assert compare(one, two) == {} and one.history == two.history
@@ -0,0 +1,385 @@
+"""Branching timelines for Life Unwritten
+
+A Snapshot is an immutable game state. Taking an action makes a new
+snapshot that shares everything it didn't change with its parent:
+
+- the cast is a persistent vector, so changing one NPC copies one path
+  of at most a few 32-slot nodes
+- the choice history is a linked list whose tail every later snapshot
+  shares
+- the parent link gives unlimited undo
+
+Branching from any earlier snapshot, undoing and comparing two
+timelines therefore cost time and memory in proportion to what changed,
+never to the length of the history or the number of branches. The rules
+are engine.step's own: a Draft stands in for the GameState while one
+action is applied, then freezes back into a snapshot.
+
+    timeline = Timeline(start("Ann", seed=1))
+    timeline.step(engine.Interact("Maya", 0))
+    what_if = timeline.branch()
+    timeline.undo()
+    compare(timeline.current, what_if.current)
+"""
+
+import random
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+import engine
+from content import NAMES, NPC_IDS
+from history import interaction_record, reflection_record, render_record
+from recording import new_seed
+
+BITS = 5
+WIDTH = 1 << BITS
+MASK = WIDTH - 1
+
+
+class PVector:
+    """Immutable sequence where set() returns a new vector sharing all but one path with the old"""
+
+    __slots__ = ('size', 'shift', 'root')
+
+    def __init__(self, items: Iterable = ()):
+        nodes = list(items)
+        self.size = len(nodes)
+        self.shift = 0
+        nodes = [tuple(nodes[i:i + WIDTH]) for i in range(0, len(nodes), WIDTH)] or [()]
+        while len(nodes) > 1:
+            nodes = [tuple(nodes[i:i + WIDTH]) for i in range(0, len(nodes), WIDTH)]
+            self.shift += BITS
+        self.root = nodes[0]
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getitem__(self, i: int):
+        if not 0 <= i < self.size:
+            raise IndexError("PVector index out of range")
+        node = self.root
+        shift = self.shift
+        while shift:
+            node = node[(i >> shift) & MASK]
+            shift -= BITS
+        return node[i & MASK]
+
+    def __iter__(self) -> Iterator:
+        return (self[i] for i in range(self.size))
+
+    def set(self, i: int, value) -> "PVector":
+        if not 0 <= i < self.size:
+            raise IndexError("PVector index out of range")
+        vector = PVector.__new__(PVector)
+        vector.size = self.size
+        vector.shift = self.shift
+        vector.root = _set(self.root, self.shift, i, value)
+        return vector
+
+    def diff(self, other: "PVector") -> Iterator[int]:
+        """Indexes where two vectors of the same size differ, skipping the nodes they share"""
+        if self.size != other.size or self.shift != other.shift:
+            raise ValueError("can only compare vectors of the same size")
+        return _diff(self.root, other.root, self.shift, 0)
+
+
+def _set(node: tuple, shift: int, i: int, value) -> tuple:
+    slot = (i >> shift) & MASK
+    child = value if shift == 0 else _set(node[slot], shift - BITS, i, value)
+    return node[:slot] + (child,) + node[slot + 1:]
+
+
+def _diff(a: tuple, b: tuple, shift: int, offset: int) -> Iterator[int]:
+    if a is b:
+        return
+    for slot, (x, y) in enumerate(zip(a, b)):
+        if x is y:
+            continue
+        if shift == 0:
+            if x != y:
+                yield offset + slot
+        else:
+            yield from _diff(x, y, shift - BITS, offset + (slot << shift))
+
+
+# History is a linked list of (record, previous node) pairs, newest first
+Node = Optional[Tuple[Tuple[int, ...], Any]]
+
+
+class Snapshot(NamedTuple):
+    seed: int
+    player_name: str
+    day: int
+    mood: int
+    reflection_count: int
+    choices_today: int
+    bond_total: int
+    game_over: bool
+    ending: Optional[str]
+    cast: PVector  # (bond_level, last_interaction) for every npc_id
+    history: Node
+    choices: int  # length of history
+    depth: int  # actions since the start of the timeline
+    parent: Optional["Snapshot"]
+    action: Optional[engine.Action]  # what led here from the parent
+
+    def records(self) -> List[Tuple[int, ...]]:
+        """Every choice record, oldest first"""
+        records = []
+        node = self.history
+        while node is not None:
+            records.append(node[0])
+            node = node[1]
+        records.reverse()
+        return records
+
+
+_BASE_CAST: Optional[PVector] = None
+
+
+def base_cast() -> PVector:
+    """The world's starting cast as a vector, built once and shared by every timeline"""
+    global _BASE_CAST
+    if _BASE_CAST is None:
+        _BASE_CAST = PVector((char.bond_level, char.last_interaction) for char in engine.world().characters)
+    return _BASE_CAST
+
+
+def start(player_name: str = "Traveler", seed: Optional[int] = None) -> Snapshot:
+    """Snapshot of a brand new game"""
+    world = engine.world()
+    return Snapshot(new_seed() if seed is None else seed, player_name, 1, engine.STARTING_MOOD, 0, 0,
+                    world.stats.total, False, None, base_cast(), None, 0, 0, None, None)
+
+
+def freeze(state: engine.GameState) -> Snapshot:
+    """Snapshot of a live GameState, e.g. to branch from a game in progress"""
+    if state.endless:
+        raise ValueError("snapshots cover the content pack's cast; an endless game can't be frozen")
+    cast = base_cast()
+    for _, char in state.characters.changes():
+        cast = cast.set(char.npc_id, (char.bond_level, char.last_interaction))
+    node = None
+    log = state.choices_made
+    for i in range(len(log)):
+        node = (tuple(log.record(i)), node)
+    return Snapshot(state.seed, state.player_name, state.day, state.mood, state.reflection_count,
+                    log.count_day(state.day), engine.relationship_stats(state).total, state.game_over,
+                    state.ending, cast, node, len(log), 0, None, None)
+
+
+def thaw(snapshot: Snapshot) -> engine.GameState:
+    """A live GameState to keep playing from a snapshot"""
+    state = engine.GameState(snapshot.seed)
+    state.player_name = snapshot.player_name
+    state.day = snapshot.day
+    state.mood = snapshot.mood
+    state.reflection_count = snapshot.reflection_count
+    state.game_over = snapshot.game_over
+    state.ending = snapshot.ending
+    for npc_id in snapshot.cast.diff(base_cast()):
+        bond_level, last_interaction = snapshot.cast[npc_id]
+        state.characters.put(engine.Character(npc_id, bond_level, last_interaction))
+    for record in snapshot.records():
+        state.choices_made.append(record)
+    return state
+
+
+class DraftCast:
+    """The characters of a Draft: read from the snapshot, copied when the rules change one"""
+
+    __slots__ = ('cast', 'owned')
+
+    def __init__(self, cast: PVector):
+        self.cast = cast
+        self.owned: Dict[int, engine.Character] = {}
+
+    def __getitem__(self, name: str) -> engine.Character:
+        npc_id = NPC_IDS[name]
+        character = self.owned.get(npc_id)
+        if character is None:
+            character = engine.Character(npc_id, *self.cast[npc_id])
+        return character
+
+    def __contains__(self, name) -> bool:
+        return name in NPC_IDS
+
+    def own(self, name: str) -> engine.Character:
+        npc_id = NPC_IDS[name]
+        character = self.owned.get(npc_id)
+        if character is None:
+            character = self.owned[npc_id] = engine.Character(npc_id, *self.cast[npc_id])
+        return character
+
+
+class Draft:
+    """Stand-in for a GameState while engine.step applies one action to a snapshot
+
+    It has the parts of the GameState interface the rules use. stats and
+    choices_made point back at the draft, which answers the only
+    questions the rules ask of them: the average bond and today's choice
+    count.
+    """
+
+    journal = None
+    endless = False
+
+    def __init__(self, snapshot: Snapshot, rng: random.Random):
+        self.snapshot = snapshot
+        self.rng = rng
+        self.player_name = snapshot.player_name
+        self.day = snapshot.day
+        self.mood = snapshot.mood
+        self.reflection_count = snapshot.reflection_count
+        self.choices_today = snapshot.choices_today
+        self.bond_total = snapshot.bond_total
+        self.game_over = snapshot.game_over
+        self.ending = snapshot.ending
+        self.characters = DraftCast(snapshot.cast)
+        self.history = snapshot.history
+        self.choices = snapshot.choices
+
+    @property
+    def stats(self) -> "Draft":
+        return self
+
+    @property
+    def choices_made(self) -> "Draft":
+        return self
+
+    @property
+    def average(self) -> float:
+        return self.bond_total / len(NAMES)
+
+    def count_day(self, day: int) -> int:
+        return self.choices_today if day == self.day else 0
+
+    def set_bond(self, character: engine.Character, bond_level: int):
+        self.bond_total += bond_level - character.bond_level
+        character.bond_level = bond_level
+
+    def save(self, record: Tuple[int, ...]):
+        self.history = (record, self.history)
+        self.choices += 1
+        self.choices_today += 1
+
+    def save_interaction(self, character: engine.Character, option: int, old_bond: int, old_mood: int):
+        self.save(interaction_record(self.day, character.npc_id, option, old_mood, self.mood,
+                                     old_bond, character.bond_level))
+
+    def save_reflection(self, prompt: int, boost: int, old_mood: int):
+        self.save(reflection_record(self.day, prompt, boost, old_mood, self.mood))
+
+    def checkpoint(self):
+        pass
+
+    def freeze(self, action: engine.Action) -> Snapshot:
+        snapshot = self.snapshot
+        cast = snapshot.cast
+        for npc_id, char in self.characters.owned.items():
+            entry = (char.bond_level, char.last_interaction)
+            if cast[npc_id] != entry:
+                cast = cast.set(npc_id, entry)
+        choices_today = self.choices_today if self.day == snapshot.day else 0
+        return Snapshot(snapshot.seed, self.player_name, self.day, self.mood, self.reflection_count,
+                        choices_today, self.bond_total, self.game_over, self.ending, cast, self.history,
+                        self.choices, snapshot.depth + 1, snapshot, action)
+
+
+def advance(snapshot: Snapshot, action: engine.Action,
+            rng: Optional[random.Random] = None) -> Tuple[Snapshot, List[engine.Event]]:
+    """Apply one action with the engine's rules and return the new snapshot and its events
+
+    Without an rng the draws come from a stream seeded by the timeline's
+    seed and the snapshot's depth, so two branches taking the same action
+    from the same snapshot see the same luck.
+    """
+    if rng is None:
+        rng = random.Random(snapshot.seed << 32 | snapshot.depth)
+    draft = Draft(snapshot, rng)
+    _, events = engine.step(draft, action, rng)
+    return draft.freeze(action), events
+
+
+def common_ancestor(a: Snapshot, b: Snapshot) -> Optional[Snapshot]:
+    """The latest snapshot both timelines went through, if any"""
+    while a.depth > b.depth:
+        a = a.parent
+    while b.depth > a.depth:
+        b = b.parent
+    while a is not b:
+        if a.parent is None or b.parent is None:
+            return None
+        a, b = a.parent, b.parent
+    return a
+
+
+def compare(a: Snapshot, b: Snapshot) -> Dict[str, Any]:
+    """What differs between two snapshots, as (a, b) pairs
+
+    Only the changed NPCs and the choices made since the histories split
+    are visited, unless one history was rebuilt by freeze(); then the
+    records are compared back to the first that differs.
+    """
+    changes: Dict[str, Any] = {}
+    for field in ("player_name", "day", "mood", "reflection_count", "game_over", "ending"):
+        if getattr(a, field) != getattr(b, field):
+            changes[field] = (getattr(a, field), getattr(b, field))
+    bonds = {NAMES[npc_id]: (a.cast[npc_id][0], b.cast[npc_id][0]) for npc_id in a.cast.diff(b.cast)}
+    if bonds:
+        changes["bonds"] = bonds
+
+    only_a, only_b = [], []
+    node_a, node_b = a.history, b.history
+    length_a, length_b = a.choices, b.choices
+    while length_a > length_b:
+        only_a.append(node_a[0])
+        node_a, length_a = node_a[1], length_a - 1
+    while length_b > length_a:
+        only_b.append(node_b[0])
+        node_b, length_b = node_b[1], length_b - 1
+    while node_a is not node_b:
+        only_a.append(node_a[0])
+        only_b.append(node_b[0])
+        node_a, node_b = node_a[1], node_b[1]
+    # histories built separately share no nodes; their equal oldest records are still common
+    while only_a and only_b and only_a[-1] == only_b[-1]:
+        only_a.pop()
+        only_b.pop()
+    if only_a or only_b:
+        changes["choices"] = ([render_record(record) for record in reversed(only_a)],
+                              [render_record(record) for record in reversed(only_b)])
+    return changes
+
+
+class Timeline:
+    """A cursor over snapshots with unlimited undo and redo"""
+
+    def __init__(self, snapshot: Snapshot):
+        self.current = snapshot
+        self.undone: List[Snapshot] = []  # redo stack, most recently undone last
+
+    def step(self, action: engine.Action, rng: Optional[random.Random] = None) -> List[engine.Event]:
+        self.current, events = advance(self.current, action, rng)
+        self.undone.clear()
+        return events
+
+    def undo(self, steps: int = 1) -> bool:
+        """Go back up to steps actions; False if there was nothing to undo"""
+        moved = False
+        for _ in range(steps):
+            if self.current.parent is None:
+                break
+            self.undone.append(self.current)
+            self.current = self.current.parent
+            moved = True
+        return moved
+
+    def redo(self) -> bool:
+        if not self.undone:
+            return False
+        self.current = self.undone.pop()
+        return True
+
+    def branch(self) -> "Timeline":
+        """A new timeline starting from the current snapshot; both can move on independently"""
+        return Timeline(self.current)